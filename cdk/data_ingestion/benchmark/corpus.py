@@ -0,0 +1,92 @@
+import random
+from typing import List, Tuple
+
+import pymupdf
+
+VOCABULARY = (
+    "qubit superposition entanglement amplitude measurement gate circuit Hadamard Pauli phase "
+    "rotation unitary Hamiltonian eigenstate decoherence noise error correction surface code "
+    "Grover Shor Fourier transform oracle register ancilla Bloch sphere density matrix observable "
+    "tensor product basis state probability interference teleportation algorithm complexity"
+).split()
+
+
+def make_paragraph(rng: random.Random, sentences: int) -> str:
+    """
+    Build a paragraph of pseudo-random sentences from the quantum computing vocabulary.
+
+    Args:
+    rng (random.Random): The random number generator.
+    sentences (int): The number of sentences.
+
+    Returns:
+    str: The paragraph.
+    """
+    return " ".join(
+        " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(8, 20))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+def make_pdf(rng: random.Random, pages: int) -> bytes:
+    """
+    Build a PDF whose pages each hold a few paragraphs of synthetic text.
+
+    Args:
+    rng (random.Random): The random number generator.
+    pages (int): The number of pages.
+
+    Returns:
+    bytes: The PDF document.
+    """
+    doc = pymupdf.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        text = "\n\n".join(make_paragraph(rng, 4) for _ in range(3))
+        page.insert_textbox(page.rect + (54, 54, -54, -54), text, fontsize=10)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def make_txt(rng: random.Random, size_kb: int) -> bytes:
+    """
+    Build a plain text document of roughly the given size.
+
+    Args:
+    rng (random.Random): The random number generator.
+    size_kb (int): The approximate size in KB.
+
+    Returns:
+    bytes: The UTF-8 encoded text.
+    """
+    paragraphs = []
+    size = 0
+    while size < size_kb * 1024:
+        paragraph = make_paragraph(rng, 5)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs).encode("utf-8")
+
+def make_corpus(
+    pdf_docs: int,
+    pdf_pages: int,
+    txt_docs: int,
+    txt_kb: int,
+    seed: int = 0
+) -> List[Tuple[str, bytes]]:
+    """
+    Build a reproducible synthetic corpus of PDF and TXT documents.
+
+    Args:
+    pdf_docs (int): The number of PDF documents.
+    pdf_pages (int): The number of pages of each PDF document.
+    txt_docs (int): The number of TXT documents.
+    txt_kb (int): The approximate size of each TXT document in KB.
+    seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+    List[Tuple[str, bytes]]: The filename and content of each document.
+    """
+    rng = random.Random(seed)
+    corpus = [(f"synthetic_{i:04d}.pdf", make_pdf(rng, pdf_pages)) for i in range(pdf_docs)]
+    corpus += [(f"synthetic_{i:04d}.txt", make_txt(rng, txt_kb)) for i in range(txt_docs)]
+    return corpus
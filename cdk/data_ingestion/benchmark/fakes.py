@@ -0,0 +1,111 @@
+import hashlib
+import io
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+
+class FakeS3:
+    """
+    In-process stand-in for the parts of the S3 client used by the ingestion pipeline.
+    Objects are kept in memory and every call is counted per operation.
+    """
+
+    def __init__(self):
+        self.objects: Dict[Tuple[str, str], bytes] = {}
+        self.calls = Counter()
+
+    @staticmethod
+    def etag(data: bytes) -> str:
+        return f'"{hashlib.md5(data).hexdigest()}"'
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs) -> dict:
+        self.calls["put_object"] += 1
+        self.objects[(Bucket, Key)] = bytes(Body)
+        return {"ETag": self.etag(Body)}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        self.calls["get_object"] += 1
+        data = self.objects[(Bucket, Key)]
+        return {"Body": io.BytesIO(data), "ContentLength": len(data), "ETag": self.etag(data)}
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        self.calls["head_object"] += 1
+        data = self.objects[(Bucket, Key)]
+        return {"ContentLength": len(data), "ETag": self.etag(data)}
+
+    def upload_fileobj(self, Fileobj, Bucket: str, Key: str, **kwargs) -> None:
+        self.calls["upload_fileobj"] += 1
+        self.objects[(Bucket, Key)] = Fileobj.read()
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        self.calls["delete_object"] += 1
+        self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def get_paginator(self, operation_name: str):
+        if operation_name != "list_objects_v2":
+            raise NotImplementedError(operation_name)
+        return FakeListObjectsPaginator(self)
+
+
+class FakeListObjectsPaginator:
+    """
+    Pages through the objects of a FakeS3 like the list_objects_v2 paginator, 1000 keys per page.
+    """
+
+    def __init__(self, s3: FakeS3):
+        self.s3 = s3
+
+    def paginate(self, Bucket: str, Prefix: str = "", **kwargs):
+        keys = sorted(key for bucket, key in self.s3.objects if bucket == Bucket and key.startswith(Prefix))
+        for start in range(0, max(len(keys), 1), 1000):
+            self.s3.calls["list_objects_v2"] += 1
+            contents = [
+                {"Key": key, "ETag": self.s3.etag(self.s3.objects[(Bucket, key)]), "Size": len(self.s3.objects[(Bucket, key)])}
+                for key in keys[start:start + 1000]
+            ]
+            yield {"Contents": contents} if contents else {}
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic embeddings derived from the SHA-256 of each text. Every request sleeps for a fixed
+    latency per text to stand in for a Bedrock round trip, and requests and texts are counted.
+    """
+
+    def __init__(self, size: int = 256, latency_ms: float = 0.0):
+        """
+        Args:
+        size (int, optional): The number of dimensions of each embedding. Defaults to 256.
+        latency_ms (float, optional): The simulated latency of embedding one text in milliseconds. Defaults to 0.
+        """
+        self.size = size
+        self.latency_ms = latency_ms
+        self.requests = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, text: str) -> List[float]:
+        values = []
+        seed = text.encode("utf-8")
+        counter = 0
+        while len(values) < self.size:
+            digest = hashlib.sha256(seed + counter.to_bytes(4, "little")).digest()
+            values.extend(byte / 127.5 - 1.0 for byte in digest)
+            counter += 1
+        return values[:self.size]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.requests += 1
+            self.texts += len(texts)
+        if self.latency_ms:
+            time.sleep(self.latency_ms * len(texts) / 1000)
+        return [self._embed(x) for x in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -0,0 +1,247 @@
+"""
+Offline benchmark of the data ingestion pipeline.
+
+Runs process_documents over a synthetic corpus with an in-process S3 fake, deterministic fake
+embeddings and a local vectorstore, and reports throughput, embedding calls, S3 calls and peak RSS.
+Results can be written to, and compared against, a JSON baseline file.
+
+Usage:
+    python run_benchmark.py [--pdf-docs 20] [--pdf-pages 10] [--txt-docs 10] [--txt-kb 20]
+                            [--chunking-strategy recursive] [--embedding-latency-ms 0]
+                            [--connection-string postgresql+psycopg://...]
+                            [--baseline baseline.json] [--write-baseline]
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+# The pipeline reads these at import time and creates boto3 clients, which need a region but no credentials
+os.environ.setdefault("EMBEDDING_BUCKET_NAME", "benchmark-embeddings")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+# The JSON result is printed to stdout, so the per-document metric records are left out
+os.environ.setdefault("EMIT_METRICS", "false")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from langchain.indexes import SQLRecordManager
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from processing import documents
+from processing.chunking import get_chunking_strategy
+from helpers.embedding_executor import ConcurrentEmbeddings
+
+from corpus import make_corpus
+from fakes import FakeEmbeddings, FakeS3
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_BUCKET = "benchmark-documents"
+BENCHMARK_TOPIC = "benchmark"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Metrics compared against the baseline, and whether higher values are better
+COMPARED_METRICS = {
+    "pages_per_sec": True,
+    "chunks_per_sec": True,
+    "embedding_requests": False,
+    "embedded_texts": False,
+    "s3_calls": False,
+    "peak_rss_mb": False,
+}
+# Counters are deterministic for a given configuration and must not grow at all
+EXACT_METRICS = {"embedding_requests", "embedded_texts", "s3_calls"}
+
+
+def get_peak_rss_mb() -> Dict[str, float]:
+    """
+    Read the lifetime peak resident set size of this process and of its finished extraction workers.
+
+    Returns:
+    Dict[str, float]: The peak RSS in MB of the process and of its largest child.
+    """
+    # ru_maxrss is reported in KB on Linux
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    """
+    Ingest a synthetic corpus once and collect the metrics of the run.
+
+    Args:
+    args (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+    dict: The configuration and the metrics of the run.
+    """
+    corpus = make_corpus(args.pdf_docs, args.pdf_pages, args.txt_docs, args.txt_kb, args.seed)
+
+    fake_s3 = FakeS3()
+    for filename, data in corpus:
+        fake_s3.objects[(BENCHMARK_BUCKET, f"{BENCHMARK_TOPIC}/documents/{filename}")] = data
+    documents.s3 = fake_s3
+
+    fake_embeddings = FakeEmbeddings(size=args.embedding_size, latency_ms=args.embedding_latency_ms)
+    embeddings = fake_embeddings
+    if args.embedding_concurrency > 1:
+        embeddings = ConcurrentEmbeddings(fake_embeddings, max_concurrency=args.embedding_concurrency)
+
+    # Count pages as they leave the extractor, whatever the document type
+    page_count = 0
+    extract_doc_pages = documents.extract_doc_pages
+
+    def counting_extract_doc_pages(*extract_args, **extract_kwargs):
+        nonlocal page_count
+        for page in extract_doc_pages(*extract_args, **extract_kwargs):
+            page_count += 1
+            yield page
+
+    documents.extract_doc_pages = counting_extract_doc_pages
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.connection_string:
+            from langchain_postgres import PGVector
+            vectorstore = PGVector(
+                embeddings=embeddings,
+                collection_name=BENCHMARK_TOPIC,
+                connection=args.connection_string,
+                use_jsonb=True,
+                pre_delete_collection=True,
+            )
+            record_manager = SQLRecordManager(f"pgvector/{BENCHMARK_TOPIC}", db_url=args.connection_string)
+            record_manager.create_schema()
+            record_manager.delete_keys(record_manager.list_keys())
+        else:
+            vectorstore = InMemoryVectorStore(embedding=embeddings)
+            record_manager = SQLRecordManager(
+                f"memory/{BENCHMARK_TOPIC}",
+                db_url=f"sqlite:///{os.path.join(tmp_dir, 'record_manager.db')}",
+            )
+            record_manager.create_schema()
+
+        start = time.perf_counter()
+        try:
+            documents.process_documents(
+                bucket=BENCHMARK_BUCKET,
+                topic=BENCHMARK_TOPIC,
+                vectorstore=vectorstore,
+                embeddings=embeddings,
+                record_manager=record_manager,
+                output_bucket=os.environ["EMBEDDING_BUCKET_NAME"],
+                index_batch_size=args.index_batch_size,
+                chunking_strategy=args.chunking_strategy,
+            )
+        finally:
+            documents.extract_doc_pages = extract_doc_pages
+        seconds = time.perf_counter() - start
+        chunk_count = len(record_manager.list_keys())
+
+    peak_rss = get_peak_rss_mb()
+    return {
+        "config": {
+            "pdf_docs": args.pdf_docs,
+            "pdf_pages": args.pdf_pages,
+            "txt_docs": args.txt_docs,
+            "txt_kb": args.txt_kb,
+            "seed": args.seed,
+            "chunking_strategy": get_chunking_strategy(args.chunking_strategy),
+            "index_batch_size": args.index_batch_size,
+            "embedding_size": args.embedding_size,
+            "embedding_latency_ms": args.embedding_latency_ms,
+            "embedding_concurrency": args.embedding_concurrency,
+            "vectorstore": "pgvector" if args.connection_string else "memory",
+        },
+        "metrics": {
+            "documents": len(corpus),
+            "corpus_mb": round(sum(len(data) for _, data in corpus) / (1024 * 1024), 2),
+            "pages": page_count,
+            "chunks": chunk_count,
+            "seconds": round(seconds, 3),
+            "pages_per_sec": round(page_count / seconds, 1),
+            "chunks_per_sec": round(chunk_count / seconds, 1),
+            "embedding_requests": fake_embeddings.requests,
+            "embedded_texts": fake_embeddings.texts,
+            "s3_calls": sum(fake_s3.calls.values()),
+            "s3_calls_by_operation": dict(sorted(fake_s3.calls.items())),
+            "peak_rss_mb": round(peak_rss["self"], 1),
+            "peak_worker_rss_mb": round(peak_rss["children"], 1),
+        },
+    }
+
+def compare_to_baseline(result: dict, baseline: dict, tolerance: float) -> bool:
+    """
+    Print the change of every compared metric against the baseline and flag regressions.
+    Counters must not grow at all, timings and memory may move within the tolerance.
+
+    Args:
+    result (dict): The result of this run.
+    baseline (dict): The stored baseline result.
+    tolerance (float): The allowed relative change of timings and memory, e.g. 0.2 for 20%.
+
+    Returns:
+    bool: True if no metric regressed.
+    """
+    if result["config"] != baseline["config"]:
+        print("Warning: the benchmark configuration differs from the baseline configuration.")
+
+    passed = True
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        current = result["metrics"][metric]
+        previous = baseline["metrics"].get(metric)
+        if previous is None:
+            continue
+        allowed = 0.0 if metric in EXACT_METRICS else tolerance
+        if higher_is_better:
+            regressed = current < previous * (1 - allowed)
+        else:
+            regressed = current > previous * (1 + allowed)
+        change = (current - previous) / previous * 100 if previous else 0.0
+        print(f"{metric:>20}: {previous:>10} -> {current:>10} ({change:+.1f}%){'  REGRESSION' if regressed else ''}")
+        passed = passed and not regressed
+    return passed
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the data ingestion pipeline offline.")
+    parser.add_argument("--pdf-docs", type=int, default=20, help="Number of synthetic PDF documents.")
+    parser.add_argument("--pdf-pages", type=int, default=10, help="Pages per PDF document.")
+    parser.add_argument("--txt-docs", type=int, default=10, help="Number of synthetic TXT documents.")
+    parser.add_argument("--txt-kb", type=int, default=20, help="Approximate size of each TXT document in KB.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the corpus.")
+    parser.add_argument("--chunking-strategy", default=None, help="Chunking strategy, defaults to CHUNKING_STRATEGY.")
+    parser.add_argument("--index-batch-size", type=int, default=documents.INDEX_BATCH_SIZE, help="Chunks per index batch.")
+    parser.add_argument("--embedding-size", type=int, default=256, help="Dimensions of the fake embeddings.")
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0, help="Simulated latency per embedded text.")
+    parser.add_argument("--embedding-concurrency", type=int, default=1, help="Concurrent embedding requests, 1 disables ConcurrentEmbeddings.")
+    parser.add_argument("--connection-string", default=None, help="Use a local pgvector database instead of the in-memory vectorstore.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Path of the JSON baseline file.")
+    parser.add_argument("--write-baseline", action="store_true", help="Store this run as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative change of timings and memory.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    result = run_benchmark(args)
+    print(json.dumps(result, indent=2))
+
+    if args.write_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(result, baseline_file, indent=2)
+            baseline_file.write("\n")
+        print(f"Wrote baseline to {args.baseline}.")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        return 0 if compare_to_baseline(result, baseline, args.tolerance) else 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Compare recall and latency across compact vector storage modes.
+
+Evaluation builds the index of every given mode on one collection in turn, searches it with stored
+embeddings plus a little noise as queries, and reports recall@k against exact full-precision search
+next to the latency of each mode. The index of the configured VECTOR_STORAGE_MODE is restored afterwards.
+Indexes are built with the data ingestion code and searched with the text generation code, as in production.
+
+Usage:
+    python vector_storage.py --connection-string postgresql+psycopg://... --evaluate full,halfvec,binary,truncated
+                             [--collection <topic_id>] [--queries 50] [--k 4]
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from helpers import vector_index
+
+# The search side lives in the text generation image, loaded under its own name next to the ingestion helpers
+search_spec = importlib.util.spec_from_file_location(
+    "search_vector_index",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "text_generation", "src", "helpers", "vector_index.py"),
+)
+search_index = importlib.util.module_from_spec(search_spec)
+search_spec.loader.exec_module(search_index)
+
+logger = logging.getLogger(__name__)
+
+STORAGE_MODES = ["full", "halfvec", "binary", "truncated"]
+
+
+def sample_queries(engine: Engine, collection_name: str, num_queries: int, noise: float, seed: int) -> List[List[float]]:
+    """
+    Build query embeddings from random stored embeddings of a collection with Gaussian noise added,
+    so a query is close to, but not the same as, one of the stored chunks.
+
+    Args:
+    engine (Engine): The database engine.
+    collection_name (str): The name of the collection.
+    num_queries (int): The number of queries.
+    noise (float): The standard deviation of the noise relative to the mean absolute value of a dimension.
+    seed (int): The random seed.
+
+    Returns:
+    List[List[float]]: The query embeddings.
+    """
+    collection_uuid, _ = search_index.get_index_info(engine, collection_name)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT setseed(:seed)"), {"seed": (seed % 1000) / 1000})
+        embeddings = conn.execute(
+            text("""
+                SELECT embedding::text FROM langchain_pg_embedding
+                WHERE collection_id = CAST(:collection_uuid AS uuid)
+                ORDER BY random() LIMIT :num_queries;
+            """),
+            {"collection_uuid": collection_uuid, "num_queries": num_queries},
+        ).scalars()
+        embeddings = [json.loads(x) for x in embeddings]
+
+    rng = random.Random(seed)
+    queries = []
+    for embedding in embeddings:
+        scale = noise * sum(abs(x) for x in embedding) / len(embedding)
+        queries.append([x + rng.gauss(0, scale) for x in embedding])
+    return queries
+
+def search_exact(engine: Engine, collection_name: str, query_embedding: List[float], k: int) -> List[str]:
+    """
+    Find the k nearest chunks at full precision without any index, the ground truth of the recall.
+    """
+    collection_uuid, _ = search_index.get_index_info(engine, collection_name)
+    with engine.begin() as conn:
+        conn.execute(text("SET LOCAL enable_indexscan = off"))
+        return list(conn.execute(
+            text("""
+                SELECT id FROM langchain_pg_embedding
+                WHERE collection_id = CAST(:collection_uuid AS uuid)
+                ORDER BY embedding <=> CAST(:query_embedding AS vector)
+                LIMIT :k;
+            """),
+            {"collection_uuid": collection_uuid, "query_embedding": str(query_embedding), "k": k},
+        ).scalars())
+
+def search_indexed(engine: Engine, collection_name: str, query_embedding: List[float], k: int) -> List[str]:
+    return [document.id for document, _ in search_index.index_search(engine, collection_name, query_embedding, k)]
+
+def measure(search: Callable[[List[float]], List[str]], queries: List[List[float]], truth: List[List[str]]) -> Dict[str, float]:
+    """
+    Run every query through a search and measure its recall against the ground truth and its latency.
+
+    Returns:
+    Dict[str, float]: The recall@k and the p50 and p95 latency in milliseconds.
+    """
+    latencies = []
+    hits = 0
+    expected = 0
+    for query_embedding, true_ids in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(query_embedding)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(found) & set(true_ids))
+        expected += len(true_ids)
+    latencies.sort()
+    return {
+        "recall": hits / expected if expected else 0.0,
+        "p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+    }
+
+def get_index_size_mb(engine: Engine, collection_name: str) -> float:
+    collection_uuid, _ = search_index.get_index_info(engine, collection_name)
+    with engine.connect() as conn:
+        size = conn.execute(
+            text("SELECT pg_relation_size(c.oid) FROM pg_class c WHERE c.relname = :index_name"),
+            {"index_name": vector_index.get_index_name(collection_uuid)},
+        ).scalar()
+    return (size or 0) / (1024 * 1024)
+
+def build_mode(connection_string: str, collection_name: str, mode: str, min_rows: int) -> Optional[str]:
+    vector_index.VECTOR_STORAGE_MODE = search_index.VECTOR_STORAGE_MODE = mode
+    vector_index.ANN_INDEX_MIN_ROWS = min_rows
+    search_index.index_info.clear()
+    return vector_index.maintain_vector_index(connection_string, collection_name)
+
+def evaluate(args: argparse.Namespace) -> List[dict]:
+    """
+    Build each storage mode's index on one collection and measure it against exact search.
+
+    Args:
+    args (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+    List[dict]: The mode, index type, index size, recall and latency of exact search and of every mode.
+    """
+    engine = vector_index.get_search_engine(args.connection_string)
+    collection_name = args.collection or vector_index.get_collection_names(args.connection_string)[0]
+    configured_mode = vector_index.VECTOR_STORAGE_MODE
+    configured_min_rows = vector_index.ANN_INDEX_MIN_ROWS
+
+    queries = sample_queries(engine, collection_name, args.queries, args.noise, args.seed)
+    truth = [search_exact(engine, collection_name, x, args.k) for x in queries]
+    results = [{
+        "mode": "exact",
+        "index_type": None,
+        "index_mb": 0.0,
+        **measure(lambda x: search_exact(engine, collection_name, x, args.k), queries, truth),
+    }]
+
+    try:
+        for mode in args.evaluate.split(","):
+            build_mode(args.connection_string, collection_name, mode, 0)
+            results.append({
+                "mode": mode,
+                "index_type": vector_index.get_index_type(),
+                "index_mb": round(get_index_size_mb(engine, collection_name), 2),
+                **measure(lambda x: search_indexed(engine, collection_name, x, args.k), queries, truth),
+            })
+    finally:
+        build_mode(args.connection_string, collection_name, configured_mode, configured_min_rows)
+
+    print(f"Collection {collection_name}, {len(queries)} queries, recall@{args.k} against exact search:")
+    print(f"{'mode':>10} {'index_type':>20} {'index_mb':>10} {'recall':>8} {'p50_ms':>8} {'p95_ms':>8}")
+    for result in results:
+        print(
+            f"{result['mode']:>10} {str(result['index_type']):>20} {result['index_mb']:>10.2f} "
+            f"{result['recall']:>8.3f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f}"
+        )
+    return results
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluate compact vector storage modes.")
+    parser.add_argument("--connection-string", required=True, help="SQLAlchemy connection string of the database.")
+    parser.add_argument("--evaluate", required=True, help=f"Comma separated storage modes to compare, out of {', '.join(STORAGE_MODES)}.")
+    parser.add_argument("--collection", default=None, help="Collection to evaluate, defaults to the first one.")
+    parser.add_argument("--queries", type=int, default=50, help="Number of sampled queries.")
+    parser.add_argument("--k", type=int, default=4, help="Results per query, the retriever's default is 4.")
+    parser.add_argument("--noise", type=float, default=0.1, help="Noise added to the sampled embeddings, relative to their mean magnitude.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the queries.")
+    args = parser.parse_args(argv)
+
+    if any(x not in STORAGE_MODES for x in args.evaluate.split(",")):
+        parser.error(f"Storage modes must be out of {', '.join(STORAGE_MODES)}.")
+
+    logging.basicConfig(level=logging.WARNING)
+    evaluate(args)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
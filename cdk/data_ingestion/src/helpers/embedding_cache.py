@@ -0,0 +1,175 @@
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import text
+
+from helpers.vector_index import get_search_engine
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class PostgresCacheBackedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings instance with a persistent cache in the "Embedding_Cache" table, keyed by
+    the embedding model ID and the SHA-256 of the text, so identical text is only embedded once.
+    The table is created by the database initializer.
+    """
+
+    def __init__(
+        self,
+        underlying_embeddings: Embeddings,
+        connection_string: str,
+        model_id: str,
+        max_age_days: Optional[int] = None,
+        max_entries: Optional[int] = None
+    ):
+        """
+        Args:
+        underlying_embeddings (Embeddings): The embeddings instance used on cache misses.
+        connection_string (str): The database connection string.
+        model_id (str): The ID of the embedding model, part of the cache key.
+        max_age_days (Optional[int]): Entries unused for longer than this are evicted. Defaults to None, which keeps them.
+        max_entries (Optional[int]): The number of most recently used entries kept across all models. Defaults to None, which keeps them all.
+        """
+        self.underlying_embeddings = underlying_embeddings
+        self.engine = get_search_engine(connection_string)
+        self.model_id = model_id
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def hash_text(text_to_hash: str) -> str:
+        return hashlib.sha256(text_to_hash.encode("utf-8")).hexdigest()
+
+    def get_cached(self, text_hashes: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up the cached embeddings of many texts in a single query and mark them as used.
+
+        Args:
+        text_hashes (List[str]): The SHA-256 hashes of the texts.
+
+        Returns:
+        Dict[str, List[float]]: The cached embedding for each hash that was found.
+        """
+        if not text_hashes:
+            return {}
+        with self.engine.begin() as conn:
+            rows = conn.execute(
+                text("""
+                    UPDATE "Embedding_Cache"
+                    SET time_last_used = now()
+                    WHERE model_id = :model_id
+                    AND text_hash = ANY(:text_hashes)
+                    RETURNING text_hash, embedding;
+                """),
+                {"model_id": self.model_id, "text_hashes": text_hashes},
+            ).fetchall()
+        return {text_hash: list(embedding) for text_hash, embedding in rows}
+
+    def put_cached(self, embeddings_by_hash: Dict[str, List[float]]) -> None:
+        """
+        Store newly computed embeddings in the cache.
+
+        Args:
+        embeddings_by_hash (Dict[str, List[float]]): The embedding for each text hash.
+        """
+        if not embeddings_by_hash:
+            return
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("""
+                    INSERT INTO "Embedding_Cache"
+                    (model_id, text_hash, embedding, time_created, time_last_used)
+                    VALUES (:model_id, :text_hash, :embedding, now(), now())
+                    ON CONFLICT (model_id, text_hash) DO NOTHING;
+                """),
+                [
+                    {"model_id": self.model_id, "text_hash": text_hash, "embedding": embedding}
+                    for text_hash, embedding in embeddings_by_hash.items()
+                ],
+            )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of texts, only sending texts that are not cached yet to the underlying embeddings.
+
+        Args:
+        texts (List[str]): The texts to embed.
+
+        Returns:
+        List[List[float]]: The embedding of each text, in the same order.
+        """
+        text_hashes = [self.hash_text(x) for x in texts]
+        cached = self.get_cached(list(set(text_hashes)))
+
+        # Embed every distinct missing text once, even if it occurs several times in the batch
+        missing = {}
+        for text_hash, text_to_embed in zip(text_hashes, texts):
+            if text_hash not in cached:
+                missing.setdefault(text_hash, text_to_embed)
+
+        if missing:
+            new_embeddings = dict(zip(missing, self.underlying_embeddings.embed_documents(list(missing.values()))))
+            self.put_cached(new_embeddings)
+            cached.update(new_embeddings)
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return [cached[text_hash] for text_hash in text_hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def estimate_entries(self, conn) -> int:
+        """
+        Estimate the number of cached entries from the planner statistics, without scanning the table.
+
+        Args:
+        conn (Connection): An open database connection.
+
+        Returns:
+        int: The estimated number of entries, -1 if the table has not been analyzed yet.
+        """
+        return int(conn.execute(
+            text("""SELECT reltuples FROM pg_class WHERE oid = '"Embedding_Cache"'::regclass;""")
+        ).scalar())
+
+    def evict(self) -> int:
+        """
+        Remove entries that were not used within the configured age and, above the configured size,
+        the least recently used entries.
+        This runs after every invocation, so the size limit is only enforced once the estimated
+        size exceeds it, instead of ordering up to the whole cache each time.
+
+        Returns:
+        int: The number of evicted entries.
+        """
+        num_evicted = 0
+        with self.engine.begin() as conn:
+            if self.max_age_days:
+                num_evicted += conn.execute(
+                    text("""
+                        DELETE FROM "Embedding_Cache"
+                        WHERE time_last_used < now() - make_interval(days => :max_age_days);
+                    """),
+                    {"max_age_days": self.max_age_days},
+                ).rowcount
+            if self.max_entries and self.estimate_entries(conn) > self.max_entries:
+                num_evicted += conn.execute(
+                    text("""
+                        DELETE FROM "Embedding_Cache"
+                        WHERE (model_id, text_hash) IN (
+                            SELECT model_id, text_hash FROM "Embedding_Cache"
+                            ORDER BY time_last_used DESC
+                            OFFSET :max_entries
+                        );
+                    """),
+                    {"max_entries": self.max_entries},
+                ).rowcount
+        logger.info(f"Embedding cache: {self.hits} hits, {self.misses} misses, {num_evicted} entries evicted.")
+        return num_evicted
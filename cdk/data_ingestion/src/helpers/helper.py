@@ -1,19 +1,49 @@
 import logging
 import boto3
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 import psycopg2
 
 from langchain_aws import BedrockEmbeddings
 from langchain_postgres import PGVector
 from langchain.indexes import SQLRecordManager
 
-from processing.documents import process_documents
+from processing.documents import LinkedCollection, process_documents, process_selected_documents
+from processing.chunking import CountingEmbeddings
+from processing.fingerprints import DocumentFingerprintStore
+from processing.deletion import delete_documents
+from helpers.vector_index import get_search_engine
 s3 = boto3.client('s3')
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Vectorstores and record managers of each (connection string, collection name), reused across warm invocations
+vectorstores: Dict[Tuple[str, str], PGVector] = {}
+record_managers: Dict[Tuple[str, str], SQLRecordManager] = {}
+
+def get_connection_string(
+    dbname: str, 
+    user: str, 
+    password: str, 
+    host: str, 
+    port: int
+) -> str:
+    """
+    Build the SQLAlchemy connection string for the database.
+    
+    Args:
+    dbname (str): The name of the database.
+    user (str): The database user.
+    password (str): The database password.
+    host (str): The database host.
+    port (int): The database port.
+    
+    Returns:
+    str: The connection string.
+    """
+    return f"postgresql+psycopg://{user}:{password}@{host}:{port}/{dbname}"
+
 def get_vectorstore(
     collection_name: str, 
     embeddings: BedrockEmbeddings, 
@@ -24,7 +54,8 @@ def get_vectorstore(
     port: int
 ) -> Optional[PGVector]:
     """
-    Initialize and return a PGVector instance.
+    Return the PGVector instance of a collection, initializing it on first use.
+    The instance and its pooled engine are reused by later calls in the same container.
     
     Args:
     collection_name (str): The name of the collection.
@@ -39,17 +70,23 @@ def get_vectorstore(
     Optional[PGVector]: The initialized PGVector instance, or None if an error occurred.
     """
     try:
-        connection_string = (
-            f"postgresql+psycopg://{user}:{password}@{host}:{port}/{dbname}"
-        )
+        connection_string = get_connection_string(dbname, user, password, host, port)
+
+        vectorstore = vectorstores.get((connection_string, collection_name))
+        if vectorstore is not None:
+            vectorstore.embedding_function = embeddings
+            return vectorstore, connection_string
 
         logger.info("Initializing the VectorStore")
         vectorstore = PGVector(
             embeddings=embeddings,
             collection_name=collection_name,
-            connection=connection_string,
-            use_jsonb=True
+            connection=get_search_engine(connection_string),
+            use_jsonb=True,
+            # The extension only needs to be checked once per database
+            create_extension=not any(key[0] == connection_string for key in vectorstores)
         )
+        vectorstores[(connection_string, collection_name)] = vectorstore
 
         logger.info("VectorStore initialized")
         return vectorstore, connection_string
@@ -58,12 +95,40 @@ def get_vectorstore(
         logger.error(f"Error initializing vector store: {e}")
         return None
     
+def get_record_manager(
+    collection_name: str,
+    connection_string: str
+) -> SQLRecordManager:
+    """
+    Return the record manager that tracks the documents of a collection, initializing it on first use.
+    
+    Args:
+    collection_name (str): The name of the collection.
+    connection_string (str): The database connection string.
+    
+    Returns:
+    SQLRecordManager: The initialized record manager.
+    """
+    record_manager = record_managers.get((connection_string, collection_name))
+    if record_manager is None:
+        namespace = f"pgvector/{collection_name}"
+        record_manager = SQLRecordManager(
+            namespace, engine=get_search_engine(connection_string)
+        )
+        # The upsertion_record table is shared by all collections
+        if not any(key[0] == connection_string for key in record_managers):
+            record_manager.create_schema()
+        record_managers[(connection_string, collection_name)] = record_manager
+    return record_manager
+
 def store_topic_data(
     bucket: str, 
     topic: str, 
     vectorstore_config_dict: Dict[str, str], 
-    embeddings: BedrockEmbeddings
-) -> None:
+    embeddings: BedrockEmbeddings,
+    chunking_strategy: Optional[str] = None,
+    time_remaining: Optional[Callable[[], int]] = None
+) -> bool:
     """
     Store topic data from an S3 bucket into the vectorstore.
     
@@ -72,7 +137,14 @@ def store_topic_data(
     topic (str): The topic name/folder in the S3 bucket.
     vectorstore_config_dict (Dict[str, str]): The configuration dictionary for the vectorstore.
     embeddings (BedrockEmbeddings): The embeddings instance.
+    chunking_strategy (Optional[str]): The name of the chunking strategy. Defaults to None, which uses the configured default.
+    time_remaining (Optional[Callable[[], int]]): Returns the remaining time of the invocation in milliseconds. Defaults to None, which means no deadline.
+    
+    Returns:
+    bool: False if processing stopped early to meet the deadline and has to be continued.
     """
+    # Lets the index batches report how much of their time went to embedding
+    embeddings = CountingEmbeddings(embeddings)
 
     vectorstore, connection_string = get_vectorstore(
         collection_name=vectorstore_config_dict['collection_name'],
@@ -85,22 +157,132 @@ def store_topic_data(
     )
     
     if vectorstore:
-        # define record manager
-        namespace = f"pgvector/{vectorstore_config_dict['collection_name']}"
-        record_manager = SQLRecordManager(
-            namespace, db_url=connection_string
+        record_manager = get_record_manager(
+            collection_name=vectorstore_config_dict['collection_name'],
+            connection_string=connection_string
         )
-        record_manager.create_schema()
 
     if not vectorstore:
         logger.error("VectorStore could not be initialized")
-        return
+        return True # Nothing to continue
 
     # Process all files in the "documents" folder
-    process_documents(
+    return process_documents(
         bucket=bucket,
         topic=topic,
         vectorstore=vectorstore,
         embeddings=embeddings,
-        record_manager=record_manager
+        record_manager=record_manager,
+        fingerprint_store=DocumentFingerprintStore(connection_string),
+        chunking_strategy=chunking_strategy,
+        time_remaining=time_remaining
+    )
+
+def store_documents_data(
+    bucket: str, 
+    topic: str, 
+    filenames: List[str],
+    vectorstore_config_dict: Dict[str, str], 
+    embeddings: BedrockEmbeddings,
+    chunking_strategy: Optional[str] = None,
+    linked_topics: Optional[List[str]] = None,
+    time_remaining: Optional[Callable[[], int]] = None
+) -> bool:
+    """
+    Store the data of the given documents from an S3 bucket into the vectorstore.
+    
+    Args:
+    bucket (str): The name of the S3 bucket.
+    topic (str): The topic name/folder in the S3 bucket.
+    filenames (List[str]): The names of the document files in the topic's "documents" folder.
+    vectorstore_config_dict (Dict[str, str]): The configuration dictionary for the vectorstore.
+    embeddings (BedrockEmbeddings): The embeddings instance.
+    chunking_strategy (Optional[str]): The name of the chunking strategy. Defaults to None, which uses the configured default.
+    linked_topics (Optional[List[str]]): Topics whose collections receive the same chunks, such as the General topic. Defaults to None.
+    time_remaining (Optional[Callable[[], int]]): Returns the remaining time of the invocation in milliseconds. Defaults to None, which means no deadline.
+    
+    Returns:
+    bool: False if processing stopped early to meet the deadline and has to be continued.
+    """
+    # Lets the index batches report how much of their time went to embedding
+    embeddings = CountingEmbeddings(embeddings)
+
+    vectorstore, connection_string = get_vectorstore(
+        collection_name=vectorstore_config_dict['collection_name'],
+        embeddings=embeddings,
+        dbname=vectorstore_config_dict['dbname'],
+        user=vectorstore_config_dict['user'],
+        password=vectorstore_config_dict['password'],
+        host=vectorstore_config_dict['host'],
+        port=int(vectorstore_config_dict['port'])
+    )
+
+    if not vectorstore:
+        logger.error("VectorStore could not be initialized")
+        return True # Nothing to continue
+
+    record_manager = get_record_manager(
+        collection_name=vectorstore_config_dict['collection_name'],
+        connection_string=connection_string
+    )
+
+    linked_collections = []
+    for linked_topic in linked_topics or []:
+        linked_vectorstore, _ = get_vectorstore(
+            collection_name=linked_topic,
+            embeddings=embeddings,
+            dbname=vectorstore_config_dict['dbname'],
+            user=vectorstore_config_dict['user'],
+            password=vectorstore_config_dict['password'],
+            host=vectorstore_config_dict['host'],
+            port=int(vectorstore_config_dict['port'])
+        )
+        linked_collections.append(LinkedCollection(
+            topic=linked_topic,
+            vectorstore=linked_vectorstore,
+            record_manager=get_record_manager(collection_name=linked_topic, connection_string=connection_string),
+            fingerprint_store=DocumentFingerprintStore(connection_string),
+            bucket=bucket
+        ))
+
+    return process_selected_documents(
+        bucket=bucket,
+        topic=topic,
+        filenames=filenames,
+        vectorstore=vectorstore,
+        embeddings=embeddings,
+        record_manager=record_manager,
+        fingerprint_store=DocumentFingerprintStore(connection_string),
+        chunking_strategy=chunking_strategy,
+        linked_collections=linked_collections,
+        time_remaining=time_remaining
+    )
+
+def delete_documents_data(
+    topic: str,
+    filenames: List[str],
+    vectorstore_config_dict: Dict[str, str]
+) -> int:
+    """
+    Remove the data of deleted documents from the vectorstore.
+    
+    Args:
+    topic (str): The topic name/folder in the S3 bucket.
+    filenames (List[str]): The names of the deleted document files.
+    vectorstore_config_dict (Dict[str, str]): The configuration dictionary for the vectorstore.
+    
+    Returns:
+    int: The number of deleted chunks.
+    """
+    connection_string = get_connection_string(
+        dbname=vectorstore_config_dict['dbname'],
+        user=vectorstore_config_dict['user'],
+        password=vectorstore_config_dict['password'],
+        host=vectorstore_config_dict['host'],
+        port=int(vectorstore_config_dict['port'])
+    )
+    return delete_documents(
+        connection_string=connection_string,
+        topic=topic,
+        filenames=filenames
     )
@@ -0,0 +1,326 @@
+import os
+import logging
+import math
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, Engine
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "hnsw" or "ivfflat"
+ANN_INDEX_TYPE = os.environ.get("ANN_INDEX_TYPE", "hnsw")
+# Collections below this size stay on exact search, which is fast enough and has perfect recall
+ANN_INDEX_MIN_ROWS = int(os.environ.get("ANN_INDEX_MIN_ROWS", "10000"))
+# An index is rebuilt once the collection grew or shrank by this fraction since it was built
+ANN_INDEX_REBUILD_FRACTION = float(os.environ.get("ANN_INDEX_REBUILD_FRACTION", "0.5"))
+ANN_INDEX_MAINTENANCE_WORK_MEM = os.environ.get("ANN_INDEX_MAINTENANCE_WORK_MEM", "256MB")
+HNSW_M = int(os.environ.get("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.environ.get("HNSW_EF_CONSTRUCTION", "64"))
+# What the index is built on: "full" float32 vectors, "halfvec" half-precision copies, "binary" quantized
+# bits, or "truncated" leading dimensions for models trained to keep them meaningful (Matryoshka).
+# The table keeps the full vectors, which rescore the candidates found with the compact index.
+# Text generation searches with the same setting, so both functions must be configured alike.
+VECTOR_STORAGE_MODE = os.environ.get("VECTOR_STORAGE_MODE", "full")
+VECTOR_TRUNCATE_DIMENSIONS = int(os.environ.get("VECTOR_TRUNCATE_DIMENSIONS", "256"))
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+# Kept below the RDS Proxy idle client timeout, so pooled connections are replaced before the proxy drops them
+DB_POOL_RECYCLE_SECONDS = int(os.environ.get("DB_POOL_RECYCLE_SECONDS", "1500"))
+
+# pgvector cannot index vectors with more dimensions than this
+MAX_INDEXED_DIMENSIONS = {"full": 2000, "halfvec": 4000, "binary": 64000, "truncated": 2000}
+
+# One pooled engine per connection string, reused across warm invocations
+search_engines: Dict[str, Engine] = {}
+
+def create_search_engine(connection_string: str) -> Engine:
+    """
+    Create a pooled database engine. Settings are changed around single statements and reset
+    afterwards, since connections are shared and session-level settings pin them in RDS Proxy.
+
+    Args:
+    connection_string (str): The database connection string.
+
+    Returns:
+    Engine: The engine, shared by the vectorstores, the record managers and the ingestion tables.
+    """
+    return create_engine(
+        connection_string,
+        pool_size=DB_POOL_SIZE,
+        pool_recycle=DB_POOL_RECYCLE_SECONDS,
+        # Connections left idle between invocations may have been closed by the proxy or a failover
+        pool_pre_ping=True,
+    )
+
+def get_search_engine(connection_string: str) -> Engine:
+    """
+    Return the shared engine of a connection string, creating it on first use.
+
+    Args:
+    connection_string (str): The database connection string.
+
+    Returns:
+    Engine: The pooled engine, shared by every vectorstore and table of this database.
+    """
+    engine = search_engines.get(connection_string)
+    if engine is None:
+        engine = search_engines[connection_string] = create_search_engine(connection_string)
+    return engine
+
+def get_index_name(collection_uuid: str) -> str:
+    return f"langchain_pg_embedding_{ANN_INDEX_TYPE}_{collection_uuid.replace('-', '')}"
+
+def get_index_type() -> str:
+    """
+    Describe the index built for the configured index type and storage mode, as recorded in "Vector_Indexes".
+    A change of storage mode rebuilds the indexes, since the index name does not include it.
+    """
+    if VECTOR_STORAGE_MODE == "full":
+        return ANN_INDEX_TYPE
+    if VECTOR_STORAGE_MODE == "truncated":
+        return f"{ANN_INDEX_TYPE}_truncated{VECTOR_TRUNCATE_DIMENSIONS}"
+    return f"{ANN_INDEX_TYPE}_{VECTOR_STORAGE_MODE}"
+
+def get_compact_expressions(dimensions: int) -> Tuple[str, str, str, str]:
+    """
+    Build the SQL of the configured storage mode: the indexed expression over the embedding column, its
+    operator class, the distance operator and the matching expression over the :query_embedding parameter.
+
+    Args:
+    dimensions (int): The number of dimensions of the stored embeddings.
+
+    Returns:
+    Tuple[str, str, str, str]: The indexed expression, the operator class, the operator and the query expression.
+    """
+    if VECTOR_STORAGE_MODE == "halfvec":
+        return (
+            f"(embedding::halfvec({dimensions}))",
+            "halfvec_cosine_ops",
+            "<=>",
+            f"CAST(:query_embedding AS halfvec({dimensions}))",
+        )
+    if VECTOR_STORAGE_MODE == "binary":
+        return (
+            f"(binary_quantize(embedding)::bit({dimensions}))",
+            "bit_hamming_ops",
+            "<~>",
+            f"binary_quantize(CAST(:query_embedding AS vector))::bit({dimensions})",
+        )
+    if VECTOR_STORAGE_MODE == "truncated":
+        truncated = min(VECTOR_TRUNCATE_DIMENSIONS, dimensions)
+        return (
+            f"(subvector(embedding, 1, {truncated})::vector({truncated}))",
+            "vector_cosine_ops",
+            "<=>",
+            f"subvector(CAST(:query_embedding AS vector), 1, {truncated})::vector({truncated})",
+        )
+    return (
+        f"(embedding::vector({dimensions}))",
+        "vector_cosine_ops",
+        "<=>",
+        f"CAST(:query_embedding AS vector({dimensions}))",
+    )
+
+def get_collection_dimensions(conn: Connection, collection_name: str) -> Optional[int]:
+    """
+    Look up the number of dimensions of the most recently indexed embedding of a collection, which is
+    what the collection's current embedding model produces.
+
+    Args:
+    conn (Connection): A database connection.
+    collection_name (str): The name of the collection, which is the topic ID.
+
+    Returns:
+    Optional[int]: The number of dimensions, or None if the collection has no embeddings.
+    """
+    # The record manager's keys are the embedding IDs, and its indexes avoid scanning the embedding table
+    return conn.execute(
+        text("""
+            SELECT vector_dims(e.embedding) FROM upsertion_record r
+            JOIN langchain_pg_embedding e ON e.id = r.key
+            WHERE r.namespace = :namespace
+            ORDER BY r.updated_at DESC
+            LIMIT 1;
+        """),
+        {"namespace": f"pgvector/{collection_name}"},
+    ).scalar()
+
+def can_index(dimensions: int) -> bool:
+    if VECTOR_STORAGE_MODE == "truncated":
+        # Only the leading dimensions are indexed
+        return VECTOR_TRUNCATE_DIMENSIONS <= MAX_INDEXED_DIMENSIONS["truncated"]
+    return dimensions <= MAX_INDEXED_DIMENSIONS[VECTOR_STORAGE_MODE]
+
+def build_index(conn: Connection, index_name: str, collection_uuid: str, num_rows: int, dimensions: int) -> None:
+    """
+    Build a partial approximate nearest-neighbour index over the embeddings of one collection with
+    the given number of dimensions, in the configured storage mode.
+
+    Args:
+    conn (Connection): A connection in autocommit mode.
+    index_name (str): The name of the index.
+    collection_uuid (str): The UUID of the collection in langchain_pg_collection.
+    num_rows (int): The number of embeddings in the collection.
+    dimensions (int): The number of dimensions of the embeddings.
+    """
+    expression, operator_class, _, _ = get_compact_expressions(dimensions)
+    if ANN_INDEX_TYPE == "ivfflat":
+        # pgvector's guidance: rows / 1000 lists up to a million rows, sqrt(rows) above
+        lists = max(1, num_rows // 1000 if num_rows <= 1_000_000 else int(math.sqrt(num_rows)))
+        method = f"ivfflat ({expression} {operator_class}) WITH (lists = {lists})"
+    else:
+        method = f"hnsw ({expression} {operator_class}) WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})"
+
+    conn.execute(text(f"SET maintenance_work_mem = '{ANN_INDEX_MAINTENANCE_WORK_MEM}'"))
+    try:
+        # Built concurrently so retrieval keeps working, which needs a connection outside a transaction.
+        # Embeddings of another model fall outside the predicate rather than failing the cast on insert.
+        conn.execute(text(f"""
+            CREATE INDEX CONCURRENTLY "{index_name}" ON langchain_pg_embedding
+            USING {method}
+            WHERE collection_id = '{collection_uuid}' AND vector_dims(embedding) = {dimensions};
+        """))
+    finally:
+        conn.execute(text("RESET maintenance_work_mem"))
+
+def maintain_vector_index(connection_string: str, collection_name: str, timeout_ms: Optional[int] = None) -> Optional[str]:
+    """
+    Create, rebuild or drop the approximate nearest-neighbour index of a collection to match its size
+    and the number of dimensions of its embeddings. Meant to run after a collection was updated. Index
+    builds are recorded in the "Vector_Indexes" table, which is created by the database initializer.
+
+    Args:
+    connection_string (str): The database connection string.
+    collection_name (str): The name of the collection, which is the topic ID.
+    timeout_ms (Optional[int]): Cancels any statement running longer than this many milliseconds. A cancelled
+    build leaves an invalid index behind, which the next maintenance replaces. Defaults to None, which waits for the build.
+
+    Returns:
+    Optional[str]: "created", "rebuilt" or "dropped" if the index changed, otherwise None.
+    """
+    # Concurrent index builds cannot run inside a transaction
+    engine = get_search_engine(connection_string).execution_options(isolation_level="AUTOCOMMIT")
+    with engine.connect() as conn:
+        if timeout_ms is not None:
+            conn.execute(text(f"SET statement_timeout = {max(1, int(timeout_ms))}"))
+        try:
+            return update_vector_index(conn, collection_name)
+        finally:
+            if timeout_ms is not None:
+                # The connection goes back to the shared pool
+                conn.execute(text("RESET statement_timeout"))
+
+def update_vector_index(conn: Connection, collection_name: str) -> Optional[str]:
+    """
+    Bring the index of a collection up to date on a connection in autocommit mode, see maintain_vector_index.
+    """
+    collection_uuid = conn.execute(
+        text("SELECT uuid FROM langchain_pg_collection WHERE name = :collection_name"),
+        {"collection_name": collection_name},
+    ).scalar()
+    if collection_uuid is None:
+        return None
+    collection_uuid = str(collection_uuid)
+
+    # The record manager has one record per embedding and, unlike the embedding table, an index to count them with
+    num_rows = conn.execute(
+        text("SELECT count(*) FROM upsertion_record WHERE namespace = :namespace"),
+        {"namespace": f"pgvector/{collection_name}"},
+    ).scalar()
+    built = conn.execute(
+        text("""
+            SELECT index_name, index_type, num_rows, dimensions FROM "Vector_Indexes"
+            WHERE collection_name = :collection_name;
+        """),
+        {"collection_name": collection_name},
+    ).one_or_none()
+    index_name = get_index_name(collection_uuid)
+    valid = conn.execute(
+        text("""
+            SELECT i.indisvalid FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = :index_name;
+        """),
+        {"index_name": index_name},
+    ).scalar()
+
+    dimensions = get_collection_dimensions(conn, collection_name) if num_rows >= ANN_INDEX_MIN_ROWS else None
+    if num_rows < ANN_INDEX_MIN_ROWS or dimensions is None or not can_index(dimensions):
+        if built is None and valid is None:
+            return None
+        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"'))
+        if built is not None and built.index_name != index_name:
+            conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{built.index_name}"'))
+        conn.execute(
+            text('DELETE FROM "Vector_Indexes" WHERE collection_name = :collection_name'),
+            {"collection_name": collection_name},
+        )
+        logger.info(f"Dropped the vector index of collection {collection_name} with {num_rows} embeddings of {dimensions} dimensions.")
+        return "dropped"
+
+    index_type = get_index_type()
+    # An index of another storage mode or embedding model has the same name but a different expression
+    same_type = built is None or (built.index_type == index_type and built.dimensions == dimensions)
+    if valid and same_type and built is not None and built.index_name == index_name and (
+        abs(num_rows - built.num_rows) <= ANN_INDEX_REBUILD_FRACTION * built.num_rows
+    ):
+        return None
+
+    action = "rebuilt" if valid or built is not None else "created"
+    if built is not None and built.index_name != index_name:
+        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{built.index_name}"'))
+    # A cancelled REINDEX CONCURRENTLY leaves an invalid copy of the index behind under another name
+    leftovers = conn.execute(
+        text("""
+            SELECT c.relname FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = 'langchain_pg_embedding'::regclass
+            AND NOT i.indisvalid
+            AND c.relname <> :index_name
+            AND pg_get_expr(i.indpred, i.indrelid) LIKE '%' || :collection_uuid || '%';
+        """),
+        {"index_name": index_name, "collection_uuid": collection_uuid},
+    ).scalars().all()
+    for leftover in leftovers:
+        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{leftover}"'))
+    if valid and same_type and ANN_INDEX_TYPE == "hnsw":
+        # The old index keeps serving queries until the new one is ready
+        conn.execute(text(f"SET maintenance_work_mem = '{ANN_INDEX_MAINTENANCE_WORK_MEM}'"))
+        try:
+            conn.execute(text(f'REINDEX INDEX CONCURRENTLY "{index_name}"'))
+        finally:
+            conn.execute(text("RESET maintenance_work_mem"))
+    else:
+        # IVFFlat lists depend on the collection size, and a failed or interrupted build leaves an invalid index behind
+        if valid is not None:
+            conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"'))
+        build_index(conn, index_name, collection_uuid, num_rows, dimensions)
+
+    conn.execute(
+        text("""
+            INSERT INTO "Vector_Indexes"
+            (collection_name, index_name, index_type, num_rows, dimensions, time_built)
+            VALUES (:collection_name, :index_name, :index_type, :num_rows, :dimensions, now())
+            ON CONFLICT (collection_name) DO UPDATE
+            SET index_name = EXCLUDED.index_name,
+                index_type = EXCLUDED.index_type,
+                num_rows = EXCLUDED.num_rows,
+                dimensions = EXCLUDED.dimensions,
+                time_built = EXCLUDED.time_built;
+        """),
+        {
+            "collection_name": collection_name,
+            "index_name": index_name,
+            "index_type": index_type,
+            "num_rows": num_rows,
+            "dimensions": dimensions,
+        },
+    )
+    logger.info(f"{action.capitalize()} the {index_type} index of collection {collection_name} with {num_rows} embeddings of {dimensions} dimensions.")
+    return action
+
+def get_collection_names(connection_string: str) -> List[str]:
+    with get_search_engine(connection_string).connect() as conn:
+        return list(conn.execute(text("SELECT name FROM langchain_pg_collection ORDER BY name")).scalars())
@@ -1,28 +1,73 @@
-from typing import Dict
+from typing import Callable, Dict, List, Optional
 
-from helpers.helper import store_topic_data
+from helpers.helper import store_topic_data, store_documents_data, delete_documents_data
 
 def update_vectorstore(
     bucket: str,
     topic: str,
     vectorstore_config_dict: Dict[str, str],
-    embeddings#: BedrockEmbeddings
-) -> None:
+    embeddings, #: BedrockEmbeddings
+    filenames: Optional[List[str]] = None,
+    chunking_strategy: Optional[str] = None,
+    linked_topics: Optional[List[str]] = None,
+    time_remaining: Optional[Callable[[], int]] = None
+) -> bool:
     """
     Update the vectorstore with embeddings for all documents and images in the S3 bucket.
+    If filenames are given, only those documents are (re)embedded and the rest of the topic is left untouched.
 
     Args:
     bucket (str): The name of the S3 bucket containing the topic folders.
     topic (str): The name of the topic folder within the S3 bucket.
     vectorstore_config_dict (Dict[str, str]): The configuration dictionary for the vectorstore, including parameters like collection name, database name, user, password, host, and port.
     embeddings (BedrockEmbeddings): The embeddings instance used to process the documents and images.
+    filenames (Optional[List[str]]): The names of the documents in the topic's "documents" folder to update. Defaults to None, which rebuilds the whole topic.
+    chunking_strategy (Optional[str]): The name of the chunking strategy used for the topic. Defaults to None, which uses the configured default.
+    linked_topics (Optional[List[str]]): Topics whose collections receive the chunks of the given documents, such as the General topic. Only used together with filenames. Defaults to None.
+    time_remaining (Optional[Callable[[], int]]): Returns the remaining time of the invocation in milliseconds. Defaults to None, which means no deadline.
 
     Returns:
-    None
+    bool: True if the update finished, False if it stopped early to meet the deadline. Running the same update again continues where it stopped.
     """
-    store_topic_data(
+    if filenames:
+        return store_documents_data(
+            bucket=bucket,
+            topic=topic,
+            filenames=filenames,
+            vectorstore_config_dict=vectorstore_config_dict,
+            embeddings=embeddings,
+            chunking_strategy=chunking_strategy,
+            linked_topics=linked_topics,
+            time_remaining=time_remaining
+        )
+
+    return store_topic_data(
         bucket=bucket,
         topic=topic,
         vectorstore_config_dict=vectorstore_config_dict,
-        embeddings=embeddings
-    )
\ No newline at end of file
+        embeddings=embeddings,
+        chunking_strategy=chunking_strategy,
+        time_remaining=time_remaining
+    )
+
+def remove_from_vectorstore(
+    topic: str,
+    filenames: List[str],
+    vectorstore_config_dict: Dict[str, str]
+) -> int:
+    """
+    Remove the chunks of deleted documents from the vectorstore without reindexing the rest of the topic.
+
+    Args:
+    topic (str): The name of the topic folder within the S3 bucket.
+    filenames (List[str]): The names of the deleted documents in the topic's "documents" folder.
+    vectorstore_config_dict (Dict[str, str]): The configuration dictionary for the vectorstore, including parameters like collection name, database name, user, password, host, and port.
+
+    Returns:
+    int: The number of deleted chunks.
+    """
+    return delete_documents_data(
+        topic=topic,
+        filenames=filenames,
+        vectorstore_config_dict=vectorstore_config_dict
+    )
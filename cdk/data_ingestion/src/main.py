@@ -1,12 +1,24 @@
 import os
 import json
+import time
 import boto3
 import psycopg2
+from psycopg2.extras import execute_values
+from botocore.config import Config
 from datetime import datetime, timezone
 import logging
+import mimetypes
 from collections import namedtuple
-
-from helpers.vectorstore import update_vectorstore
+from urllib.parse import unquote_plus
+
+from helpers.vectorstore import update_vectorstore, remove_from_vectorstore
+from helpers.helper import get_connection_string
+from helpers.embedding_cache import PostgresCacheBackedEmbeddings
+from helpers.embedding_executor import ConcurrentEmbeddings
+from helpers.vector_index import get_collection_names, maintain_vector_index
+from processing.documents import is_out_of_time
+from processing.extractors import report_extraction_metrics
+from processing.metrics import emit_invocation_summary, reset_invocation_metrics
 from langchain_aws import BedrockEmbeddings
 
 # Set up basic logging
@@ -19,19 +31,39 @@ QUANTUMAI_DATA_INGESTION_BUCKET = os.environ["BUCKET"]
 EMBEDDING_BUCKET_NAME = os.environ["EMBEDDING_BUCKET_NAME"]
 RDS_PROXY_ENDPOINT = os.environ["RDS_PROXY_ENDPOINT"]
 EMBEDDING_MODEL_PARAM = os.environ["EMBEDDING_MODEL_PARAM"]
+# "delta" only (re)embeds the uploaded object, "full" rebuilds the whole topic on every event
+INGESTION_MODE = os.environ.get("INGESTION_MODE", "delta")
+EMBEDDING_CACHE_MAX_AGE_DAYS = int(os.environ.get("EMBEDDING_CACHE_MAX_AGE_DAYS", "90"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "1000000"))
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.environ.get("BEDROCK_MAX_POOL_CONNECTIONS", "16"))
+EMBEDDING_MAX_CONCURRENCY = int(os.environ.get("EMBEDDING_MAX_CONCURRENCY", "8"))
+# Upper bound on chained continuation invocations of one ingestion, guarding against documents that never fit an invocation
+MAX_INGESTION_CONTINUATIONS = int(os.environ.get("MAX_INGESTION_CONTINUATIONS", "20"))
+# Index builds are cancelled this long before the invocation times out
+INDEX_MAINTENANCE_TIME_MARGIN_MS = int(os.environ.get("INDEX_MAINTENANCE_TIME_MARGIN_MS", "30000"))
+
+# Object metadata marking the General topic copy of a file uploaded to another topic
+GENERAL_COPY_METADATA_KEY = "source-topic"
 
 # AWS Clients
 secrets_manager_client = boto3.client("secretsmanager")
 ssm_client = boto3.client("ssm")
-bedrock_runtime = boto3.client("bedrock-runtime", region_name=REGION)
-s3_resource = boto3.resource("s3")
+bedrock_runtime = boto3.client(
+    "bedrock-runtime",
+    region_name=REGION,
+    config=Config(max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS),
+)
 s3_client = boto3.client("s3")
+lambda_client = boto3.client("lambda")
 
 # Cached resources
 connection = None
 db_secret = None
 EMBEDDING_MODEL_ID = None
 
+# Cached embeddings instance
+embeddings = None
+
 def get_secret():
     global db_secret
     if db_secret is None:
@@ -97,92 +129,82 @@ def parse_s3_file_path(file_key):
 
 
  
-def insert_file_into_db(topic_id, file_name, file_type, file_path, bucket_name):
-    connection = connect_to_db()
-    if connection is None:
-        logger.error("No database connection available.")
-        return {"statusCode": 500, "body": json.dumps("Database connection failed.")}
+def register_files_in_db(files):
+    """
+    Register many uploaded files in the Documents table with a single upsert.
+    Files that are already registered get their file path and upload time updated.
+
+    files: An iterable of (topic_id, file_name, file_type, file_path) tuples.
+    """
+    # A row may only be affected once per statement, so the last event for a file wins
+    rows = {}
+    timestamp = datetime.now(timezone.utc)
+    for topic_id, file_name, file_type, file_path in files:
+        rows[(topic_id, file_name, file_type)] = (topic_id, file_type, file_path, file_name, timestamp, "")
+    if not rows:
+        return
 
+    connection = connect_to_db()
+    cur = None
     try:
         cur = connection.cursor()
-
-        # Check if a record already exists
-        select_query = """
-        SELECT * FROM "Documents"
-        WHERE topic_id = %s
-        AND filename = %s
-        AND filetype = %s;
+        upsert_query = """
+            INSERT INTO "Documents"
+            (topic_id, filetype, filepath, filename, time_uploaded, metadata)
+            VALUES %s
+            ON CONFLICT (topic_id, filename, filetype) DO UPDATE
+            SET filepath = EXCLUDED.filepath,
+            time_uploaded = EXCLUDED.time_uploaded;
         """
-        cur.execute(select_query, (topic_id, file_name, file_type))
-
-        existing_file = cur.fetchone()
-
-        if existing_file:
-            # Update the existing record
-            update_query = """
-                UPDATE "Documents"
-                SET filepath = %s,
-                time_uploaded = %s
-                WHERE topic_id = %s
-                AND filename = %s
-                AND filetype = %s;
-            """
-            timestamp = datetime.now(timezone.utc)
-            cur.execute(
-                update_query,
-                (
-                    file_path,  # filepath
-                    timestamp,  # time_uploaded
-                    topic_id,  # topic_id
-                    file_name,  # filename
-                    file_type,  # filetype
-                ),
-            )
-            logger.info(
-                f"Successfully updated file {file_name}.{file_type} in database for topic {topic_id}."
-            )
-        else:
-            # Insert a new record
-            insert_query = """
-                INSERT INTO "Documents" 
-                (topic_id, filetype, filepath, filename, time_uploaded, metadata)
-                VALUES (%s, %s, %s, %s, %s, %s);
-            """
-            timestamp = datetime.now(timezone.utc)
-            cur.execute(
-                insert_query,
-                (
-                    topic_id,  # topic_id
-                    file_type,  # filetype
-                    file_path,  # filepath
-                    file_name,  # filename
-                    timestamp,  # time_uploaded
-                    "",  # metadata
-                ),
-            )
-        logger.info(
-            f"Successfully inserted file {file_name}.{file_type} into database for topic {topic_id}."
-        )
-
+        execute_values(cur, upsert_query, list(rows.values()), page_size=1000)
         connection.commit()
         cur.close()
+        logger.info(f"Successfully registered {len(rows)} files in the database.")
     except Exception as e:
         if cur:
             cur.close()
         if connection:
             connection.rollback()
-        logger.error(f"Error inserting file {file_name}.{file_type} into database: {e}")
+        logger.error(f"Error registering {len(rows)} files in the database: {e}")
         raise
 
-
  
-def update_vectorstore_from_s3(bucket, topic_id):
+def get_embeddings():
+    """
+    Return the embeddings instance, backed by the persistent embedding cache.
+    """
+    global embeddings
+    if embeddings is None:
+        db_secret = get_secret()
+        embedding_model_id = get_parameter()
+        embeddings = PostgresCacheBackedEmbeddings(
+            underlying_embeddings=ConcurrentEmbeddings(
+                underlying_embeddings=BedrockEmbeddings(
+                    model_id=embedding_model_id, 
+                    client=bedrock_runtime,
+                    region_name=REGION
+                ),
+                max_concurrency=EMBEDDING_MAX_CONCURRENCY,
+            ),
+            connection_string=get_connection_string(
+                dbname=db_secret["dbname"],
+                user=db_secret["username"],
+                password=db_secret["password"],
+                host=RDS_PROXY_ENDPOINT,
+                port=db_secret["port"],
+            ),
+            model_id=embedding_model_id,
+            max_age_days=EMBEDDING_CACHE_MAX_AGE_DAYS,
+            max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+        )
+    return embeddings
 
-    embeddings = BedrockEmbeddings(
-        model_id=get_parameter(), 
-        client=bedrock_runtime,
-        region_name=REGION
-    )
+def update_vectorstore_from_s3(bucket, topic_id, file_names=None, linked_topic_ids=None, time_remaining=None):
+    """
+    Update the vectorstore of a topic. Returns False if the update stopped early to meet the invocation's deadline.
+    """
+
+    embeddings = get_embeddings()
 
     db_secret = get_secret()
 
@@ -196,21 +218,51 @@ def update_vectorstore_from_s3(bucket, topic_id):
     }
 
     try:
-        update_vectorstore(
+        return update_vectorstore(
             bucket=bucket,
             topic=topic_id,
             vectorstore_config_dict=vectorstore_config_dict,
             embeddings=embeddings,
+            filenames=file_names,
+            chunking_strategy=fetch_chunking_strategy(topic_id),
+            linked_topics=linked_topic_ids,
+            time_remaining=time_remaining,
         )
      
     except Exception as e:
         logger.error(f"Error updating vectorstore for topic {topic_id}: {e}")
         raise
 
+def remove_files_from_vectorstore(topic_id, file_names):
+    """
+    Remove the chunks of deleted files from the vectorstore of a topic, leaving its other documents untouched.
+    """
+    db_secret = get_secret()
+
+    vectorstore_config_dict = {
+        "collection_name": f"{topic_id}",
+        "dbname": db_secret["dbname"],
+        "user": db_secret["username"],
+        "password": db_secret["password"],
+        "host": RDS_PROXY_ENDPOINT,
+        "port": db_secret["port"],
+    }
+
+    try:
+        return remove_from_vectorstore(
+            topic=topic_id,
+            filenames=file_names,
+            vectorstore_config_dict=vectorstore_config_dict,
+        )
+    except Exception as e:
+        logger.error(f"Error removing files from vectorstore for topic {topic_id}: {e}")
+        raise
+
  
 def handle_object_created(topic_id, general_topic_id, bucket_name, file_key, file_category, file_name, file_type):
     """
     Handles the logic when the event is 'ObjectCreated:' and topic_id is not equal to general_topic_id.
+    The file is registered in the database together with the other files of the event by register_files_in_db.
     """
     if topic_id != general_topic_id:
         try:
@@ -219,37 +271,30 @@ def handle_object_created(topic_id, general_topic_id, bucket_name, file_key, fil
                 "Key": file_key,
             }
             copy_dest_key = f"{general_topic_id}/{file_category}/{file_name}.{file_type}"
-            s3_resource.meta.client.copy(copy_source, bucket_name, copy_dest_key)
+            # The managed copy switches to a multipart copy for large files, which copy_object can't handle
+            # above 5 GB. Replacing the metadata drops the content type, so it is set from the file name
+            # instead of fetching the source's with another request.
+            content_type = mimetypes.guess_type(file_key)[0] or "binary/octet-stream"
+            # The copy is marked with its source topic, whose ingestion links the chunks into the General collection
+            s3_client.copy(
+                copy_source,
+                bucket_name,
+                copy_dest_key,
+                ExtraArgs={
+                    "Metadata": {GENERAL_COPY_METADATA_KEY: topic_id},
+                    "MetadataDirective": "REPLACE",
+                    "ContentType": content_type,
+                },
+            )
          
          
         except Exception as e:
             logger.error(f"Error copying file {file_name}.{file_type} to general topic: {e}")
 
-    # Insert the file into the PostgreSQL database
-    try:
-        insert_file_into_db(
-            topic_id=topic_id,
-            file_name=file_name,
-            file_type=file_type,
-            file_path=file_key,
-            bucket_name=bucket_name,
-        )
-        logger.info(f"File {file_name}.{file_type} inserted successfully.")
-    except Exception as e:
-        logger.error(
-            f"Error inserting file {file_name}.{file_type} into database: {e}"
-        )
-        return {
-            "statusCode": 500,
-            "body": json.dumps(
-                f"Error inserting file {file_name}.{file_type}: {e}"
-            ),
-        }
-
  
 def handle_else_branch(topic_id, general_topic_id, bucket_name, file_category, file_name, file_type):
     """
-    Handles the logic when the event is not 'ObjectCreated:'.
+    Handles the logic when the event is 'ObjectRemoved:'.
     """
     logger.info(
         f"File {file_name}.{file_type} is being deleted. Deleting files from database does not occur here."
@@ -283,14 +328,265 @@ def fetch_general_topic_id():
         logger.error(f"Error fetching general topic id: {e}")
         raise
 
+def get_general_copy_source_topic(bucket_name, file_key):
+    """
+    Return the topic a General topic file was copied from, or None if it was uploaded to the General topic directly.
+    """
+    try:
+        metadata = s3_client.head_object(Bucket=bucket_name, Key=file_key).get("Metadata", {})
+        return metadata.get(GENERAL_COPY_METADATA_KEY)
+    except Exception as e:
+        logger.error(f"Error reading metadata of {file_key}: {e}")
+        return None
+
+def fetch_chunking_strategy(topic_id):
+    """
+    Fetch the chunking strategy configured for a topic, None meaning the default strategy.
+    """
+    try:
+        connection = connect_to_db()
+        cur = connection.cursor()
+
+        select_query = """
+        SELECT chunking_strategy FROM "Topics"
+        WHERE topic_id = %s;
+        """
+
+        cur.execute(select_query, (topic_id,))
+        result = cur.fetchone()
+        connection.commit()
+        cur.close()
+        return result[0] if result else None
+    except Exception as e:
+        cur.close()
+        connection.rollback()
+        logger.error(f"Error fetching chunking strategy for topic {topic_id}: {e}")
+        raise
+
+def enqueue_continuation(context, bucket, topic_id, file_names, full_rebuild, continuations):
+    """
+    Invoke this function asynchronously to continue ingesting a topic where this invocation stopped.
+    Documents finished so far are skipped by their stored fingerprints.
+    """
+    if continuations >= MAX_INGESTION_CONTINUATIONS:
+        raise RuntimeError(f"Ingestion of topic {topic_id} did not finish within {MAX_INGESTION_CONTINUATIONS} continuations.")
+    lambda_client.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType="Event",
+        Payload=json.dumps({
+            "continuation": {
+                "bucket": bucket,
+                "topic_id": topic_id,
+                "file_names": file_names,
+                "full_rebuild": full_rebuild,
+                "continuations": continuations + 1,
+            }
+        }),
+    )
+    logger.info(f"Enqueued continuation {continuations + 1} for topic {topic_id}.")
+
+def bump_collection_versions(topic_ids):
+    """
+    Advance the collection version of topics whose collection changed, which invalidates the answers
+    cached for them by the text generation function. A failure is logged without failing the ingestion.
+    """
+    cur = None
+    try:
+        connection = connect_to_db()
+        cur = connection.cursor()
+        cur.execute("""
+            UPDATE "Topics"
+            SET collection_version = COALESCE(collection_version, 0) + 1
+            WHERE topic_id = ANY(%s::uuid[]);
+        """, ([str(x) for x in set(topic_ids) if x],))
+        connection.commit()
+        cur.close()
+    except Exception as e:
+        if cur:
+            cur.close()
+            connection.rollback()
+        logger.error(f"Error updating the collection versions of topics {topic_ids}: {e}")
+
+def maintain_topic_index(topic_id, context=None):
+    """
+    Create, rebuild or drop the approximate nearest-neighbour index of a topic's collection after it changed.
+    A failure is logged without failing the ingestion, since retrieval falls back to exact search.
+    """
+    db_secret = get_secret()
+    try:
+        maintain_vector_index(
+            get_connection_string(
+                dbname=db_secret["dbname"],
+                user=db_secret["username"],
+                password=db_secret["password"],
+                host=RDS_PROXY_ENDPOINT,
+                port=db_secret["port"],
+            ),
+            topic_id,
+            context.get_remaining_time_in_millis() - INDEX_MAINTENANCE_TIME_MARGIN_MS if context else None,
+        )
+    except Exception as e:
+        logger.error(f"Error maintaining the vector index of topic {topic_id}: {e}")
+
+def maintain_topic_indexes(topic_ids, context):
+    """
+    Maintain the indexes of the given topics while enough time is left in the invocation, and hand the
+    remaining topics to an index maintenance invocation of this function.
+    """
+    time_remaining = context.get_remaining_time_in_millis if context else None
+    topic_ids = list(dict.fromkeys(topic_ids))
+    for i, topic_id in enumerate(topic_ids):
+        if is_out_of_time(time_remaining):
+            enqueue_index_maintenance(context, topic_ids[i:])
+            return
+        maintain_topic_index(topic_id, context)
+
+def enqueue_index_maintenance(context, topic_ids):
+    """
+    Invoke this function asynchronously to maintain the indexes of the given topics.
+    """
+    lambda_client.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType="Event",
+        Payload=json.dumps({"index_maintenance": {"topic_ids": topic_ids}}),
+    )
+    logger.info(f"Enqueued index maintenance for topics {topic_ids}.")
+
+def handle_index_maintenance(index_maintenance, context):
+    """
+    Maintain the indexes of the topics an earlier invocation did not have the time for. Without topic IDs,
+    every collection is maintained, which migrates all indexes after ANN_INDEX_TYPE or VECTOR_STORAGE_MODE changed.
+    """
+    topic_ids = index_maintenance.get("topic_ids")
+    if not topic_ids:
+        db_secret = get_secret()
+        topic_ids = get_collection_names(get_connection_string(
+            dbname=db_secret["dbname"],
+            user=db_secret["username"],
+            password=db_secret["password"],
+            host=RDS_PROXY_ENDPOINT,
+            port=db_secret["port"],
+        ))
+    maintain_topic_indexes(topic_ids, context)
+    return {"statusCode": 200, "body": json.dumps("Index maintenance finished.")}
+
+def ingest_topic(bucket, topic_id, general_topic_id, file_names, full_rebuild, context, continuations=0):
+    """
+    Ingest the uploaded files of a topic and rebuild the topic if requested. If the invocation runs
+    low on time, the remaining work is handed to a continuation invocation.
+    Returns True if the ingestion finished, False if it was continued.
+    """
+    time_remaining = context.get_remaining_time_in_millis if context else None
+
+    if INGESTION_MODE == "delta" and file_names:
+        # Uploads are always ingested here, since their General topic copies are not ingested on their own
+        completed = update_vectorstore_from_s3(
+            bucket,
+            topic_id,
+            file_names,
+            [general_topic_id] if topic_id != general_topic_id else None,
+            time_remaining,
+        )
+        if not completed:
+            enqueue_continuation(context, bucket, topic_id, file_names, full_rebuild, continuations)
+            return False
+    if full_rebuild:
+        # Documents ingested just above are skipped by their fingerprints
+        if not update_vectorstore_from_s3(bucket, topic_id, time_remaining=time_remaining):
+            enqueue_continuation(context, bucket, topic_id, [], True, continuations)
+            return False
+
+    if INGESTION_MODE == "delta" and file_names and topic_id != general_topic_id:
+        maintain_topic_indexes([topic_id, general_topic_id], context)
+    else:
+        maintain_topic_indexes([topic_id], context)
+    return True
+
+def report_metrics():
+    """
+    Log the extraction and embedding throughput and evict stale embedding cache entries.
+    """
+    report_extraction_metrics()
+    get_embeddings().underlying_embeddings.report()
+    try:
+        get_embeddings().evict()
+    except Exception as e:
+        logger.error(f"Error evicting embedding cache entries: {e}")
+
+def handle_continuation(continuation, context):
+    """
+    Continue an ingestion that a previous invocation stopped before its deadline.
+    """
+    topic_id = continuation["topic_id"]
+    general_topic_id = None
+    try:
+        general_topic_id = fetch_general_topic_id()
+        completed = ingest_topic(
+            continuation["bucket"],
+            topic_id,
+            general_topic_id,
+            continuation["file_names"],
+            continuation["full_rebuild"],
+            context,
+            continuation["continuations"],
+        )
+    except Exception as e:
+        logger.error(f"Error continuing ingestion of topic {topic_id}: {e}")
+        return {"statusCode": 500, "body": json.dumps(f"Error continuing ingestion of topic {topic_id}: {e}")}
+    finally:
+        # Chunks stored before a failure or a further continuation change the collection as well
+        bump_collection_versions([topic_id, general_topic_id])
+
+    report_metrics()
+    message = f"Vectorstore updated successfully for topic {topic_id}." if completed else f"Ingestion of topic {topic_id} continues in another invocation."
+    logger.info(message)
+    return {"statusCode": 200, "body": json.dumps(message)}
+
 def handler(event, context):
+    start = time.perf_counter()
+    reset_invocation_metrics()
+    response = None
+    try:
+        response = handle_event(event, context)
+        return response
+    finally:
+        # One record per invocation, summing the document and index batch records emitted along the way
+        status_code = response["statusCode"] if response else 500
+        emit_invocation_summary(
+            {
+                "duration_seconds": time.perf_counter() - start,
+                "records": len(event.get("Records", [])),
+                "errors": int(status_code >= 500),
+            },
+            {
+                "request_id": getattr(context, "aws_request_id", None),
+                "status_code": status_code,
+                "continuation": "continuation" in event,
+                "ingestion_mode": INGESTION_MODE,
+            }
+        )
+
+def handle_event(event, context):
+    if "continuation" in event:
+        return handle_continuation(event["continuation"], context)
+    if "index_maintenance" in event:
+        return handle_index_maintenance(event["index_maintenance"], context)
+
     records = event.get("Records", [])
     if not records:
         return {"statusCode": 400, "body": json.dumps("No valid S3 event found.")}
 
     general_topic_id = fetch_general_topic_id()
+
+    # Records are grouped per topic so that each affected collection is reindexed once
+    topic_updates = {}
+    results = []
+    # Uploaded files are registered in the database with a single statement once all records are read
+    created_files = []
      
     for record in records:
+        result = {"eventName": record.get("eventName"), "status": "skipped"}
+        results.append(result)
         try:
             event_name = record["eventName"]
             bucket_name = record["s3"]["bucket"]["name"]
@@ -298,52 +594,112 @@ def handler(event, context):
             # Only process files from the QUANTUMAI_DATA_INGESTION_BUCKET
             if bucket_name != QUANTUMAI_DATA_INGESTION_BUCKET:
                 continue  # Ignore this event and move to the next one
-            file_key = record["s3"]["object"]["key"]
+            # Object keys in S3 event notifications are URL-encoded
+            file_key = unquote_plus(record["s3"]["object"]["key"])
+            result["location"] = f"s3://{bucket_name}/{file_key}"
 
-            # if event_name.startswith('ObjectCreated:'):
             # Parse the file path
-            result = parse_s3_file_path(file_key)
+            file_path = parse_s3_file_path(file_key)
+
+            if not isinstance(file_path, S3FilePath) or not file_path.topic_id or not file_path.file_name or not file_path.file_type:
+                result.update(status="error", message="Error parsing S3 file path.")
+                continue
 
             # Access the parsed components from the named tuple
-            topic_id, file_category, file_name, file_type = result.topic_id, result.file_category, result.file_name, result.file_type
+            topic_id, file_category, file_name, file_type = file_path.topic_id, file_path.file_category, file_path.file_name, file_path.file_type
+            result["topic_id"] = topic_id
 
-            if not topic_id or not file_name or not file_type:
-                return {
-                    "statusCode": 400,
-                    "body": json.dumps("Error parsing S3 file path."),
-                }
+            topic_update = topic_updates.setdefault(
+                topic_id,
+                {"bucket": bucket_name, "file_names": [], "deleted_file_names": [], "full_rebuild": INGESTION_MODE != "delta", "results": []},
+            )
+            # Only the last event for a file within the batch decides whether it is ingested or removed
+            topic_file_name = f"{file_name}.{file_type}"
             
             if event_name.startswith("ObjectCreated:"):
+                topic_update["deleted_file_names"] = [x for x in topic_update["deleted_file_names"] if x != topic_file_name]
                 handle_object_created(topic_id, general_topic_id, bucket_name, file_key, file_category, file_name, file_type)
-            else:
+                created_files.append(((topic_id, file_name, file_type, file_key), result))
+                if INGESTION_MODE == "delta" and topic_id == general_topic_id:
+                    source_topic_id = get_general_copy_source_topic(bucket_name, file_key)
+                    if source_topic_id:
+                        # The chunks are linked into the General collection by the source topic's ingestion
+                        result.update(status="processed", message=f"Chunks shared from topic {source_topic_id}.")
+                        continue
+                # Only the uploaded object needs embedding unless a full rebuild is requested
+                topic_update["file_names"].append(topic_file_name)
+            elif event_name.startswith("ObjectRemoved:"):
                 handle_else_branch(topic_id, general_topic_id, bucket_name, file_category, file_name, file_type)
+                # The removed file's chunks are purged directly, the rest of the topic is left as it is
+                topic_update["file_names"] = [x for x in topic_update["file_names"] if x != topic_file_name]
+                topic_update["deleted_file_names"].append(topic_file_name)
+            else:
+                # Other events, such as completed restores, reconcile the whole topic
+                topic_update["full_rebuild"] = True
 
-            # Update embeddings for topic after the file is successfully inserted into the database
-            try:
-                update_vectorstore_from_s3(bucket_name, topic_id)
-                logger.info(f"Vectorstore updated successfully for topic {topic_id}.")
-            except Exception as e:
-                logger.error(f"Error updating vectorstore for topic {topic_id}: {e}")
-                return {
-                    "statusCode": 500,
-                    "body": json.dumps(
-                        f"File inserted, but error updating vectorstore: {e}"
-                    ),
-                }
-
-            return {
-                "statusCode": 200,
-                "body": json.dumps(
-                    {
-                        "message": "New file inserted into database.",
-                        "location": f"s3://{bucket_name}/{file_key}",
-                    }
-                ),
-            }
+            topic_update["results"].append(result)
+            result["status"] = "pending"
         except Exception as e:
             logger.error(f"Error processing record: {e}")
+            result.update(status="error", message=f"Error processing record: {e}")
+
+    if created_files:
+        try:
+            register_files_in_db([file for file, _ in created_files])
+        except Exception as e:
+            for _, result in created_files:
+                result.update(status="error", message=f"Error inserting file into database: {e}")
+            # Files missing from the database are not ingested, removals are still processed
+            for topic_update in topic_updates.values():
+                topic_update["file_names"] = []
+                topic_update["results"] = [x for x in topic_update["results"] if x["status"] != "error"]
+
+    # Update embeddings once per topic after the files are successfully inserted into the database
+    for topic_id, topic_update in topic_updates.items():
+        if not topic_update["results"]:
+            continue
+        try:
+            if topic_update["deleted_file_names"]:
+                remove_files_from_vectorstore(topic_id, topic_update["deleted_file_names"])
+            completed = ingest_topic(
+                topic_update["bucket"],
+                topic_id,
+                general_topic_id,
+                topic_update["file_names"],
+                topic_update["full_rebuild"],
+                context,
+            )
+            if completed:
+                logger.info(f"Vectorstore updated successfully for topic {topic_id}.")
+            for result in topic_update["results"]:
+                result["status"] = "processed"
+                if not completed:
+                    result["message"] = "File inserted, ingestion continues in another invocation."
+        except Exception as e:
+            logger.error(f"Error updating vectorstore for topic {topic_id}: {e}")
+            for result in topic_update["results"]:
+                result.update(status="error", message=f"File inserted, but error updating vectorstore: {e}")
+        finally:
+            # The General collection shares the chunks of every topic's uploads
+            bump_collection_versions([topic_id, general_topic_id])
+
+    if any(result["status"] == "processed" for result in results):
+        report_metrics()
+
+    if not any(result["status"] == "processed" for result in results):
+        if any(result["status"] == "error" for result in results):
+            return {"statusCode": 500, "body": json.dumps({"results": results})}
+        return {
+            "statusCode": 400,
+            "body": json.dumps("No new file upload or deletion event found."),
+        }
 
     return {
-        "statusCode": 400,
-        "body": json.dumps("No new file upload or deletion event found."),
+        "statusCode": 200,
+        "body": json.dumps(
+            {
+                "message": "S3 event records processed.",
+                "results": results,
+            }
+        ),
     }
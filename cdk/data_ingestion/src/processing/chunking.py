@@ -0,0 +1,110 @@
+import os, logging, time
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.documents import BaseDocumentTransformer
+from langchain_core.embeddings import Embeddings
+from langchain_experimental.text_splitter import SemanticChunker
+from langchain_text_splitters import RecursiveCharacterTextSplitter, TextSplitter
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Strategy used for topics that do not set their own chunking_strategy
+DEFAULT_CHUNKING_STRATEGY = os.environ.get("CHUNKING_STRATEGY", "semantic")
+CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", "200"))
+TOKEN_WINDOW_SIZE = int(os.environ.get("TOKEN_WINDOW_SIZE", "256"))
+TOKEN_WINDOW_OVERLAP = int(os.environ.get("TOKEN_WINDOW_OVERLAP", "32"))
+
+
+class CountingEmbeddings(Embeddings):
+    """
+    Counts the texts and requests sent to an embeddings instance and the time spent on them,
+    so the embedding cost of a chunker or an index batch can be reported.
+    """
+
+    def __init__(self, underlying_embeddings: Embeddings):
+        self.underlying_embeddings = underlying_embeddings
+        self.calls = 0
+        self.requests = 0
+        self.seconds = 0.0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += len(texts)
+        self.requests += 1
+        start = time.perf_counter()
+        try:
+            return self.underlying_embeddings.embed_documents(texts)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        self.requests += 1
+        start = time.perf_counter()
+        try:
+            return self.underlying_embeddings.embed_query(text)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+class TokenWindowTextSplitter(TextSplitter):
+    """
+    Splits text into fixed windows of whitespace-separated tokens that overlap by a fixed number of tokens.
+    """
+
+    def split_text(self, text: str) -> List[str]:
+        tokens = text.split()
+        step = max(1, self._chunk_size - self._chunk_overlap)
+        return [
+            " ".join(tokens[start:start + self._chunk_size])
+            for start in range(0, max(len(tokens) - self._chunk_overlap, 1), step)
+            if tokens[start:start + self._chunk_size]
+        ]
+
+class PageTextSplitter(TextSplitter):
+    """
+    Keeps every page as a single chunk.
+    """
+
+    def split_text(self, text: str) -> List[str]:
+        return [text] if text.strip() else []
+
+CHUNKING_STRATEGIES: Dict[str, Callable[[Embeddings], BaseDocumentTransformer]] = {
+    "semantic": lambda embeddings: SemanticChunker(embeddings),
+    "recursive": lambda embeddings: RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP),
+    "token": lambda embeddings: TokenWindowTextSplitter(chunk_size=TOKEN_WINDOW_SIZE, chunk_overlap=TOKEN_WINDOW_OVERLAP),
+    "page": lambda embeddings: PageTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=0),
+}
+
+def get_chunking_strategy(chunking_strategy: Optional[str] = None) -> str:
+    """
+    Resolve a chunking strategy name, falling back to the configured default for unknown or missing names.
+
+    Args:
+    chunking_strategy (Optional[str]): The name of the chunking strategy.
+
+    Returns:
+    str: The name of a registered chunking strategy.
+    """
+    if chunking_strategy in CHUNKING_STRATEGIES:
+        return chunking_strategy
+    if chunking_strategy:
+        logger.warning(f"Unknown chunking strategy {chunking_strategy}, using {DEFAULT_CHUNKING_STRATEGY}.")
+    return DEFAULT_CHUNKING_STRATEGY
+
+def get_text_splitter(
+    chunking_strategy: str,
+    embeddings: Embeddings
+) -> BaseDocumentTransformer:
+    """
+    Create the text splitter of a chunking strategy.
+
+    Args:
+    chunking_strategy (str): The name of the chunking strategy.
+    embeddings (Embeddings): The embeddings instance, only used by the semantic strategy.
+
+    Returns:
+    BaseDocumentTransformer: The text splitter, which provides create_documents.
+    """
+    return CHUNKING_STRATEGIES[get_chunking_strategy(chunking_strategy)](embeddings)
@@ -0,0 +1,64 @@
+import logging
+from typing import List
+
+from sqlalchemy import text
+
+from processing.documents import EMBEDDING_BUCKET_NAME, get_source_id
+from helpers.vector_index import get_search_engine
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def delete_documents(
+    connection_string: str,
+    topic: str,
+    filenames: List[str],
+    output_bucket: str = EMBEDDING_BUCKET_NAME
+) -> int:
+    """
+    Remove the chunks, record manager entries and fingerprints of deleted documents from a topic
+    in a single transaction, without touching the topic's other documents.
+
+    Args:
+    connection_string (str): The database connection string.
+    topic (str): The topic ID folder in the S3 bucket, which is also the name of its collection.
+    filenames (List[str]): The names of the deleted document files.
+    output_bucket (str, optional): The name of the S3 bucket used in the source IDs of the chunks.
+
+    Returns:
+    int: The number of deleted chunks.
+    """
+    if not filenames:
+        return 0
+    sources = [get_source_id(output_bucket, topic, filename) for filename in filenames]
+
+    with get_search_engine(connection_string).begin() as conn:
+        # Record manager keys are the IDs of the chunks in the vectorstore
+        num_deleted = conn.execute(
+            text("""
+                WITH deleted_records AS (
+                    DELETE FROM upsertion_record
+                    WHERE namespace = :namespace
+                    AND group_id = ANY(:sources)
+                    RETURNING key
+                )
+                DELETE FROM langchain_pg_embedding
+                WHERE id IN (SELECT key FROM deleted_records)
+                AND collection_id = (
+                    SELECT uuid FROM langchain_pg_collection WHERE name = :collection_name
+                );
+            """),
+            {"namespace": f"pgvector/{topic}", "sources": sources, "collection_name": topic},
+        ).rowcount
+        conn.execute(
+            text("""
+                DELETE FROM "Document_Fingerprints"
+                WHERE topic_id = :topic_id
+                AND filename = ANY(:filenames);
+            """),
+            {"topic_id": topic, "filenames": list(filenames)},
+        )
+
+    logger.info(f"Removed {num_deleted} chunks of {len(filenames)} deleted documents from topic {topic}.")
+    return num_deleted
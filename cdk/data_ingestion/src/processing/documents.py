@@ -1,15 +1,19 @@
-import os, tempfile, logging, uuid
+import os, logging, time, uuid
 from io import BytesIO
-from typing import List
-import boto3, pymupdf
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import boto3
+from botocore.exceptions import ClientError
 
 from langchain_postgres import PGVector
 from langchain_core.documents import Document
 from langchain_aws import BedrockEmbeddings
-from langchain_experimental.text_splitter import SemanticChunker
 from langchain.indexes import SQLRecordManager, index
 
-supported_types = [".pdf", ".docx", ".pptx", ".txt", ".xlsx", ".xps", ".mobi", ".cbz"]
+from processing.chunking import CountingEmbeddings, get_chunking_strategy, get_text_splitter
+from processing.extractors import extract_pages
+from processing.memory import get_peak_rss_mb, reset_peak_rss
+from processing.metrics import TimedReader, emit_metrics
+from processing.fingerprints import DocumentFingerprintStore
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -19,7 +23,55 @@ logger = logging.getLogger(__name__)
 s3 = boto3.client('s3')
 
 EMBEDDING_BUCKET_NAME = os.environ["EMBEDDING_BUCKET_NAME"]
+# Keep a copy of the extracted text of every page in the embedding bucket for debugging
+STORE_PAGE_TEXTS = os.environ.get("STORE_PAGE_TEXTS", "false").lower() == "true"
+# Pending documents are indexed once they add up to this many chunks, 0 indexes a topic in a single batch
+INDEX_BATCH_SIZE = int(os.environ.get("INDEX_BATCH_SIZE", "500"))
+# No new document is started once less time than this is left in the invocation, leaving time to index the pending batch
+INGESTION_TIME_MARGIN_MS = int(os.environ.get("INGESTION_TIME_MARGIN_MS", "120000"))
 
+class LinkedCollection(NamedTuple):
+    """
+    A collection that receives the chunks of documents indexed into another topic, such as the
+    General topic, instead of extracting, chunking and embedding its own copies of them.
+    """
+    topic: str
+    vectorstore: PGVector
+    record_manager: SQLRecordManager
+    fingerprint_store: Optional[DocumentFingerprintStore] = None
+    # The bucket holding the linked topic's own copies of the documents, which fingerprint them in this collection
+    bucket: Optional[str] = None
+
+
+def is_out_of_time(time_remaining: Optional[Callable[[], int]]) -> bool:
+    """
+    Check whether too little time is left in the invocation to start another document.
+    
+    Args:
+    time_remaining (Optional[Callable[[], int]]): Returns the remaining time in milliseconds, e.g. the Lambda context's get_remaining_time_in_millis. None means no deadline.
+    
+    Returns:
+    bool: True if no new document should be started.
+    """
+    return time_remaining is not None and time_remaining() < INGESTION_TIME_MARGIN_MS
+
+def get_source_id(
+    bucket: str,
+    topic: str,
+    filename: str
+) -> str:
+    """
+    Build the source ID that the record manager uses to group the chunks of a document.
+    
+    Args:
+    bucket (str): The name of the S3 bucket used for storing extracted data.
+    topic (str): The topic ID folder in the S3 bucket.
+    filename (str): The name of the document file.
+    
+    Returns:
+    str: The source ID of the document.
+    """
+    return f"s3://{bucket}/{topic}/documents/{filename}"
 
 def extract_txt(
     bucket: str, 
@@ -35,58 +87,85 @@ def extract_txt(
     Returns:
     str: The extracted text.
     """
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-        s3.download_fileobj(bucket, file_key, tmp_file)
-        tmp_file_path = tmp_file.name
+    return s3.get_object(Bucket=bucket, Key=file_key)["Body"].read().decode('utf-8')
 
-    try:
-        with open(tmp_file_path, 'r', encoding='utf-8') as file:
-            text = file.read()
-    finally:
-        os.remove(tmp_file_path)
-
-    return text
+def extract_doc_pages(
+    bucket: str, 
+    topic: str, 
+    filename: str,
+    span: Optional[Dict[str, float]] = None
+) -> Iterator[Tuple[int, str]]:
+    """
+    Extract the text of each page of a document stored in an S3 bucket with the extractor of its file type.
+    
+    Args:
+    bucket (str): The name of the S3 bucket containing the document.
+    topic (str): The topic ID folder in the S3 bucket.
+    filename (str): The name of the document file.
+    span (Optional[Dict[str, float]]): Receives the document's bytes, pages and download and extraction seconds. Defaults to None.
+    
+    Yields:
+    Tuple[int, str]: The page number, starting at 1, and the text of the page.
+    """
+    file_type = filename.rsplit('.', 1)[-1]  # Split on the last period
+    span = {} if span is None else span
+    
+    reset_peak_rss()
+    start = time.perf_counter()
+    response = s3.get_object(Bucket=bucket, Key=f"{topic}/documents/{filename}")
+    request_seconds = time.perf_counter() - start
+    body = TimedReader(response["Body"])
+    pages = extract_pages(body, response["ContentLength"], file_type)
+    page_count = 0
+    extractor_seconds = 0.0
+    
+    while True:
+        # Only the time spent in the extractor counts, not the time the consumer spends on each page
+        start = time.perf_counter()
+        page = next(pages, None)
+        extractor_seconds += time.perf_counter() - start
+        if page is None:
+            break
+        page_count += 1
+        yield page
+    
+    span.update(
+        size_bytes=response["ContentLength"],
+        pages=page_count,
+        download_seconds=request_seconds + body.seconds,
+        extract_seconds=extractor_seconds - body.seconds,
+    )
+    logger.info(
+        f"Extracted {page_count} pages of {filename} ({response['ContentLength'] / (1024 * 1024):.1f} MB), "
+        f"peak RSS {get_peak_rss_mb():.0f} MB."
+    )
 
 def store_doc_texts(
-    bucket: str, 
+    pages: Iterable[Tuple[int, str]], 
     topic: str, 
     filename: str, 
     output_bucket: str
-) -> List[str]:
+) -> Iterator[Tuple[int, str]]:
     """
-    Store the text of each page of a document in an S3 bucket.
+    Store the text of each page of a document in an S3 bucket while passing the pages through.
+    Only used for debugging the extraction, the pipeline itself does not read these files back.
     
     Args:
-    bucket (str): The name of the S3 bucket containing the document.
+    pages (Iterable[Tuple[int, str]]): The page number and text of each page of the document.
     topic (str): The topic ID folder in the S3 bucket.
     filename (str): The name of the document file.
     output_bucket (str): The name of the S3 bucket for storing the extracted text.
     
-    Returns:
-    List[str]: A list of keys for the stored text files in the output bucket.
+    Yields:
+    Tuple[int, str]: The page number and the text of the page.
     """
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-        s3.download_file(bucket, f"{topic}/documents/{filename}", tmp_file.name)
-        file_name, file_type = filename.rsplit('.', 1)  # Split on the last period
+    for page_num, text in pages:
+        page_output_key = f'{topic}/documents/{filename}_page_{page_num}.txt'
         
-        if file_type not in supported_types:
-            file_type = "txt"
-        doc = pymupdf.open(tmp_file.name, filetype=file_type)
+        with BytesIO(text.encode("utf8")) as page_output_buffer:
+            s3.upload_fileobj(page_output_buffer, output_bucket, page_output_key)
         
-        with BytesIO() as output_buffer:
-            for page_num, page in enumerate(doc, start=1):
-                text = page.get_text().encode("utf8")
-                output_buffer.write(text)
-                output_buffer.write(bytes((12,)))
-                
-                page_output_key = f'{topic}/documents/{filename}_page_{page_num}.txt'
-                
-                with BytesIO(text) as page_output_buffer:
-                    s3.upload_fileobj(page_output_buffer, output_bucket, page_output_key)
-
-        os.remove(tmp_file.name)
-
-    return [f'{topic}/documents/{filename}_page_{page_num}.txt' for page_num in range(1, len(doc) + 1)]
+        yield page_num, text
 
 def add_document(
     bucket: str, 
@@ -94,7 +173,8 @@ def add_document(
     filename: str, 
     vectorstore: PGVector, 
     embeddings: BedrockEmbeddings,
-    output_bucket: str = EMBEDDING_BUCKET_NAME
+    output_bucket: str = EMBEDDING_BUCKET_NAME,
+    chunking_strategy: Optional[str] = None
 ) -> List[Document]:
     """
     Add a document to the vectorstore.
@@ -106,86 +186,327 @@ def add_document(
     vectorstore (PGVector): The vectorstore instance.
     embeddings (BedrockEmbeddings): The embeddings instance.
     output_bucket (str, optional): The name of the S3 bucket for storing extracted data. Defaults to 'temp-extracted-data'.
+    chunking_strategy (Optional[str]): The name of the chunking strategy. Defaults to None, which uses the configured default.
     
     Returns:
     List[Document]: A list of all document chunks for this document that were added to the vectorstore.
     """
-    
-    
-    output_filenames = store_doc_texts(
+    start = time.perf_counter()
+    span = {}
+    # Pages are streamed from the extractor straight into the chunker
+    pages = extract_doc_pages(
         bucket=bucket,
         topic=topic,
         filename=filename,
-        output_bucket=output_bucket
+        span=span
     )
     
+    if STORE_PAGE_TEXTS:
+        pages = store_doc_texts(
+            pages=pages,
+            topic=topic,
+            filename=filename,
+            output_bucket=output_bucket
+        )
+    
     this_doc_chunks = store_doc_chunks(
-        bucket=output_bucket,
-        filenames=output_filenames,
+        pages=pages,
+        source=get_source_id(output_bucket, topic, filename),
         vectorstore=vectorstore,
-        embeddings=embeddings
+        embeddings=embeddings,
+        chunking_strategy=chunking_strategy,
+        span=span
+    )
+    
+    emit_metrics(
+        "document",
+        {
+            **span,
+            "chunks": len(this_doc_chunks),
+            "duration_seconds": time.perf_counter() - start,
+            "peak_rss_mb": get_peak_rss_mb(),
+        },
+        {
+            "topic_id": topic,
+            "filename": filename,
+            "file_type": filename.rsplit('.', 1)[-1].lower(),
+            "chunking_strategy": get_chunking_strategy(chunking_strategy),
+        }
     )
     
     return this_doc_chunks
 
 def store_doc_chunks(
-    bucket: str, 
-    filenames: List[str],
+    pages: Iterable[Tuple[int, str]], 
+    source: str,
     vectorstore: PGVector, 
-    embeddings: BedrockEmbeddings
+    embeddings: BedrockEmbeddings,
+    chunking_strategy: Optional[str] = None,
+    span: Optional[Dict[str, float]] = None
 ) -> List[Document]:
     """
     Store chunks of documents in the vectorstore.
     
     Args:
-    bucket (str): The name of the S3 bucket containing the text files.
-    filenames (List[str]): A list of keys for the text files in the bucket.
+    pages (Iterable[Tuple[int, str]]): The page number and text of each page of the document.
+    source (str): The source ID of the document.
     vectorstore (PGVector): The vectorstore instance.
     embeddings (BedrockEmbeddings): The embeddings instance.
+    chunking_strategy (Optional[str]): The name of the chunking strategy. Defaults to None, which uses the configured default.
+    span (Optional[Dict[str, float]]): Receives the chunking seconds and embedding calls. Defaults to None.
     
     Returns:
     List[Document]: A list of all document chunks for this document that were added to the vectorstore.
     """
-    text_splitter = SemanticChunker(embeddings)
+    chunking_strategy = get_chunking_strategy(chunking_strategy)
+    chunk_seconds = 0.0
+    chunking_embeddings = CountingEmbeddings(embeddings)
+    text_splitter = get_text_splitter(chunking_strategy, chunking_embeddings)
     this_doc_chunks = []
 
-    for filename in filenames:
+    for page_num, doc_texts in pages:
         this_uuid = str(uuid.uuid4()) # Generating one UUID for all chunks of from a specific page in the document
-        output_buffer = BytesIO()
-        s3.download_fileobj(bucket, filename, output_buffer)
-        output_buffer.seek(0)
-        doc_texts = output_buffer.read().decode('utf-8')
+        start = time.perf_counter()
         doc_chunks = text_splitter.create_documents([doc_texts])
-        
-        head, _, _ = filename.partition("_page")
-        true_filename = head 
+        chunk_seconds += time.perf_counter() - start
         
         doc_chunks = [x for x in doc_chunks if x.page_content]
         
         for doc_chunk in doc_chunks:
             if doc_chunk:
-                doc_chunk.metadata["source"] = f"s3://{bucket}/{true_filename}"
+                doc_chunk.metadata["source"] = source
                 doc_chunk.metadata["doc_id"] = this_uuid
                 
             else:
-                logger.warning(f"Empty chunk for {filename}")
-        
-        s3.delete_object(Bucket=bucket, Key=filename)
-        
+                logger.warning(f"Empty chunk for page {page_num} of {source}")
         
         this_doc_chunks.extend(doc_chunks)
+    
+    logger.info(
+        f"Chunked {source} with the {chunking_strategy} strategy into {len(this_doc_chunks)} chunks, "
+        f"spending {chunking_embeddings.calls} embedding calls on chunking."
+    )
+    if span is not None:
+        span.update(chunk_seconds=chunk_seconds, chunking_embedding_calls=chunking_embeddings.calls)
        
     return this_doc_chunks
                 
+def get_fingerprint(etag: str, chunking_strategy: Optional[str] = None) -> str:
+    """
+    Build the fingerprint stored for a document from its S3 ETag and the chunking strategy,
+    so documents are re-chunked when their topic switches strategies.
+    
+    Args:
+    etag (str): The ETag returned by S3 for the document.
+    chunking_strategy (Optional[str]): The name of the chunking strategy.
+    
+    Returns:
+    str: The document fingerprint.
+    """
+    etag = etag.strip('"')
+    return f"{etag}/{get_chunking_strategy(chunking_strategy)}"
+
+def register_unchanged_document(
+    record_manager: SQLRecordManager,
+    source: str,
+    chunk_ids: List[str]
+) -> None:
+    """
+    Refresh the record manager entries of a document whose content has not changed, so its
+    existing chunks survive cleanup without being re-extracted or re-embedded.
+    
+    Args:
+    record_manager (SQLRecordManager): Manages list of documents in the vectorstore for indexing.
+    source (str): The source ID of the document.
+    chunk_ids (List[str]): The record manager keys of the document's chunks.
+    """
+    if chunk_ids:
+        record_manager.update(chunk_ids, group_ids=[source] * len(chunk_ids))
+
+def cleanup_stale_records(
+    record_manager: SQLRecordManager,
+    vectorstore: PGVector,
+    before: float,
+    cleanup_batch_size: int = 1_000
+) -> int:
+    """
+    Delete every chunk whose record was not written or refreshed since the given time, which
+    is what a full cleanup does for sources that no longer exist.
+    
+    Args:
+    record_manager (SQLRecordManager): Manages list of documents in the vectorstore for indexing.
+    vectorstore (PGVector): The vectorstore instance.
+    before (float): The record manager time at which the current run started.
+    cleanup_batch_size (int, optional): The number of keys deleted per batch. Defaults to 1000.
+    
+    Returns:
+    int: The number of deleted chunks.
+    """
+    num_deleted = 0
+    while uids_to_delete := record_manager.list_keys(before=before, limit=cleanup_batch_size):
+        vectorstore.delete(uids_to_delete)
+        record_manager.delete_keys(uids_to_delete)
+        num_deleted += len(uids_to_delete)
+    return num_deleted
+
+def get_linked_fingerprint(
+    linked: LinkedCollection,
+    filename: str,
+    fingerprint: str,
+    chunking_strategy: Optional[str] = None
+) -> str:
+    """
+    Build the fingerprint recorded for a document in a linked collection.
+    The linked topic's copy of a document can have a different ETag than the source, as a
+    multipart copy gets its own, so it is fingerprinted from the copy. Otherwise a full
+    rebuild of the linked topic would see every shared document as changed.
+    
+    Args:
+    linked (LinkedCollection): The linked collection.
+    filename (str): The name of the document file.
+    fingerprint (str): The fingerprint of the document in the source topic.
+    chunking_strategy (Optional[str]): The name of the chunking strategy the chunks were cut with.
+    
+    Returns:
+    str: The fingerprint of the linked copy, or the source fingerprint if the copy can't be found.
+    """
+    if not linked.bucket:
+        return fingerprint
+    
+    try:
+        etag = s3.head_object(Bucket=linked.bucket, Key=f"{linked.topic}/documents/{filename}")["ETag"]
+    except ClientError as e:
+        logger.warning(f"Could not fetch the copy of {filename} in topic {linked.topic}, using the source fingerprint: {e}")
+        return fingerprint
+    return get_fingerprint(etag, chunking_strategy)
+
+def index_document_batch(
+    batch: List[Tuple[str, str, List[Document]]],
+    topic: str,
+    vectorstore: PGVector,
+    record_manager: SQLRecordManager,
+    fingerprint_store: Optional[DocumentFingerprintStore] = None,
+    output_bucket: str = EMBEDDING_BUCKET_NAME,
+    linked_collections: Optional[List[LinkedCollection]] = None,
+    chunking_strategy: Optional[str] = None
+) -> None:
+    """
+    Index the chunks of a batch of complete documents and record their fingerprints.
+    The same chunks are also indexed into every linked collection under the linked topic's source IDs,
+    and the fingerprints are only recorded once every collection has them.
+    A document must never be split across batches, because incremental cleanup would then delete
+    the chunks written for it by the previous batch.
+    
+    Args:
+    batch (List[Tuple[str, str, List[Document]]]): The filename, fingerprint and chunks of each document.
+    topic (str): The topic ID folder in the S3 bucket.
+    vectorstore (PGVector): The vectorstore instance.
+    record_manager (SQLRecordManager): Manages list of documents in the vectorstore for indexing.
+    fingerprint_store (Optional[DocumentFingerprintStore]): Stores the fingerprints of indexed documents.
+    output_bucket (str, optional): The name of the S3 bucket for storing extracted data.
+    linked_collections (Optional[List[LinkedCollection]]): Collections that share the chunks of this batch.
+    chunking_strategy (Optional[str]): The name of the chunking strategy, used to fingerprint the linked copies. Defaults to None.
+    """
+    batch_chunks = [chunk for _, _, doc_chunks in batch for chunk in doc_chunks]
+    
+    if batch_chunks:
+        # The embedding part of the index call can only be told apart when the vectorstore's embeddings are counted
+        counter = vectorstore.embeddings if isinstance(vectorstore.embeddings, CountingEmbeddings) else None
+        embed_before = (counter.calls, counter.requests, counter.seconds) if counter else (0, 0, 0.0)
+        start = time.perf_counter()
+        
+        # Incremental cleanup only touches the sources present in this batch, so the
+        # rest of the topic's collection is left as is
+        idx = index(
+            batch_chunks, 
+            record_manager, 
+            vectorstore, 
+            cleanup="incremental",
+            source_id_key="source"
+        )
+        
+        index_seconds = time.perf_counter() - start
+        embed_after = (counter.calls, counter.requests, counter.seconds) if counter else (0, 0, 0.0)
+        logger.info(f"Indexing updates: \n {idx}")
+        emit_metrics(
+            "index_batch",
+            {
+                "documents": len(batch),
+                "chunks": len(batch_chunks),
+                **idx,
+                "embedded_texts": embed_after[0] - embed_before[0],
+                "embedding_requests": embed_after[1] - embed_before[1],
+                "embed_seconds": embed_after[2] - embed_before[2],
+                "write_seconds": index_seconds - (embed_after[2] - embed_before[2]),
+                "duration_seconds": index_seconds,
+            },
+            {"topic_id": topic}
+        )
+    
+    for filename, _, doc_chunks in batch:
+        if not doc_chunks:
+            # Incremental cleanup has nothing to compare against when the document yields no
+            # chunks, so drop whatever was previously indexed for this source explicitly
+            stale_keys = record_manager.list_keys(group_ids=[get_source_id(output_bucket, topic, filename)])
+            if stale_keys:
+                vectorstore.delete(stale_keys)
+                record_manager.delete_keys(stale_keys)
+            logger.info(f"No chunks found for {filename}; removed {len(stale_keys)} stale chunks.")
+    
+    for linked in linked_collections or []:
+        # Only the source differs, so the chunk texts are embedded once and served from the embedding cache here
+        linked_batch = [
+            (
+                filename,
+                get_linked_fingerprint(linked, filename, fingerprint, chunking_strategy),
+                [
+                    Document(
+                        page_content=chunk.page_content,
+                        metadata={**chunk.metadata, "source": get_source_id(output_bucket, linked.topic, filename)}
+                    )
+                    for chunk in doc_chunks
+                ]
+            )
+            for filename, fingerprint, doc_chunks in batch
+        ]
+        index_document_batch(
+            linked_batch,
+            linked.topic,
+            linked.vectorstore,
+            linked.record_manager,
+            linked.fingerprint_store,
+            output_bucket
+        )
+    
+    # Fingerprints are written last, so a batch that failed for a linked collection is retried as a whole
+    if fingerprint_store:
+        for filename, fingerprint, _ in batch:
+            fingerprint_store.upsert_fingerprint(
+                topic=topic,
+                filename=filename,
+                fingerprint=fingerprint,
+                chunk_ids=record_manager.list_keys(group_ids=[get_source_id(output_bucket, topic, filename)])
+            )
+
 def process_documents(
     bucket: str, 
     topic: str, 
     vectorstore: PGVector, 
     embeddings: BedrockEmbeddings,
-    record_manager: SQLRecordManager
-) -> None:
+    record_manager: SQLRecordManager,
+    fingerprint_store: Optional[DocumentFingerprintStore] = None,
+    output_bucket: str = EMBEDDING_BUCKET_NAME,
+    index_batch_size: int = INDEX_BATCH_SIZE,
+    chunking_strategy: Optional[str] = None,
+    time_remaining: Optional[Callable[[], int]] = None
+) -> bool:
     """
     Process and add text documents from an S3 bucket to the vectorstore.
+    Documents whose fingerprint is unchanged since they were last indexed are skipped. Chunks are
+    indexed in batches as documents finish, so memory use does not grow with the size of the topic,
+    and chunks of removed documents are only deleted once every document has been seen.
+    When the invocation runs low on time, the pending batch is indexed and processing stops. The
+    stored fingerprints act as checkpoints, so running again continues with the remaining documents.
     
     Args:
     bucket (str): The name of the S3 bucket containing the text documents.
@@ -193,45 +514,173 @@ def process_documents(
     vectorstore (PGVector): The vectorstore instance.
     embeddings (BedrockEmbeddings): The embeddings instance.
     record_manager (SQLRecordManager): Manages list of documents in the vectorstore for indexing.
+    fingerprint_store (Optional[DocumentFingerprintStore]): Stores the fingerprints of indexed documents. Defaults to None, which processes every document.
+    output_bucket (str, optional): The name of the S3 bucket for storing extracted data.
+    index_batch_size (int, optional): The number of chunks after which the pending documents are indexed. 0 indexes everything at the end.
+    chunking_strategy (Optional[str]): The name of the chunking strategy. Defaults to None, which uses the configured default.
+    time_remaining (Optional[Callable[[], int]]): Returns the remaining time of the invocation in milliseconds. Defaults to None, which processes every document.
+    
+    Returns:
+    bool: True if every document was processed, False if processing stopped early to meet the deadline.
     """
+    # Chunks that are neither re-indexed nor re-registered during this run belong to removed sources
+    run_start = record_manager.get_time()
+    known_fingerprints = fingerprint_store.get_fingerprints(topic) if fingerprint_store else {}
+    
     paginator = s3.get_paginator('list_objects_v2')
     page_iterator = paginator.paginate(Bucket=bucket, Prefix=f"{topic}/")
-    all_doc_chunks = []
+    batch = []
+    batch_size = 0
+    seen_filenames = set()
+    num_unchanged = 0
+    num_processed = 0
+    completed = True
     
     for page in page_iterator:
+        if not completed:
+            break
         if "Contents" not in page:
             continue  # Skip pages without any content (e.g., if the bucket is empty)
         for file in page['Contents']:
             filename = file['Key']
             
             if filename.split('/')[-2] == "documents": # Ensures that only files in the 'documents' folder are processed
+                    filename = os.path.basename(filename)
+                    seen_filenames.add(filename)
+                    fingerprint = get_fingerprint(file['ETag'], chunking_strategy)
+                    known = known_fingerprints.get(filename)
+                    
+                    if known and known.fingerprint == fingerprint:
+                        register_unchanged_document(
+                            record_manager=record_manager,
+                            source=get_source_id(output_bucket, topic, filename),
+                            chunk_ids=known.chunk_ids
+                        )
+                        num_unchanged += 1
+                        continue
+                    
+                    if is_out_of_time(time_remaining):
+                        completed = False
+                        break
+                    
                     this_doc_chunks = add_document(
                         bucket=bucket,
                         topic=topic,
-                        filename=os.path.basename(filename),
+                        filename=filename,
                         vectorstore=vectorstore,
-                        embeddings=embeddings
+                        embeddings=embeddings,
+                        output_bucket=output_bucket,
+                        chunking_strategy=chunking_strategy
                     )
 
-                    all_doc_chunks.extend(this_doc_chunks)
+                    batch.append((filename, fingerprint, this_doc_chunks))
+                    batch_size += len(this_doc_chunks)
+                    num_processed += 1
+                    
+                    if index_batch_size and batch_size >= index_batch_size:
+                        index_document_batch(batch, topic, vectorstore, record_manager, fingerprint_store, output_bucket)
+                        batch = []
+                        batch_size = 0
     
-    if all_doc_chunks:  # Check if there are any documents to index
-        idx = index(
-            all_doc_chunks, 
-            record_manager, 
-            vectorstore, 
-            cleanup="full",
-            source_id_key="source"
+    if batch:
+        index_document_batch(batch, topic, vectorstore, record_manager, fingerprint_store, output_bucket)
+    
+    if not completed:
+        # Removed documents can only be told apart once every document has been seen
+        logger.info(f"Stopping before the deadline after indexing {num_processed} documents, skipped {num_unchanged} unchanged documents.")
+        return False
+    
+    if num_processed:
+        logger.info(f"Indexed {num_processed} documents, skipped {num_unchanged} unchanged documents.")
+    else:
+        logger.info(f"No changed documents found for indexing, skipped {num_unchanged} unchanged documents.")
+    
+    num_deleted = cleanup_stale_records(record_manager, vectorstore, before=run_start)
+    logger.info(f"Removed {num_deleted} chunks of deleted or emptied documents.")
+    
+    if fingerprint_store:
+        fingerprint_store.delete_fingerprints(topic, [x for x in known_fingerprints if x not in seen_filenames])
+    
+    return True
+
+def process_selected_documents(
+    bucket: str, 
+    topic: str, 
+    filenames: List[str],
+    vectorstore: PGVector, 
+    embeddings: BedrockEmbeddings,
+    record_manager: SQLRecordManager,
+    fingerprint_store: Optional[DocumentFingerprintStore] = None,
+    output_bucket: str = EMBEDDING_BUCKET_NAME,
+    index_batch_size: int = INDEX_BATCH_SIZE,
+    chunking_strategy: Optional[str] = None,
+    linked_collections: Optional[List[LinkedCollection]] = None,
+    time_remaining: Optional[Callable[[], int]] = None
+) -> bool:
+    """
+    Process and add the given documents from an S3 bucket to the vectorstore, replacing
+    any chunks previously indexed for the same sources.
+    Documents whose fingerprint is unchanged since they were last indexed are skipped, so
+    running again after stopping early continues with the remaining documents.
+    
+    Args:
+    bucket (str): The name of the S3 bucket containing the documents.
+    topic (str): The topic ID folder in the S3 bucket.
+    filenames (List[str]): The names of the document files to process.
+    vectorstore (PGVector): The vectorstore instance.
+    embeddings (BedrockEmbeddings): The embeddings instance.
+    record_manager (SQLRecordManager): Manages list of documents in the vectorstore for indexing.
+    fingerprint_store (Optional[DocumentFingerprintStore]): Stores the fingerprints of indexed documents. Defaults to None, which processes every document.
+    output_bucket (str, optional): The name of the S3 bucket for storing extracted data.
+    index_batch_size (int, optional): The number of chunks after which the pending documents are indexed. 0 indexes everything at the end.
+    chunking_strategy (Optional[str]): The name of the chunking strategy. Defaults to None, which uses the configured default.
+    linked_collections (Optional[List[LinkedCollection]]): Collections that receive the same chunks, such as the General topic's. Defaults to None.
+    time_remaining (Optional[Callable[[], int]]): Returns the remaining time of the invocation in milliseconds. Defaults to None, which processes every document.
+    
+    Returns:
+    bool: True if every document was processed, False if processing stopped early to meet the deadline.
+    """
+    known_fingerprints = fingerprint_store.get_fingerprints(topic) if fingerprint_store else {}
+    batch = []
+    batch_size = 0
+    completed = True
+    
+    for filename in dict.fromkeys(filenames): # Deduplicate while keeping the original order
+        if is_out_of_time(time_remaining):
+            logger.info(f"Stopping before the deadline, {filename} and the documents after it are left for the next run.")
+            completed = False
+            break
+        
+        fingerprint = get_fingerprint(
+            s3.head_object(Bucket=bucket, Key=f"{topic}/documents/{filename}")["ETag"],
+            chunking_strategy
         )
+        known = known_fingerprints.get(filename)
         
-        logger.info(f"Indexing updates: \n {idx}")
-    else:
-        idx = index(
-            [],
-            record_manager, 
-            vectorstore, 
-            cleanup="full",
-            source_id_key="source"
+        if known and known.fingerprint == fingerprint:
+            # Existing chunks are already registered and incremental cleanup won't touch them
+            logger.info(f"Skipping unchanged document {filename}.")
+            continue
+        
+        this_doc_chunks = add_document(
+            bucket=bucket,
+            topic=topic,
+            filename=filename,
+            vectorstore=vectorstore,
+            embeddings=embeddings,
+            output_bucket=output_bucket,
+            chunking_strategy=chunking_strategy
         )
-        logger.info("No documents found for indexing.")
-        
\ No newline at end of file
+        
+        batch.append((filename, fingerprint, this_doc_chunks))
+        batch_size += len(this_doc_chunks)
+        
+        if index_batch_size and batch_size >= index_batch_size:
+            index_document_batch(batch, topic, vectorstore, record_manager, fingerprint_store, output_bucket, linked_collections, chunking_strategy)
+            batch = []
+            batch_size = 0
+    
+    if batch:
+        index_document_batch(batch, topic, vectorstore, record_manager, fingerprint_store, output_bucket, linked_collections, chunking_strategy)
+    
+    return completed
@@ -0,0 +1,157 @@
+import os, tempfile, logging, mmap
+import multiprocessing
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Iterator, List, Tuple
+import pymupdf
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Documents with fewer pages are extracted serially, since forking workers costs more than it saves
+PARALLEL_EXTRACTION_MIN_PAGES = int(os.environ.get("PARALLEL_EXTRACTION_MIN_PAGES", "64"))
+# Upper bound on extraction workers, 0 uses every available CPU
+PARALLEL_EXTRACTION_MAX_WORKERS = int(os.environ.get("PARALLEL_EXTRACTION_MAX_WORKERS", "0"))
+# Set by Lambda to the configured memory, which the function's CPU share is proportional to
+LAMBDA_MEMORY_MB = int(os.environ.get("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "0"))
+# Lambda allocates one full vCPU per this much memory, although sched_getaffinity reports at least 2 CPUs
+LAMBDA_MB_PER_VCPU = 1769
+# Documents up to this size are opened from memory, larger ones are spilled to a memory-mapped file in /tmp.
+# Defaults to a quarter of the function's memory, leaving room for pymupdf, the chunks and the runtime.
+EXTRACTION_MEMORY_BUDGET_MB = int(os.environ.get("EXTRACTION_MEMORY_BUDGET_MB", str(LAMBDA_MEMORY_MB // 4 if LAMBDA_MEMORY_MB else 256)))
+# pymupdf's plain text flags, with ligatures expanded to plain letters and words hyphenated across lines joined,
+# which is the form the text is queried in
+TEXT_FLAGS = (pymupdf.TEXTFLAGS_TEXT & ~pymupdf.TEXT_PRESERVE_LIGATURES) | pymupdf.TEXT_DEHYPHENATE
+
+
+@contextmanager
+def open_document_stream(
+    body: BinaryIO,
+    content_length: int,
+    file_type: str
+) -> Iterator[Tuple[Callable[[], pymupdf.Document], bool]]:
+    """
+    Make a document available to pymupdf without writing it to a temporary file when it fits
+    the memory budget. Larger documents are streamed to a file in /tmp and memory-mapped, so
+    pymupdf reads the pages it needs from the page cache instead of a second full copy.
+
+    Args:
+    body (BinaryIO): The streaming body of the document, e.g. from S3 get_object.
+    content_length (int): The size of the document in bytes.
+    file_type (str): The file type passed to pymupdf.
+
+    Yields:
+    Tuple[Callable[[], pymupdf.Document], bool]: A function that opens the document, and whether the document is held in memory.
+    """
+    if content_length <= EXTRACTION_MEMORY_BUDGET_MB * 1024 * 1024:
+        data = body.read()
+        yield (lambda: pymupdf.open(stream=data, filetype=file_type)), True
+        return
+
+    with tempfile.TemporaryFile() as tmp_file:
+        for chunk in iter(lambda: body.read(1024 * 1024), b""):
+            tmp_file.write(chunk)
+        tmp_file.flush()
+        with mmap.mmap(tmp_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                yield (lambda: pymupdf.open(stream=view, filetype=file_type)), False
+            finally:
+                view.release()
+
+def get_worker_count(page_count: int) -> int:
+    """
+    Choose the number of extraction worker processes for a document.
+
+    Args:
+    page_count (int): The number of pages in the document.
+
+    Returns:
+    int: The number of workers, 1 meaning serial extraction.
+    """
+    if page_count < PARALLEL_EXTRACTION_MIN_PAGES:
+        return 1
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    if LAMBDA_MEMORY_MB:
+        # Workers beyond the function's whole vCPUs only time-slice the same CPU share
+        cpus = min(cpus, max(1, LAMBDA_MEMORY_MB // LAMBDA_MB_PER_VCPU))
+    if PARALLEL_EXTRACTION_MAX_WORKERS:
+        cpus = min(cpus, PARALLEL_EXTRACTION_MAX_WORKERS)
+    # Give every worker at least half of the serial threshold worth of pages
+    return max(1, min(cpus, page_count // max(1, PARALLEL_EXTRACTION_MIN_PAGES // 2)))
+
+def extract_page_range(
+    open_doc: Callable[[], pymupdf.Document],
+    start: int,
+    stop: int,
+    conn
+) -> None:
+    """
+    Extract the text of a range of pages in a worker process and send it back through a pipe.
+
+    Args:
+    open_doc (Callable[[], pymupdf.Document]): Opens the document.
+    start (int): The index of the first page to extract.
+    stop (int): The index after the last page to extract.
+    conn: The sending end of the pipe to the parent process.
+    """
+    try:
+        with open_doc() as doc:
+            pages = [(page_num + 1, doc[page_num].get_text(flags=TEXT_FLAGS)) for page_num in range(start, stop)]
+        conn.send(("ok", pages))
+    except Exception as e:
+        conn.send(("error", f"Error extracting pages {start + 1}-{stop}: {e}"))
+    finally:
+        conn.close()
+
+def extract_pages_parallel(
+    open_doc: Callable[[], pymupdf.Document],
+    page_count: int,
+    workers: int
+) -> Iterator[Tuple[int, str]]:
+    """
+    Extract the text of every page of a document by splitting the page range across worker processes.
+    Workers are plain processes connected by pipes, since Lambda provides no shared memory for
+    multiprocessing pools and queues. Every worker opens the document itself.
+
+    Args:
+    open_doc (Callable[[], pymupdf.Document]): Opens the document, called in each worker.
+    page_count (int): The number of pages in the document.
+    workers (int): The number of worker processes.
+
+    Yields:
+    Tuple[int, str]: The page number, starting at 1, and the text of the page, in page order.
+    """
+    # fork lets the workers inherit open_doc without pickling it
+    context = multiprocessing.get_context("fork")
+    bounds = [page_count * i // workers for i in range(workers + 1)]
+    processes: List[Tuple[multiprocessing.Process, object]] = []
+
+    try:
+        for start, stop in zip(bounds, bounds[1:]):
+            parent_conn, child_conn = context.Pipe(duplex=False)
+            process = context.Process(target=extract_page_range, args=(open_doc, start, stop, child_conn))
+            process.start()
+            child_conn.close()
+            processes.append((process, parent_conn))
+
+        logger.info(f"Extracting {page_count} pages with {workers} worker processes.")
+
+        # Results are read in worker order, which is page order
+        for (process, parent_conn), start, stop in zip(processes, bounds, bounds[1:]):
+            try:
+                status, result = parent_conn.recv()
+            except EOFError:
+                # The worker exited without sending its pages, e.g. when it crashed or was killed
+                process.join()
+                raise RuntimeError(f"Worker extracting pages {start + 1}-{stop} exited with code {process.exitcode} without a result.")
+            process.join()
+            if status != "ok":
+                raise RuntimeError(result)
+            yield from result
+    finally:
+        for process, parent_conn in processes:
+            parent_conn.close()
+            if process.is_alive():
+                process.terminate()
+            process.join()
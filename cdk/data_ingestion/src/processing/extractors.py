@@ -0,0 +1,241 @@
+import os, codecs, logging, re, tempfile, time, zipfile
+import xml.etree.ElementTree as ET
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from processing.extraction import (
+    EXTRACTION_MEMORY_BUDGET_MB,
+    TEXT_FLAGS,
+    extract_pages_parallel,
+    get_worker_count,
+    open_document_stream,
+)
+from processing.metrics import TimedReader
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Formats without a page layout of their own are split into pages of about this many characters
+TEXT_PAGE_CHARS = int(os.environ.get("TEXT_PAGE_CHARS", "3000"))
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Takes the body of a document, its size in bytes and its file type, and yields (page number, text) pairs
+PageExtractor = Callable[[BinaryIO, int, str], Iterator[Tuple[int, str]]]
+
+
+def paginate(lines: Iterable[str], page_chars: int = TEXT_PAGE_CHARS) -> Iterator[Tuple[int, str]]:
+    """
+    Group lines of text into pages of about the given number of characters, splitting overlong lines.
+
+    Args:
+    lines (Iterable[str]): The lines of text, without line endings.
+    page_chars (int, optional): The target number of characters per page.
+
+    Yields:
+    Tuple[int, str]: The page number, starting at 1, and the text of the page.
+    """
+    page_num = 0
+    page: List[str] = []
+    page_size = 0
+    for line in lines:
+        for start in range(0, max(len(line), 1), page_chars):
+            piece = line[start:start + page_chars]
+            if page and page_size + len(piece) > page_chars:
+                page_num += 1
+                yield page_num, "\n".join(page)
+                page, page_size = [], 0
+            page.append(piece)
+            page_size += len(piece) + 1
+    if page:
+        yield page_num + 1, "\n".join(page)
+
+def extract_text_pages(body: BinaryIO, content_length: int, file_type: str) -> Iterator[Tuple[int, str]]:
+    """
+    Decode a plain text document (txt, qasm) straight from its body, one chunk at a time.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+
+    def lines() -> Iterator[str]:
+        pending = ""
+        for chunk in iter(lambda: body.read(STREAM_CHUNK_SIZE), b""):
+            *complete, pending = (pending + decoder.decode(chunk)).split("\n")
+            yield from (x.rstrip("\r") for x in complete)
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            yield pending.rstrip("\r")
+
+    yield from paginate(lines())
+
+def extract_pymupdf_pages(body: BinaryIO, content_length: int, file_type: str) -> Iterator[Tuple[int, str]]:
+    """
+    Extract a paged document (pdf, xps, mobi, cbz) with pymupdf. Large documents are split
+    across worker processes, smaller ones are extracted serially.
+    """
+    with open_document_stream(body, content_length, file_type) as (open_doc, in_memory):
+        logger.debug(f"Opened {file_type} document {'in memory' if in_memory else 'memory-mapped'}.")
+        with open_doc() as doc:
+            page_count = doc.page_count
+            workers = get_worker_count(page_count)
+            if workers == 1:
+                for page_num, page in enumerate(doc, start=1):
+                    yield page_num, page.get_text(flags=TEXT_FLAGS)
+
+        if workers > 1:
+            yield from extract_pages_parallel(open_doc, page_count, workers)
+
+def open_zip(body: BinaryIO, content_length: int) -> tempfile.SpooledTemporaryFile:
+    """
+    Copy the body of a zip based document to a seekable file, kept in memory within the extraction memory budget.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=EXTRACTION_MEMORY_BUDGET_MB * 1024 * 1024)
+    for chunk in iter(lambda: body.read(STREAM_CHUNK_SIZE), b""):
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+def numbered_members(archive: zipfile.ZipFile, pattern: str) -> List[str]:
+    """
+    List the archive members matching a pattern with one number, such as slides or sheets, in numeric order.
+    """
+    matches = [(re.fullmatch(pattern, x), x) for x in archive.namelist()]
+    return [x for _, x in sorted((int(match.group(1)), x) for match, x in matches if match)]
+
+def element_text(element: ET.Element, text_tag: str, paragraph_tag: str) -> List[str]:
+    """
+    Collect the text of every paragraph below an Office Open XML element.
+    """
+    return [
+        "".join(x.text or "" for x in paragraph.iterfind(f".//{{*}}{text_tag}"))
+        for paragraph in element.iterfind(f".//{{*}}{paragraph_tag}")
+    ]
+
+def extract_docx_pages(body: BinaryIO, content_length: int, file_type: str) -> Iterator[Tuple[int, str]]:
+    """
+    Extract the paragraphs of a Word document, split into pages by size since docx has no fixed pages.
+    """
+    with open_zip(body, content_length) as spooled, zipfile.ZipFile(spooled) as archive:
+        document = ET.fromstring(archive.read("word/document.xml"))
+    yield from paginate(element_text(document, "t", "p"))
+
+def extract_pptx_pages(body: BinaryIO, content_length: int, file_type: str) -> Iterator[Tuple[int, str]]:
+    """
+    Extract a PowerPoint presentation with one page per slide.
+    """
+    with open_zip(body, content_length) as spooled, zipfile.ZipFile(spooled) as archive:
+        for page_num, member in enumerate(numbered_members(archive, r"ppt/slides/slide(\d+)\.xml"), start=1):
+            yield page_num, "\n".join(element_text(ET.fromstring(archive.read(member)), "t", "p"))
+
+def extract_xlsx_pages(body: BinaryIO, content_length: int, file_type: str) -> Iterator[Tuple[int, str]]:
+    """
+    Extract the cell values of an Excel workbook as tab separated rows, split into pages by size.
+    """
+    with open_zip(body, content_length) as spooled, zipfile.ZipFile(spooled) as archive:
+        shared_strings = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            shared_strings = [
+                "".join(x.text or "" for x in item.iterfind(".//{*}t"))
+                for item in ET.fromstring(archive.read("xl/sharedStrings.xml")).iterfind("{*}si")
+            ]
+
+        def rows() -> Iterator[str]:
+            for member in numbered_members(archive, r"xl/worksheets/sheet(\d+)\.xml"):
+                for row in ET.fromstring(archive.read(member)).iterfind(".//{*}row"):
+                    values = []
+                    for cell in row.iterfind("{*}c"):
+                        if cell.get("t") == "inlineStr":
+                            values.append("".join(x.text or "" for x in cell.iterfind(".//{*}t")))
+                            continue
+                        value = cell.find("{*}v")
+                        if value is None or value.text is None:
+                            continue
+                        values.append(shared_strings[int(value.text)] if cell.get("t") == "s" else value.text)
+                    if values:
+                        yield "\t".join(values)
+
+        yield from paginate(rows())
+
+EXTRACTORS: Dict[str, PageExtractor] = {
+    "txt": extract_text_pages,
+    "qasm": extract_text_pages,
+    "pdf": extract_pymupdf_pages,
+    "xps": extract_pymupdf_pages,
+    "mobi": extract_pymupdf_pages,
+    "cbz": extract_pymupdf_pages,
+    "docx": extract_docx_pages,
+    "pptx": extract_pptx_pages,
+    "xlsx": extract_xlsx_pages,
+}
+
+# Extraction totals per file type since the container started
+extraction_metrics: Dict[str, Dict[str, float]] = {}
+
+def get_extractor(file_type: str) -> Tuple[str, PageExtractor]:
+    """
+    Look up the extractor of a file type, falling back to plain text for unknown types.
+
+    Args:
+    file_type (str): The file extension, without the period.
+
+    Returns:
+    Tuple[str, PageExtractor]: The file type the extractor is registered under, and the extractor.
+    """
+    file_type = file_type.lower()
+    if file_type not in EXTRACTORS:
+        logger.warning(f"No extractor for file type {file_type}, reading it as plain text.")
+        file_type = "txt"
+    return file_type, EXTRACTORS[file_type]
+
+def extract_pages(body: BinaryIO, content_length: int, file_type: str) -> Iterator[Tuple[int, str]]:
+    """
+    Extract the pages of a document with the extractor of its file type, recording the time spent
+    in the extractor itself, not in reading the body or in the code consuming the pages.
+
+    Args:
+    body (BinaryIO): The streaming body of the document, e.g. from S3 get_object.
+    content_length (int): The size of the document in bytes.
+    file_type (str): The file extension, without the period.
+
+    Yields:
+    Tuple[int, str]: The page number, starting at 1, and the text of the page.
+    """
+    file_type, extractor = get_extractor(file_type)
+    metrics = extraction_metrics.setdefault(file_type, {"documents": 0, "pages": 0, "bytes": 0, "seconds": 0.0})
+    metrics["documents"] += 1
+    metrics["bytes"] += content_length
+
+    # Extractors read a streaming body as they go, so the time waiting for its bytes is subtracted
+    body = TimedReader(body)
+    pages = extractor(body, content_length, file_type)
+    while True:
+        start = time.perf_counter()
+        read_before = body.seconds
+        try:
+            page = next(pages)
+        except StopIteration:
+            break
+        finally:
+            metrics["seconds"] += time.perf_counter() - start - (body.seconds - read_before)
+        metrics["pages"] += 1
+        yield page
+
+def get_extraction_metrics() -> Dict[str, Dict[str, float]]:
+    """
+    Return the extraction totals per file type, including pages per second.
+
+    Returns:
+    Dict[str, Dict[str, float]]: The documents, pages, bytes, seconds and pages per second of each file type.
+    """
+    return {
+        file_type: {**metrics, "pages_per_sec": metrics["pages"] / metrics["seconds"] if metrics["seconds"] else 0.0}
+        for file_type, metrics in extraction_metrics.items()
+    }
+
+def report_extraction_metrics() -> None:
+    """
+    Log the extraction totals per file type.
+    """
+    for file_type, metrics in get_extraction_metrics().items():
+        logger.info(
+            f"Extracted {metrics['pages']} pages from {metrics['documents']} {file_type} documents "
+            f"({metrics['bytes'] / (1024 * 1024):.1f} MB) in {metrics['seconds']:.2f}s ({metrics['pages_per_sec']:.1f} pages/s)."
+        )
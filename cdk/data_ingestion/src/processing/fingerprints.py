@@ -0,0 +1,103 @@
+import logging
+from typing import Dict, List, NamedTuple
+
+from sqlalchemy import text
+
+from helpers.vector_index import get_search_engine
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class DocumentFingerprint(NamedTuple):
+    fingerprint: str
+    chunk_ids: List[str]
+
+class DocumentFingerprintStore:
+    """
+    Persists a content fingerprint (the S3 ETag) and the resulting chunk IDs for every
+    document indexed into a topic's collection, so unchanged documents can be skipped.
+    The "Document_Fingerprints" table is created by the database initializer.
+    """
+
+    def __init__(self, connection_string: str):
+        """
+        Args:
+        connection_string (str): The database connection string.
+        """
+        self.engine = get_search_engine(connection_string)
+
+    def get_fingerprints(self, topic: str) -> Dict[str, DocumentFingerprint]:
+        """
+        Fetch the fingerprints of all documents indexed for a topic.
+
+        Args:
+        topic (str): The topic ID folder in the S3 bucket.
+
+        Returns:
+        Dict[str, DocumentFingerprint]: The fingerprint and chunk IDs for each document filename.
+        """
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text("""
+                    SELECT filename, fingerprint, chunk_ids
+                    FROM "Document_Fingerprints"
+                    WHERE topic_id = :topic_id;
+                """),
+                {"topic_id": topic},
+            ).fetchall()
+        return {
+            filename: DocumentFingerprint(fingerprint, list(chunk_ids or []))
+            for filename, fingerprint, chunk_ids in rows
+        }
+
+    def upsert_fingerprint(
+        self,
+        topic: str,
+        filename: str,
+        fingerprint: str,
+        chunk_ids: List[str]
+    ) -> None:
+        """
+        Record the fingerprint and chunk IDs of a document after it has been indexed.
+
+        Args:
+        topic (str): The topic ID folder in the S3 bucket.
+        filename (str): The name of the document file.
+        fingerprint (str): The content fingerprint of the document.
+        chunk_ids (List[str]): The record manager keys of the document's chunks.
+        """
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("""
+                    INSERT INTO "Document_Fingerprints"
+                    (topic_id, filename, fingerprint, chunk_ids, time_indexed)
+                    VALUES (:topic_id, :filename, :fingerprint, :chunk_ids, now())
+                    ON CONFLICT (topic_id, filename) DO UPDATE
+                    SET fingerprint = EXCLUDED.fingerprint,
+                        chunk_ids = EXCLUDED.chunk_ids,
+                        time_indexed = EXCLUDED.time_indexed;
+                """),
+                {"topic_id": topic, "filename": filename, "fingerprint": fingerprint, "chunk_ids": chunk_ids},
+            )
+
+    def delete_fingerprints(self, topic: str, filenames: List[str]) -> None:
+        """
+        Forget the fingerprints of documents that are no longer part of a topic.
+
+        Args:
+        topic (str): The topic ID folder in the S3 bucket.
+        filenames (List[str]): The names of the document files.
+        """
+        if not filenames:
+            return
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("""
+                    DELETE FROM "Document_Fingerprints"
+                    WHERE topic_id = :topic_id
+                    AND filename = ANY(:filenames);
+                """),
+                {"topic_id": topic, "filenames": list(filenames)},
+            )
+        logger.info(f"Removed fingerprints for {len(filenames)} documents in topic {topic}.")
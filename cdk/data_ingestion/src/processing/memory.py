@@ -0,0 +1,34 @@
+import resource
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the peak resident set size of the current process, so the next reading covers a single unit of work.
+    Relies on Linux's /proc/self/clear_refs and does nothing where that is unavailable.
+
+    Returns:
+    bool: True if the peak was reset.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+def get_peak_rss_mb() -> float:
+    """
+    Read the peak resident set size of the current process since the last reset, or since it started.
+
+    Returns:
+    float: The peak resident set size in MB.
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is reported in KB on Linux and cannot be reset
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
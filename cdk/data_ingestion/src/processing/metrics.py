@@ -0,0 +1,103 @@
+import os, json, time
+from typing import BinaryIO, Dict, Optional
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "QuantumAI/DataIngestion")
+# Set to "false" to keep metric records out of stdout, e.g. for local runs
+EMIT_METRICS = os.environ.get("EMIT_METRICS", "true").lower() == "true"
+
+# CloudWatch units by metric name suffix, every other metric is a count
+METRIC_UNITS = {"_seconds": "Seconds", "_bytes": "Bytes", "_mb": "Megabytes"}
+
+# Totals of the current invocation per stage, summarized by emit_invocation_summary
+invocation_totals: Dict[str, Dict[str, float]] = {}
+
+
+class TimedReader:
+    """
+    Wraps a streaming body to measure the time spent waiting for its bytes, which separates the
+    download of a document from its extraction when both happen in the same loop.
+    """
+
+    def __init__(self, body: BinaryIO):
+        self.body = body
+        self.seconds = 0.0
+
+    def read(self, *args) -> bytes:
+        start = time.perf_counter()
+        try:
+            return self.body.read(*args)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+def get_unit(metric_name: str) -> str:
+    return next((unit for suffix, unit in METRIC_UNITS.items() if metric_name.endswith(suffix)), "Count")
+
+def emit_metrics(
+    stage: str,
+    metrics: Dict[str, float],
+    properties: Optional[Dict[str, object]] = None
+) -> dict:
+    """
+    Write a record in CloudWatch Embedded Metric Format to stdout, which Lambda forwards to CloudWatch Logs
+    where it is turned into metrics. Metrics are only dimensioned by stage, the properties (topic ID,
+    filename, ...) stay searchable in Logs Insights without creating a metric per value.
+    The metrics are also added to the totals of the current invocation.
+
+    Args:
+    stage (str): The pipeline stage, e.g. "document" or "index_batch".
+    metrics (Dict[str, float]): The metric values by name. The unit is derived from the name's suffix.
+    properties (Optional[Dict[str, object]]): Additional fields of the record that are not metrics.
+
+    Returns:
+    dict: The record.
+    """
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["Stage"]],
+                "Metrics": [{"Name": name, "Unit": get_unit(name)} for name in metrics],
+            }],
+        },
+        "Stage": stage,
+        **(properties or {}),
+        **metrics,
+    }
+    if EMIT_METRICS:
+        print(json.dumps(record, default=str), flush=True)
+
+    totals = invocation_totals.setdefault(stage, {"count": 0})
+    totals["count"] += 1
+    for name, value in metrics.items():
+        # A peak is not additive
+        totals[name] = max(totals.get(name, 0), value) if name.startswith("peak_") else totals.get(name, 0) + value
+    return record
+
+def reset_invocation_metrics() -> None:
+    invocation_totals.clear()
+
+def emit_invocation_summary(
+    metrics: Dict[str, float],
+    properties: Optional[Dict[str, object]] = None
+) -> dict:
+    """
+    Emit one record summarizing the invocation, with the totals of every stage prefixed by the
+    stage name (e.g. "document_pages", "index_batch_embed_seconds"), and start new totals.
+
+    Args:
+    metrics (Dict[str, float]): Metrics of the invocation itself, such as its duration.
+    properties (Optional[Dict[str, object]]): Additional fields of the record that are not metrics.
+
+    Returns:
+    dict: The record.
+    """
+    summary = {
+        f"{stage}_{name}": value
+        for stage, totals in invocation_totals.items()
+        for name, value in totals.items()
+    }
+    record = emit_metrics("invocation", {**summary, **metrics}, properties)
+    # Also drops the totals emit_metrics just added for the summary record itself
+    reset_invocation_metrics()
+    return record
@@ -0,0 +1,68 @@
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from processing import chunking
+from processing.chunking import (
+    CHUNKING_STRATEGIES,
+    CountingEmbeddings,
+    PageTextSplitter,
+    TokenWindowTextSplitter,
+    get_chunking_strategy,
+    get_text_splitter,
+)
+
+TEXT = (
+    "Qubits hold superpositions of zero and one. Entanglement links the states of qubits. "
+    "Decoherence destroys quantum information over time. Error correction spreads one logical qubit "
+    "over many physical qubits. Superconducting circuits are cooled close to absolute zero."
+)
+
+
+def test_registered_strategies_resolve_to_themselves():
+    for name in CHUNKING_STRATEGIES:
+        assert get_chunking_strategy(name) == name
+
+@pytest.mark.parametrize("name", [None, "", "unknown"])
+def test_missing_or_unknown_strategy_falls_back_to_the_default(monkeypatch, name):
+    monkeypatch.setattr(chunking, "DEFAULT_CHUNKING_STRATEGY", "recursive")
+    assert get_chunking_strategy(name) == "recursive"
+    assert isinstance(get_text_splitter(name, DeterministicFakeEmbedding(size=8)), type(CHUNKING_STRATEGIES["recursive"](None)))
+
+@pytest.mark.parametrize("name", sorted(CHUNKING_STRATEGIES))
+def test_every_strategy_chunks_a_page(name):
+    splitter = get_text_splitter(name, DeterministicFakeEmbedding(size=8))
+
+    chunks = splitter.create_documents([TEXT], metadatas=[{"source": "s3://bucket/topic/doc.pdf", "page": 1}])
+
+    assert chunks
+    assert all(chunk.page_content.strip() for chunk in chunks)
+    assert all(chunk.metadata == {"source": "s3://bucket/topic/doc.pdf", "page": 1} for chunk in chunks)
+
+def test_only_the_semantic_strategy_embeds():
+    for name in CHUNKING_STRATEGIES:
+        embeddings = CountingEmbeddings(DeterministicFakeEmbedding(size=8))
+        get_text_splitter(name, embeddings).create_documents([TEXT])
+        assert (embeddings.calls > 0) == (name == "semantic"), name
+
+def test_token_windows_overlap():
+    splitter = TokenWindowTextSplitter(chunk_size=4, chunk_overlap=1)
+
+    assert splitter.split_text("a b c d e f g h i j") == ["a b c d", "d e f g", "g h i j"]
+    assert splitter.split_text("a b") == ["a b"]
+    assert splitter.split_text("   ") == []
+
+def test_page_splitter_keeps_pages_whole():
+    splitter = PageTextSplitter(chunk_size=10, chunk_overlap=0)
+
+    assert splitter.split_text(TEXT) == [TEXT]
+    assert splitter.split_text(" \n ") == []
+
+def test_counting_embeddings_counts_texts_and_requests():
+    embeddings = CountingEmbeddings(DeterministicFakeEmbedding(size=8))
+
+    embeddings.embed_documents(["a", "b", "c"])
+    embeddings.embed_query("d")
+
+    assert embeddings.calls == 4
+    assert embeddings.requests == 2
+    assert embeddings.seconds >= 0
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from typing import List
+
+import pytest
+from botocore.exceptions import ClientError
+from langchain_core.embeddings import Embeddings
+
+from helpers import embedding_executor
+from helpers.embedding_executor import ConcurrentEmbeddings, is_throttling_error
+
+
+def throttling_error() -> ClientError:
+    return ClientError({"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, "InvokeModel")
+
+class FakeBedrockEmbeddings(Embeddings):
+    """
+    Embeds a text as [its length, its number], throttling requests beyond `capacity` in flight
+    and the first `throttle_first` requests, the way Bedrock rejects requests over its quota.
+    """
+
+    def __init__(self, capacity: int = 100, throttle_first: int = 0, delay: float = 0.01):
+        self.capacity = capacity
+        self.throttle_first = throttle_first
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        assert len(texts) == 1
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            throttle = self.calls <= self.throttle_first or self.in_flight > self.capacity
+            if throttle:
+                self.throttled += 1
+        try:
+            if throttle:
+                # BedrockEmbeddings re-raises client errors as ValueError
+                try:
+                    raise throttling_error()
+                except ClientError as e:
+                    raise ValueError(f"Error raised by inference endpoint: {e}") from e
+            time.sleep(self.delay)
+            return [[float(len(texts[0])), float(texts[0].split()[-1])]]
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+@pytest.fixture(autouse=True)
+def no_backoff_delay(monkeypatch):
+    monkeypatch.setattr(embedding_executor.random, "uniform", lambda low, high: 0.0)
+
+def test_is_throttling_error_follows_the_cause_chain():
+    try:
+        try:
+            raise throttling_error()
+        except ClientError as e:
+            raise ValueError("Error raised by inference endpoint") from e
+    except ValueError as e:
+        assert is_throttling_error(e)
+    assert not is_throttling_error(ValueError("Malformed input request"))
+
+def test_embeddings_keep_the_order_of_the_texts():
+    fake = FakeBedrockEmbeddings()
+    embeddings = ConcurrentEmbeddings(fake, max_concurrency=4)
+    texts = [f"{'x' * (i % 7)} {i}" for i in range(40)]
+
+    result = embeddings.embed_documents(texts)
+
+    assert [x[1] for x in result] == list(range(40))
+    assert [x[0] for x in result] == [float(len(x)) for x in texts]
+    assert embeddings.total_texts == 40
+    assert embeddings.embed_documents([]) == []
+
+def test_requests_in_flight_stay_within_the_concurrency():
+    fake = FakeBedrockEmbeddings()
+    embeddings = ConcurrentEmbeddings(fake, max_concurrency=3)
+
+    embeddings.embed_documents([f"text {i}" for i in range(30)])
+
+    assert 1 < fake.max_in_flight <= 3
+    assert embeddings._in_flight == 0
+
+def test_throttling_halves_the_concurrency_and_retries():
+    fake = FakeBedrockEmbeddings(throttle_first=2)
+    embeddings = ConcurrentEmbeddings(fake, max_concurrency=8)
+
+    assert embeddings.embed_query("query 7") == [7.0, 7.0]
+    assert embeddings.throttles == 2
+    assert embeddings.concurrency == 2
+    assert fake.calls == 3
+
+def test_concurrency_settles_below_the_service_capacity():
+    fake = FakeBedrockEmbeddings(capacity=2)
+    # Without backoff delays, a request can be throttled several times before the concurrency drops to the capacity
+    embeddings = ConcurrentEmbeddings(fake, max_concurrency=8, max_retries=1000)
+
+    result = embeddings.embed_documents([f"text {i}" for i in range(60)])
+
+    assert [x[1] for x in result] == list(range(60))
+    assert fake.throttled > 0
+    assert embeddings.throttles == fake.throttled
+    assert 1 <= embeddings.concurrency <= embeddings.max_concurrency
+
+def test_retries_are_exhausted_on_persistent_throttling():
+    fake = FakeBedrockEmbeddings(throttle_first=100)
+    embeddings = ConcurrentEmbeddings(fake, max_concurrency=4, max_retries=3)
+
+    with pytest.raises(ValueError):
+        embeddings.embed_query("query 1")
+    assert fake.calls == 4
+    assert embeddings.concurrency == 1
+    assert embeddings._in_flight == 0
+
+def test_other_errors_are_not_retried():
+    class Failing(FakeBedrockEmbeddings):
+        def embed_documents(self, texts):
+            self.calls += 1
+            raise ValueError("Malformed input request")
+
+    fake = Failing()
+    embeddings = ConcurrentEmbeddings(fake, max_concurrency=4)
+
+    with pytest.raises(ValueError, match="Malformed"):
+        embeddings.embed_query("query 1")
+    assert fake.calls == 1
+    assert embeddings.throttles == 0
+
+def test_concurrency_recovers_after_successful_requests():
+    fake = FakeBedrockEmbeddings(throttle_first=3, delay=0)
+    embeddings = ConcurrentEmbeddings(fake, max_concurrency=4)
+
+    embeddings.embed_query("query 1")
+    assert embeddings.throttles == 3
+    assert embeddings.concurrency < 4
+    for i in range(20):
+        embeddings.embed_query(f"query {i}")
+
+    assert embeddings.concurrency == 4
+
+def test_acquire_waits_for_a_free_slot():
+    embeddings = ConcurrentEmbeddings(FakeBedrockEmbeddings(), max_concurrency=1)
+    embeddings._acquire()
+    acquired = threading.Event()
+
+    thread = threading.Thread(target=lambda: (embeddings._acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.05)
+    embeddings._release(throttled=False)
+    assert acquired.wait(1)
+    thread.join()
+    assert embeddings._in_flight == 1
+
+def test_text_generation_copy_is_identical():
+    # Each image ships its own copy of the module, which these tests cover for both
+    module_path = os.path.abspath(embedding_executor.__file__)
+    copy_path = os.path.join(os.path.dirname(module_path), "..", "..", "..", "text_generation", "src", "helpers", "embedding_executor.py")
+    with open(module_path, "rb") as module, open(copy_path, "rb") as copy:
+        assert module.read() == copy.read()
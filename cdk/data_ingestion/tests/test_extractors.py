@@ -0,0 +1,205 @@
+import io
+import multiprocessing
+import os
+import signal
+import time
+import zipfile
+from typing import Dict, List
+
+import pymupdf
+import pytest
+
+from processing import extraction, extractors
+from processing.extractors import extract_pages, get_extractor, paginate
+
+W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+P = "http://schemas.openxmlformats.org/presentationml/2006/main"
+S = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+
+
+def build_zip(members: Dict[str, str]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+def build_pdf(page_texts: List[str]) -> bytes:
+    doc = pymupdf.open()
+    for page_text in page_texts:
+        doc.new_page().insert_text((72, 72), page_text)
+    return doc.tobytes()
+
+def extract(data: bytes, file_type: str) -> List[tuple]:
+    return list(extract_pages(io.BytesIO(data), len(data), file_type))
+
+def test_paginate_groups_lines_and_splits_overlong_ones():
+    assert list(paginate(["aaaa", "bbbb", "cc"], page_chars=10)) == [(1, "aaaa\nbbbb"), (2, "cc")]
+    assert list(paginate(["x" * 25], page_chars=10)) == [(1, "x" * 10), (2, "x" * 10), (3, "x" * 5)]
+    assert list(paginate([], page_chars=10)) == []
+
+@pytest.mark.parametrize("file_type", ["txt", "qasm"])
+def test_text_is_decoded_across_stream_chunks(monkeypatch, file_type):
+    monkeypatch.setattr(extractors, "STREAM_CHUNK_SIZE", 3)
+    data = "﻿OPENQASM 2.0;\r\nqreg q[2];\r\n// ψ = |00⟩ + |11⟩\r\nh q[0];".encode("utf-8")
+
+    assert extract(data, file_type) == [(1, "OPENQASM 2.0;\nqreg q[2];\n// ψ = |00⟩ + |11⟩\nh q[0];")]
+
+def test_long_text_is_split_into_pages():
+    lines = [f"line {i:04d}" for i in range(1000)]
+
+    pages = extract("\n".join(lines).encode("utf-8"), "txt")
+
+    assert len(pages) > 1
+    assert [page_num for page_num, _ in pages] == list(range(1, len(pages) + 1))
+    assert all(len(text) <= extractors.TEXT_PAGE_CHARS for _, text in pages)
+    assert "\n".join(text for _, text in pages).split("\n") == lines
+
+def test_unknown_file_types_are_read_as_text():
+    assert get_extractor("MD")[0] == "txt"
+    assert extract(b"# Qubits", "md") == [(1, "# Qubits")]
+
+@pytest.mark.parametrize("memory_budget_mb", [256, 0], ids=["in_memory", "memory_mapped"])
+def test_pdf_pages_are_extracted_in_order(monkeypatch, memory_budget_mb):
+    monkeypatch.setattr(extraction, "EXTRACTION_MEMORY_BUDGET_MB", memory_budget_mb)
+    data = build_pdf([f"Page {i} about qubits" for i in range(1, 4)])
+
+    pages = extract(data, "pdf")
+
+    assert [page_num for page_num, _ in pages] == [1, 2, 3]
+    assert [text.strip() for _, text in pages] == [f"Page {i} about qubits" for i in range(1, 4)]
+
+def test_pdf_pages_are_extracted_in_order_by_parallel_workers(monkeypatch):
+    monkeypatch.setattr(extractors, "get_worker_count", lambda page_count: 3)
+    data = build_pdf([f"Page {i}" for i in range(1, 11)])
+
+    pages = extract(data, "pdf")
+
+    assert [(page_num, text.strip()) for page_num, text in pages] == [(i, f"Page {i}") for i in range(1, 11)]
+
+@pytest.fixture
+def deadline():
+    """Fails a test that hangs instead of finishing within 30 seconds."""
+    def on_timeout(signum, frame):
+        raise TimeoutError("The test did not finish in time.")
+    previous = signal.signal(signal.SIGALRM, on_timeout)
+    signal.alarm(30)
+    yield
+    signal.alarm(0)
+    signal.signal(signal.SIGALRM, previous)
+
+@pytest.mark.parametrize("memory_budget_mb", [256, 0], ids=["in_memory", "memory_mapped"])
+@pytest.mark.parametrize("workers", [2, 3, 7])
+def test_parallel_extraction_matches_serial_extraction(monkeypatch, deadline, memory_budget_mb, workers):
+    monkeypatch.setattr(extraction, "EXTRACTION_MEMORY_BUDGET_MB", memory_budget_mb)
+    # Hyphenated lines are joined by the text flags, which the workers must use as well
+    data = build_pdf([f"Page {i}: qubit{'-' if i % 2 else ''}\nreadout {'x' * i}" for i in range(1, 24)])
+    monkeypatch.setattr(extractors, "get_worker_count", lambda page_count: 1)
+    serial = extract(data, "pdf")
+
+    monkeypatch.setattr(extractors, "get_worker_count", lambda page_count: workers)
+    parallel = extract(data, "pdf")
+
+    assert [page_num for page_num, _ in serial] == list(range(1, 24))
+    assert parallel == serial
+    assert not multiprocessing.active_children()
+
+def open_failing_in_workers(data: bytes, fail):
+    """Opens the document, running fail on it when opened in a worker process."""
+    parent_pid = os.getpid()
+    def open_doc():
+        doc = pymupdf.open(stream=data, filetype="pdf")
+        if os.getpid() != parent_pid:
+            fail(doc)
+        return doc
+    return open_doc
+
+def test_a_failing_worker_raises(deadline):
+    data = build_pdf([f"Page {i}" for i in range(1, 10)])
+    def fail(doc):
+        raise ValueError("damaged page")
+
+    with pytest.raises(RuntimeError, match="Error extracting pages 1-3: damaged page"):
+        list(extraction.extract_pages_parallel(open_failing_in_workers(data, fail), 9, 3))
+    assert not multiprocessing.active_children()
+
+def test_a_worker_exiting_without_a_result_raises(deadline):
+    data = build_pdf([f"Page {i}" for i in range(1, 10)])
+    def fail(doc):
+        # Like a worker killed for running out of memory, nothing is sent back
+        os._exit(1)
+
+    with pytest.raises(RuntimeError, match="pages 1-3 exited with code 1"):
+        list(extraction.extract_pages_parallel(open_failing_in_workers(data, fail), 9, 3))
+    assert not multiprocessing.active_children()
+
+def test_docx_paragraphs_join_their_runs():
+    data = build_zip({
+        "[Content_Types].xml": "<Types/>",
+        "word/document.xml": f"""<?xml version="1.0" encoding="UTF-8"?>
+            <w:document xmlns:w="{W}"><w:body>
+                <w:p><w:r><w:t>Quantum </w:t></w:r><w:r><w:t>error correction</w:t></w:r></w:p>
+                <w:p/>
+                <w:tbl><w:tr><w:tc><w:p><w:r><w:t>Table cell</w:t></w:r></w:p></w:tc></w:tr></w:tbl>
+            </w:body></w:document>""",
+    })
+
+    assert extract(data, "docx") == [(1, "Quantum error correction\n\nTable cell")]
+
+def test_pptx_has_one_page_per_slide_in_numeric_order():
+    def slide(*paragraphs: str) -> str:
+        body = "".join(f"<a:p><a:r><a:t>{x}</a:t></a:r></a:p>" for x in paragraphs)
+        return f"""<?xml version="1.0" encoding="UTF-8"?>
+            <p:sld xmlns:p="{P}" xmlns:a="{A}"><p:cSld><p:spTree><p:sp><p:txBody>{body}</p:txBody></p:sp></p:spTree></p:cSld></p:sld>"""
+
+    data = build_zip({
+        "ppt/presentation.xml": "<presentation/>",
+        "ppt/slides/slide10.xml": slide("Tenth"),
+        "ppt/slides/slide2.xml": slide("Second", "Bullet"),
+        "ppt/slides/slide1.xml": slide("First"),
+        "ppt/slides/_rels/slide1.xml.rels": "<Relationships/>",
+    })
+
+    assert extract(data, "pptx") == [(1, "First"), (2, "Second\nBullet"), (3, "Tenth")]
+
+def test_xlsx_rows_resolve_shared_and_inline_strings():
+    def sheet(rows: str) -> str:
+        return f'<?xml version="1.0" encoding="UTF-8"?><worksheet xmlns="{S}"><sheetData>{rows}</sheetData></worksheet>'
+
+    data = build_zip({
+        "xl/workbook.xml": "<workbook/>",
+        "xl/sharedStrings.xml": f"""<?xml version="1.0" encoding="UTF-8"?>
+            <sst xmlns="{S}"><si><t>Qubit</t></si><si><r><t>T1 </t></r><r><t>(us)</t></r></si></sst>""",
+        "xl/worksheets/sheet1.xml": sheet(
+            '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c></row>'
+            '<row r="2"><c r="A2" t="inlineStr"><is><t>q0</t></is></c><c r="B2"><v>85.5</v></c><c r="C2"/></row>'
+            '<row r="3"><c r="A3"/></row>'
+        ),
+        "xl/worksheets/sheet2.xml": sheet('<row r="1"><c r="A1"><v>42</v></c></row>'),
+    })
+
+    assert extract(data, "xlsx") == [(1, "Qubit\tT1 (us)\nq0\t85.5\n42")]
+
+def test_extraction_metrics_count_pages_per_file_type(monkeypatch):
+    monkeypatch.setattr(extractors, "extraction_metrics", {})
+    extract(build_pdf(["One", "Two"]), "pdf")
+    extract(b"text", "txt")
+
+    metrics = extractors.get_extraction_metrics()
+
+    assert {file_type: (x["documents"], x["pages"]) for file_type, x in metrics.items()} == {"pdf": (1, 2), "txt": (1, 1)}
+
+class SlowBody(io.BytesIO):
+    """A body whose reads take as long as a slow download."""
+
+    def read(self, *args) -> bytes:
+        time.sleep(0.2)
+        return super().read(*args)
+
+def test_extraction_metrics_leave_out_the_time_reading_the_body(monkeypatch):
+    monkeypatch.setattr(extractors, "extraction_metrics", {})
+    data = build_pdf(["One", "Two"])
+
+    assert len(list(extract_pages(SlowBody(data), len(data), "pdf"))) == 2
+    assert extractors.get_extraction_metrics()["pdf"]["seconds"] < 0.2
@@ -0,0 +1,186 @@
+import json
+from typing import List
+
+import pytest
+
+import main
+
+BUCKET = main.QUANTUMAI_DATA_INGESTION_BUCKET
+GENERAL = "general"
+
+
+class FakeS3:
+    """Records the General topic copies and deletions made by the handler."""
+
+    def __init__(self):
+        self.copies = []
+        self.deleted = []
+        self.metadata = {}
+
+    def copy(self, copy_source, bucket, key, ExtraArgs=None):
+        self.copies.append((copy_source["Key"], key, ExtraArgs["Metadata"]))
+        self.metadata[key] = ExtraArgs["Metadata"]
+
+    def delete_object(self, Bucket, Key):
+        self.deleted.append(Key)
+
+    def head_object(self, Bucket, Key):
+        return {"Metadata": self.metadata.get(Key, {})}
+
+
+class Ingestion:
+    """Stands in for the database and the vectorstore, recording what the handler asks of them."""
+
+    def __init__(self):
+        self.s3 = FakeS3()
+        self.registered = []
+        self.register_error = None
+        self.ingested = []
+        self.ingest_error = None
+        self.removed = []
+        self.bumped = []
+        self.reported = 0
+
+    def register_files_in_db(self, files):
+        if self.register_error:
+            raise self.register_error
+        self.registered.append(list(files))
+
+    def update_vectorstore_from_s3(self, bucket, topic_id, file_names=None, linked_topic_ids=None, time_remaining=None):
+        if self.ingest_error:
+            raise self.ingest_error
+        self.ingested.append((topic_id, file_names, linked_topic_ids))
+        return True
+
+    def remove_files_from_vectorstore(self, topic_id, file_names):
+        self.removed.append((topic_id, file_names))
+
+    def bump_collection_versions(self, topic_ids):
+        self.bumped.append(topic_ids)
+
+    def report_metrics(self):
+        self.reported += 1
+
+
+@pytest.fixture
+def ingestion(monkeypatch):
+    ingestion = Ingestion()
+    monkeypatch.setattr(main, "INGESTION_MODE", "delta")
+    monkeypatch.setattr(main, "s3_client", ingestion.s3)
+    monkeypatch.setattr(main, "fetch_general_topic_id", lambda: GENERAL)
+    monkeypatch.setattr(main, "register_files_in_db", ingestion.register_files_in_db)
+    monkeypatch.setattr(main, "update_vectorstore_from_s3", ingestion.update_vectorstore_from_s3)
+    monkeypatch.setattr(main, "remove_files_from_vectorstore", ingestion.remove_files_from_vectorstore)
+    monkeypatch.setattr(main, "bump_collection_versions", ingestion.bump_collection_versions)
+    monkeypatch.setattr(main, "maintain_topic_indexes", lambda topic_ids, context=None: None)
+    monkeypatch.setattr(main, "report_metrics", ingestion.report_metrics)
+    return ingestion
+
+def record(event_name: str, key: str, bucket: str = BUCKET) -> dict:
+    return {"eventName": event_name, "s3": {"bucket": {"name": bucket}, "object": {"key": key}}}
+
+def handle(*records) -> dict:
+    return main.handle_event({"Records": list(records)}, None)
+
+def statuses(response: dict) -> List[str]:
+    return [x["status"] for x in json.loads(response["body"])["results"]]
+
+def test_records_of_one_topic_are_ingested_together(ingestion):
+    response = handle(
+        record("ObjectCreated:Put", "topic/documents/a.pdf"),
+        record("ObjectCreated:Put", "topic/documents/b+c.txt"),
+        record("ObjectCreated:Put", "topic/documents/a.pdf"),
+    )
+
+    assert response["statusCode"] == 200
+    assert statuses(response) == ["processed"] * 3
+    assert ingestion.ingested == [("topic", ["a.pdf", "b c.txt", "a.pdf"], [GENERAL])]
+    # All uploads are registered with one statement
+    assert [[file[1] for file in files] for files in ingestion.registered] == [["a", "b c", "a"]]
+    assert [dest for _, dest, _ in ingestion.s3.copies] == [f"{GENERAL}/documents/a.pdf", f"{GENERAL}/documents/b c.txt", f"{GENERAL}/documents/a.pdf"]
+    assert ingestion.bumped == [["topic", GENERAL]]
+    assert ingestion.reported == 1
+
+def test_general_copies_are_linked_instead_of_ingested(ingestion):
+    handle(record("ObjectCreated:Put", "topic/documents/a.pdf"))
+
+    response = handle(record("ObjectCreated:Copy", f"{GENERAL}/documents/a.pdf"))
+
+    assert response["statusCode"] == 200
+    assert ingestion.ingested == [("topic", ["a.pdf"], [GENERAL])]
+
+def test_a_file_created_and_removed_in_one_batch_is_only_removed(ingestion):
+    response = handle(
+        record("ObjectCreated:Put", "topic/documents/a.pdf"),
+        record("ObjectRemoved:Delete", "topic/documents/a.pdf"),
+    )
+
+    assert response["statusCode"] == 200
+    assert ingestion.removed == [("topic", ["a.pdf"])]
+    assert ingestion.ingested == []
+    assert ingestion.s3.deleted == [f"{GENERAL}/documents/a.pdf"]
+
+def test_a_file_removed_and_created_again_in_one_batch_is_only_ingested(ingestion):
+    response = handle(
+        record("ObjectRemoved:Delete", "topic/documents/a.pdf"),
+        record("ObjectCreated:Put", "topic/documents/a.pdf"),
+    )
+
+    assert response["statusCode"] == 200
+    assert ingestion.removed == []
+    assert ingestion.ingested == [("topic", ["a.pdf"], [GENERAL])]
+
+def test_removals_are_processed_when_registering_the_uploads_fails(ingestion):
+    ingestion.register_error = RuntimeError("database unavailable")
+
+    response = handle(
+        record("ObjectCreated:Put", "topic/documents/a.pdf"),
+        record("ObjectRemoved:Delete", "topic/documents/b.pdf"),
+        record("ObjectCreated:Put", "other/documents/c.pdf"),
+    )
+
+    assert response["statusCode"] == 200
+    assert statuses(response) == ["error", "processed", "error"]
+    assert ingestion.removed == [("topic", ["b.pdf"])]
+    assert ingestion.ingested == []
+    # Only the topic that still had work is touched
+    assert ingestion.bumped == [["topic", GENERAL]]
+
+def test_records_of_other_buckets_are_skipped(ingestion):
+    response = handle(
+        record("ObjectCreated:Put", "topic/documents/a.pdf", bucket="another-bucket"),
+        record("ObjectCreated:Put", "topic/documents/b.pdf"),
+    )
+
+    assert response["statusCode"] == 200
+    assert statuses(response) == ["skipped", "processed"]
+    assert ingestion.ingested == [("topic", ["b.pdf"], [GENERAL])]
+    assert [[file[1] for file in files] for files in ingestion.registered] == [["b"]]
+
+def test_status_is_400_when_there_is_nothing_to_process(ingestion):
+    assert handle()["statusCode"] == 400
+    assert handle(record("ObjectCreated:Put", "topic/documents/a.pdf", bucket="another-bucket"))["statusCode"] == 400
+    assert ingestion.ingested == []
+    assert ingestion.reported == 0
+
+def test_status_is_500_when_every_record_fails(ingestion):
+    response = handle(record("ObjectCreated:Put", "no-topic.pdf"))
+    assert response["statusCode"] == 500
+    assert statuses(response) == ["error"]
+
+    ingestion.ingest_error = RuntimeError("vectorstore unavailable")
+    response = handle(record("ObjectCreated:Put", "topic/documents/a.pdf"))
+    assert response["statusCode"] == 500
+    assert statuses(response) == ["error"]
+    # Chunks written before the failure still change the collection
+    assert ingestion.bumped == [["topic", GENERAL]]
+    assert ingestion.reported == 0
+
+def test_status_is_200_when_some_records_fail(ingestion):
+    response = handle(
+        record("ObjectCreated:Put", "no-topic.pdf"),
+        record("ObjectCreated:Put", "topic/documents/a.pdf"),
+    )
+
+    assert response["statusCode"] == 200
+    assert statuses(response) == ["error", "processed"]
@@ -155,7 +155,8 @@ exports.handler = async (event) => {
                 UPDATE "Topics"
                 SET
                   topic_name = ${topicName},
-                  system_prompt = ${system_prompt}
+                  system_prompt = ${system_prompt},
+                  updated_at = now()
                 WHERE
                   topic_id = ${topicId}
                 RETURNING *;
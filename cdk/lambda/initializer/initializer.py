@@ -8,6 +8,7 @@ import secrets
 DB_SECRET_NAME = os.environ["DB_SECRET_NAME"]
 DB_USER_SECRET_NAME = os.environ["DB_USER_SECRET_NAME"]
 DB_PROXY = os.environ["DB_PROXY"]
+CONVERSATION_TABLE_NAME = os.environ["CONVERSATION_TABLE_NAME"]
 
 
 
@@ -30,12 +31,35 @@ def createConnection():
     return connection
 
 
+def createConversationTable():
+    # Create the DynamoDB table of the chat histories once at deployment,
+    # so the text generation Lambda does not make control-plane calls per request
+    dynamodb_client = boto3.client("dynamodb")
+    try:
+        dynamodb_client.describe_table(TableName=CONVERSATION_TABLE_NAME)
+        print(f"DynamoDB table {CONVERSATION_TABLE_NAME} already exists.")
+        return
+    except dynamodb_client.exceptions.ResourceNotFoundException:
+        pass
+
+    dynamodb_client.create_table(
+        TableName=CONVERSATION_TABLE_NAME,
+        KeySchema=[{"AttributeName": "SessionId", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "SessionId", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    dynamodb_client.get_waiter("table_exists").wait(TableName=CONVERSATION_TABLE_NAME)
+    print(f"Created DynamoDB table {CONVERSATION_TABLE_NAME}.")
+
+
 dbSecret = getDbSecret()
 connection = createConnection()
 
 
 def handler(event, context):
     global connection
+
+    createConversationTable()
     
     if connection.closed:
         connection = createConnection()
@@ -78,6 +102,10 @@ def handler(event, context):
                 "system_prompt" text
             );
 
+            ALTER TABLE "Topics" ADD COLUMN IF NOT EXISTS "chunking_strategy" varchar;
+            ALTER TABLE "Topics" ADD COLUMN IF NOT EXISTS "updated_at" timestamp DEFAULT now();
+            ALTER TABLE "Topics" ADD COLUMN IF NOT EXISTS "collection_version" integer DEFAULT 0;
+
             INSERT INTO "Topics" ("topic_id", "topic_name", "system_prompt")
             SELECT uuid_generate_v4(), 'General', 
                 'You are a highly qualified expert in quantum materials, technology, and phenomena, representing the Stewart Blusson Quantum Matter Institute at UBC. When responding to user queries, maintain a professional and authoritative tone. Utilize the knowledge available to you to provide thorough, accurate, and insightful answers, drawing upon relevant documents as necessary, without explicitly stating that documents have been provided. If a user query is unrelated to quantum materials, technology, phenomena, or the Stewart Blusson Quantum Matter Institute, politely inform the user that your expertise is limited to these areas and encourage them to ask questions within your scope.'
@@ -85,6 +113,62 @@ def handler(event, context):
                 SELECT 1 FROM "Topics" WHERE "topic_name" = 'General'
             );
 
+            CREATE TABLE IF NOT EXISTS "Document_Fingerprints" (
+                "topic_id" uuid REFERENCES "Topics" ("topic_id") ON DELETE CASCADE ON UPDATE CASCADE,
+                "filename" varchar,
+                "fingerprint" varchar,
+                "chunk_ids" varchar[],
+                "time_indexed" timestamp,
+                PRIMARY KEY ("topic_id", "filename")
+            );
+
+            CREATE TABLE IF NOT EXISTS "Embedding_Cache" (
+                "model_id" varchar,
+                "text_hash" char(64),
+                "embedding" real[],
+                "time_created" timestamp,
+                "time_last_used" timestamp,
+                PRIMARY KEY ("model_id", "text_hash")
+            );
+
+            CREATE INDEX IF NOT EXISTS "Embedding_Cache_time_last_used_idx" ON "Embedding_Cache" ("time_last_used");
+
+            -- Keep only the latest registration of each file, so the unique index below can be built
+            DELETE FROM "Documents" "older"
+            USING "Documents" "newer"
+            WHERE "older"."topic_id" = "newer"."topic_id"
+            AND "older"."filename" = "newer"."filename"
+            AND "older"."filetype" = "newer"."filetype"
+            AND (COALESCE("older"."time_uploaded", '-infinity'), "older"."document_id")
+                < (COALESCE("newer"."time_uploaded", '-infinity'), "newer"."document_id");
+
+            CREATE UNIQUE INDEX IF NOT EXISTS "Documents_topic_id_filename_filetype_idx" ON "Documents" ("topic_id", "filename", "filetype");
+
+            CREATE TABLE IF NOT EXISTS "Vector_Indexes" (
+                "collection_name" varchar PRIMARY KEY,
+                "index_name" varchar,
+                "index_type" varchar,
+                "num_rows" integer,
+                "time_built" timestamp
+            );
+
+            ALTER TABLE "Vector_Indexes" ADD COLUMN IF NOT EXISTS "dimensions" integer;
+
+            CREATE TABLE IF NOT EXISTS "Answer_Cache" (
+                "entry_id" uuid PRIMARY KEY DEFAULT (uuid_generate_v4()),
+                "topic_id" uuid REFERENCES "Topics" ("topic_id") ON DELETE CASCADE ON UPDATE CASCADE,
+                "context_hash" char(64),
+                "collection_version" integer,
+                "question" text,
+                "embedding" real[],
+                "answer" text,
+                "hits" integer,
+                "time_created" timestamp,
+                "time_last_used" timestamp
+            );
+
+            CREATE INDEX IF NOT EXISTS "Answer_Cache_topic_id_idx" ON "Answer_Cache" ("topic_id", "context_hash", "collection_version");
+
             CREATE TABLE IF NOT EXISTS "Sessions" (
                 "session_id" uuid PRIMARY KEY DEFAULT (uuid_generate_v4()),
                 "user_id" uuid,
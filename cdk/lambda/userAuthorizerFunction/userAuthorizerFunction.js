@@ -48,7 +48,8 @@ exports.handler = async (event) => {
         await initializeConnection();
     }
 
-    const accessToken = event.authorizationToken.toString();
+    // REST routes use a token authorizer, the WebSocket API passes the token as a query string parameter
+    const accessToken = (event.authorizationToken ?? event.queryStringParameters?.token ?? "").toString();
     let payload;
 
     try {
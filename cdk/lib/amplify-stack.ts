@@ -65,6 +65,7 @@ export class AmplifyStack extends cdk.Stack {
         VITE_COGNITO_USER_POOL_ID: apiStack.getUserPoolId(),
         VITE_COGNITO_USER_POOL_CLIENT_ID: apiStack.getUserPoolClientId(),
         VITE_API_ENDPOINT: apiStack.getEndpointUrl(),
+        VITE_WEBSOCKET_URL: apiStack.getWebSocketUrl(),
         VITE_IDENTITY_POOL_ID: apiStack.getIdentityPoolId(),
       },
       buildSpec: BuildSpec.fromObjectToYaml(amplifyYaml),
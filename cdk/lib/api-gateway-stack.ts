@@ -1,5 +1,8 @@
 import * as cdk from "aws-cdk-lib";
 import * as apigateway from "aws-cdk-lib/aws-apigateway";
+import * as apigatewayv2 from "aws-cdk-lib/aws-apigatewayv2";
+import { WebSocketLambdaIntegration } from "aws-cdk-lib/aws-apigatewayv2-integrations";
+import { WebSocketLambdaAuthorizer } from "aws-cdk-lib/aws-apigatewayv2-authorizers";
 import * as lambda from "aws-cdk-lib/aws-lambda";
 import * as lambdaEventSources from "aws-cdk-lib/aws-lambda-event-sources";
 import * as iam from "aws-cdk-lib/aws-iam";
@@ -34,7 +37,10 @@ export class ApiGatewayStack extends cdk.Stack {
   public readonly stageARN_APIGW: string;
   public readonly apiGW_basedURL: string;
   public readonly secret: secretsmanager.ISecret;
+  private readonly webSocketUrl: string;
   public getEndpointUrl = () => this.api.url;
+  public getWebSocketUrl = () => this.webSocketUrl;
+  public getConversationTableName = () => "DynamoDB-Conversation-Table";
   public getUserPoolId = () => this.userPool.userPoolId;
   public getUserPoolClientId = () => this.appClient.userPoolClientId;
   public getIdentityPoolId = () => this.identityPool.ref;
@@ -698,7 +704,7 @@ export class ApiGatewayStack extends cdk.Stack {
     const tableNameParameter = new ssm.StringParameter(this, "TableNameParameter", {
       parameterName: "/QuantumAI/TableName",
       description: "Parameter containing the DynamoDB table name",
-      stringValue: "DynamoDB-Conversation-Table",
+      stringValue: this.getConversationTableName(),
     });
 
 
@@ -722,6 +728,8 @@ export class ApiGatewayStack extends cdk.Stack {
           BEDROCK_LLM_PARAM: bedrockLLMParameter.parameterName,
           EMBEDDING_MODEL_PARAM: embeddingModelParameter.parameterName,
           TABLE_NAME_PARAM: tableNameParameter.parameterName,
+          // Set to "true" to answer repeated first questions of a topic from the answer cache
+          ANSWER_CACHE_ENABLED: "false",
         },
       }
     );
@@ -769,13 +777,11 @@ export class ApiGatewayStack extends cdk.Stack {
       })
     );
 
-    // Grant access to DynamoDB actions
+    // Grant access to DynamoDB actions, the table is created by the initializer at deployment
     textGenLambdaDockerFunc.addToRolePolicy(
       new iam.PolicyStatement({
         effect: iam.Effect.ALLOW,
         actions: [
-          "dynamodb:ListTables",
-          "dynamodb:CreateTable",
           "dynamodb:DescribeTable",
           "dynamodb:PutItem",
           "dynamodb:GetItem",
@@ -798,6 +804,65 @@ export class ApiGatewayStack extends cdk.Stack {
       })
     );
 
+    /**
+     *
+     * Create WebSocket API that streams the text generation answers as they are generated.
+     * The REST endpoint user/text_generation keeps returning whole answers.
+     */
+    const userWebSocketAuthorizer = new WebSocketLambdaAuthorizer(
+      "UserWebSocketAuthorizer",
+      authorizationFunction_user,
+      {
+        // Browsers cannot set headers on WebSocket connections, so the ID token is passed as ?token=
+        identitySource: ["route.request.querystring.token"],
+      }
+    );
+
+    const textGenWebSocketIntegration = new WebSocketLambdaIntegration(
+      "TextGenWebSocketIntegration",
+      textGenLambdaDockerFunc
+    );
+
+    const textGenWebSocketApi = new apigatewayv2.WebSocketApi(
+      this,
+      "TextGenWebSocketApi",
+      {
+        apiName: `${resourcePrefix}-TextGenWebSocketApi`,
+        connectRouteOptions: {
+          integration: textGenWebSocketIntegration,
+          authorizer: userWebSocketAuthorizer,
+        },
+        disconnectRouteOptions: {
+          integration: textGenWebSocketIntegration,
+        },
+      }
+    );
+
+    // Messages are routed on their "action" field. The answer is sent back through the
+    // management API, so the function keeps streaming past the 29s integration timeout.
+    textGenWebSocketApi.addRoute("generate", {
+      integration: textGenWebSocketIntegration,
+    });
+
+    const textGenWebSocketStage = new apigatewayv2.WebSocketStage(
+      this,
+      "TextGenWebSocketStage",
+      {
+        webSocketApi: textGenWebSocketApi,
+        stageName: "prod",
+        autoDeploy: true,
+      }
+    );
+
+    // Allow the text generation function to post to the connections
+    textGenWebSocketStage.grantManagementApiAccess(textGenLambdaDockerFunc);
+    this.webSocketUrl = textGenWebSocketStage.url;
+
+    new cdk.CfnOutput(this, "TextGenWebSocketUrlOutput", {
+      value: textGenWebSocketStage.url,
+      description: "The URL of the WebSocket API that streams text generation answers",
+    });
+
     // Create S3 Bucket to handle documents for each topic
     const dataIngestionBucket = new s3.Bucket(this, "QuantumAIDataIngestionBucket", {
       //bucketName: "quantumAI-data-ingestion-bucket",
@@ -906,7 +971,8 @@ export class ApiGatewayStack extends cdk.Stack {
           BUCKET: dataIngestionBucket.bucketName,
           REGION: this.region,
           EMBEDDING_BUCKET_NAME: embeddingStorageBucket.bucketName,
-          EMBEDDING_MODEL_PARAM: embeddingModelParameter.parameterName
+          EMBEDDING_MODEL_PARAM: embeddingModelParameter.parameterName,
+          INGESTION_MODE: "delta",
         },
       }
     );
@@ -951,6 +1017,18 @@ export class ApiGatewayStack extends cdk.Stack {
     // Attach the custom Bedrock policy to Lambda function
     dataIngestLambdaDockerFunc.addToRolePolicy(bedrockPolicyStatement);
 
+    // Allow the function to invoke itself to continue ingestions that reach the timeout
+    // The ARN is built from the function name, since referencing the function here would create a circular dependency
+    dataIngestLambdaDockerFunc.addToRolePolicy(
+      new iam.PolicyStatement({
+        effect: iam.Effect.ALLOW,
+        actions: ["lambda:InvokeFunction"],
+        resources: [
+          `arn:aws:lambda:${this.region}:${this.account}:function:${resourcePrefix}-DataIngestLambdaDockerFunc`,
+        ],
+      })
+    );
+
     // Add the S3 event source trigger to the Lambda function
     dataIngestLambdaDockerFunc.addEventSource(
       new lambdaEventSources.S3EventSource(dataIngestionBucket, {
@@ -63,6 +63,19 @@ export class DBFlowStack extends Stack {
         resources: ["*"],
       })
     );
+    lambdaRole.addToPolicy(
+      new iam.PolicyStatement({
+        effect: iam.Effect.ALLOW,
+        actions: [
+          // DynamoDB table of the chat histories
+          "dynamodb:DescribeTable",
+          "dynamodb:CreateTable",
+        ],
+        resources: [
+          `arn:aws:dynamodb:${this.region}:${this.account}:table/${apiStack.getConversationTableName()}`,
+        ],
+      })
+    );
     lambdaRole.addManagedPolicy(
       iam.ManagedPolicy.fromAwsManagedPolicyName("AmazonSSMReadOnlyAccess")
     );
@@ -80,6 +93,7 @@ export class DBFlowStack extends Stack {
         DB_SECRET_NAME: db.secretPathAdminName,     // Admin Secret Manager name that only use once here.
         DB_USER_SECRET_NAME: db.secretPathUser.secretName,
         DB_PROXY: db.secretPathTableCreator.secretName,
+        CONVERSATION_TABLE_NAME: apiStack.getConversationTableName(),
       },
       vpc: db.dbInstance.vpc,
       code: lambda.Code.fromAsset("lambda/initializer"),
@@ -0,0 +1,162 @@
+import os, json, time, hashlib, logging
+from typing import Dict, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The cache is opt-in, set to "true" to serve repeated first-turn questions from it
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+# Minimum cosine similarity between a question and a cached question for the cached answer to be served
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.environ.get("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+# Number of most recently used entries kept per topic
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "500"))
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "QuantumAI/TextGeneration")
+# Set to "false" to keep metric records out of stdout, e.g. for local runs
+EMIT_METRICS = os.environ.get("EMIT_METRICS", "true").lower() == "true"
+
+# Lookups since the container started
+answer_cache_stats: Dict[str, int] = {"lookups": 0, "hits": 0, "misses": 0, "stored": 0}
+
+
+def get_context_hash(system_prompt: str, bedrock_llm_id: str, embedding_model_id: str) -> str:
+    """
+    Hash everything besides the question and the documents that an answer depends on, so answers are
+    only shared between questions asked with the same system prompt, LLM and embedding model.
+    """
+    return hashlib.sha256(json.dumps([system_prompt, bedrock_llm_id, embedding_model_id]).encode("utf-8")).hexdigest()
+
+def record_lookup(topic_id: str, hit: bool, similarity: Optional[float]) -> None:
+    """
+    Count a lookup and write it in CloudWatch Embedded Metric Format to stdout, so the hit rate of
+    the cache is the average of AnswerCacheHit.
+    """
+    answer_cache_stats["lookups"] += 1
+    answer_cache_stats["hits" if hit else "misses"] += 1
+    if not EMIT_METRICS:
+        return
+    metrics = {"AnswerCacheHit": int(hit)}
+    if similarity is not None:
+        metrics["AnswerCacheSimilarity"] = similarity
+    print(json.dumps({
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [[]],
+                "Metrics": [{"Name": name, "Unit": "None"} for name in metrics],
+            }],
+        },
+        "topic_id": topic_id,
+        **metrics,
+    }), flush=True)
+
+def get_cached_answer(
+    engine: Engine,
+    embeddings: Embeddings,
+    topic_id: str,
+    context_hash: str,
+    question: str
+) -> Tuple[Optional[str], Optional[dict]]:
+    """
+    Look up the answer to the most similar question cached for a topic. Only entries stored for the topic's
+    current collection version count, so ingestion into the topic invalidates its cached answers.
+
+    Args:
+    engine (Engine): The database engine.
+    embeddings (Embeddings): The embeddings instance used to embed the question.
+    topic_id (str): The ID of the topic.
+    context_hash (str): The hash from get_context_hash.
+    question (str): The question of the user.
+
+    Returns:
+    Tuple[Optional[str], Optional[dict]]: The cached answer, or None and the entry to store the generated answer
+    under with store_answer. Both are None if the topic does not exist.
+    """
+    question_embedding = embeddings.embed_query(question)
+    with engine.begin() as conn:
+        row = conn.execute(
+            text("""
+                SELECT t.collection_version, a.entry_id, a.answer, a.similarity
+                FROM "Topics" t
+                LEFT JOIN LATERAL (
+                    SELECT entry_id, answer, 1 - (CAST(embedding AS vector) <=> CAST(:question_embedding AS vector)) AS similarity
+                    FROM "Answer_Cache"
+                    WHERE topic_id = t.topic_id
+                    AND context_hash = :context_hash
+                    AND collection_version = t.collection_version
+                    ORDER BY similarity DESC
+                    LIMIT 1
+                ) a ON true
+                WHERE t.topic_id = CAST(:topic_id AS uuid);
+            """),
+            {"topic_id": topic_id, "context_hash": context_hash, "question_embedding": str(question_embedding)},
+        ).fetchone()
+        if row is None:
+            return None, None
+
+        collection_version, entry_id, answer, similarity = row
+        if entry_id is not None and similarity >= ANSWER_CACHE_SIMILARITY_THRESHOLD:
+            conn.execute(
+                text("""
+                    UPDATE "Answer_Cache"
+                    SET hits = hits + 1, time_last_used = now()
+                    WHERE entry_id = :entry_id;
+                """),
+                {"entry_id": entry_id},
+            )
+            record_lookup(topic_id, True, similarity)
+            return answer, None
+
+    record_lookup(topic_id, False, similarity)
+    return None, {
+        "topic_id": topic_id,
+        "context_hash": context_hash,
+        "collection_version": collection_version,
+        "question": question,
+        "embedding": [float(x) for x in question_embedding],
+    }
+
+def store_answer(engine: Engine, entry: dict, answer: str) -> None:
+    """
+    Store a generated answer in the cache, and drop the topic's entries of earlier collection versions
+    and its least recently used entries above ANSWER_CACHE_MAX_ENTRIES.
+
+    Args:
+    engine (Engine): The database engine.
+    entry (dict): The entry returned by get_cached_answer on a miss.
+    answer (str): The generated answer.
+    """
+    with engine.begin() as conn:
+        conn.execute(
+            text("""
+                INSERT INTO "Answer_Cache"
+                (topic_id, context_hash, collection_version, question, embedding, answer, hits, time_created, time_last_used)
+                VALUES (CAST(:topic_id AS uuid), :context_hash, :collection_version, :question, :embedding, :answer, 0, now(), now());
+            """),
+            {**entry, "answer": answer},
+        )
+        conn.execute(
+            text("""
+                DELETE FROM "Answer_Cache"
+                WHERE topic_id = CAST(:topic_id AS uuid)
+                AND (
+                    collection_version < :collection_version
+                    OR entry_id IN (
+                        SELECT entry_id FROM "Answer_Cache"
+                        WHERE topic_id = CAST(:topic_id AS uuid)
+                        ORDER BY time_last_used DESC
+                        OFFSET :max_entries
+                    )
+                );
+            """),
+            {"topic_id": entry["topic_id"], "collection_version": entry["collection_version"], "max_entries": ANSWER_CACHE_MAX_ENTRIES},
+        )
+    answer_cache_stats["stored"] += 1
+
+def get_hit_rate() -> float:
+    return answer_cache_stats["hits"] / answer_cache_stats["lookups"] if answer_cache_stats["lookups"] else 0.0
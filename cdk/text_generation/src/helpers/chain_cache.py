@@ -0,0 +1,75 @@
+import os, hashlib, logging
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+from langchain_core.runnables import Runnable
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Maximum number of chains kept across warm invocations, the least recently used one is evicted first
+CHAIN_CACHE_SIZE = int(os.environ.get("CHAIN_CACHE_SIZE", "32"))
+
+# Chains by (topic ID, system prompt hash, model ID), ordered from least to most recently used
+chains: "OrderedDict[Tuple[str, str, str], Runnable]" = OrderedDict()
+chain_cache_stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+def get_prompt_hash(system_prompt: str) -> str:
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+
+def get_cached_chain(
+    topic_id: str,
+    system_prompt: str,
+    bedrock_llm_id: str,
+    build_chain: Callable[[], Runnable]
+) -> Runnable:
+    """
+    Return the RAG chain of a topic, building it on first use. The chain is reused by later calls in
+    the same container as long as the topic's system prompt and the model stay the same, and the chains
+    built for an earlier system prompt or model of the topic are dropped.
+
+    Args:
+    topic_id (str): The ID of the topic.
+    system_prompt (str): The current system prompt of the topic.
+    bedrock_llm_id (str): The ID of the Bedrock LLM the chain answers with.
+    build_chain (Callable[[], Runnable]): Builds the chain on a cache miss.
+
+    Returns:
+    Runnable: The chain.
+    """
+    key = (topic_id, get_prompt_hash(system_prompt), bedrock_llm_id)
+    chain = chains.get(key)
+    if chain is not None:
+        chains.move_to_end(key)
+        chain_cache_stats["hits"] += 1
+        return chain
+
+    chain_cache_stats["misses"] += 1
+    num_stale = invalidate_topic_chains(topic_id)
+    if num_stale:
+        logger.info(f"System prompt or model of topic {topic_id} changed, dropped {num_stale} cached chains.")
+
+    chain = build_chain()
+    chains[key] = chain
+    while len(chains) > CHAIN_CACHE_SIZE:
+        evicted, _ = chains.popitem(last=False)
+        chain_cache_stats["evictions"] += 1
+        logger.info(f"Evicted the cached chain of topic {evicted[0]}.")
+    return chain
+
+def invalidate_topic_chains(topic_id: str) -> int:
+    """
+    Drop the cached chains of a topic.
+
+    Args:
+    topic_id (str): The ID of the topic.
+
+    Returns:
+    int: The number of dropped chains.
+    """
+    stale = [x for x in chains if x[0] == topic_id]
+    for x in stale:
+        del chains[x]
+    chain_cache_stats["invalidations"] += len(stale)
+    return len(stale)
@@ -6,58 +6,44 @@ from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_retrieval_chain
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_community.chat_message_histories import DynamoDBChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.pydantic_v1 import BaseModel, Field
 from datetime import datetime
+from typing import Iterator
 
 class LLM_evaluation(BaseModel):
     response: str = Field(description="Answer to the user's query.")
 
 
-def create_dynamodb_history_table(table_name: str) -> bool:
+# Tables found ready by check_dynamodb_history_table, checked once per container
+ready_tables = set()
+
+def check_dynamodb_history_table(table_name: str) -> bool:
     """
-    Create a DynamoDB table to store the session history if it doesn't already exist.
+    Check that the DynamoDB table storing the session history exists, once per container.
+    The table is created by the initializer at deployment, so no table is created here.
 
     Args:
-    table_name (str): The name of the DynamoDB table to create.
+    table_name (str): The name of the DynamoDB table.
 
     Returns:
-    None
-    
-    If the table already exists, this function does nothing. Otherwise, it creates a 
-    new table with a key schema based on 'SessionId'.
+    bool: True once the table is ready. Raises a RuntimeError if the table does not exist.
     """
-    # Get the service resource and client.
-    dynamodb_resource = boto3.resource("dynamodb")
+    if table_name in ready_tables:
+        return True
+
     dynamodb_client = boto3.client("dynamodb")
-    
-    # Retrieve the list of tables that currently exist.
-    existing_tables = []
-    exclusive_start_table_name = None
-    
-    while True:
-        if exclusive_start_table_name:
-            response = dynamodb_client.list_tables(ExclusiveStartTableName=exclusive_start_table_name)
-        else:
-            response = dynamodb_client.list_tables()
-        
-        existing_tables.extend(response.get('TableNames', []))
-        
-        if 'LastEvaluatedTableName' in response:
-            exclusive_start_table_name = response['LastEvaluatedTableName']
-        else:
-            break
-    
-    if table_name not in existing_tables:  # Create a new table if it doesn't exist.
-        # Create the DynamoDB table.
-        table = dynamodb_resource.create_table(
-            TableName=table_name,
-            KeySchema=[{"AttributeName": "SessionId", "KeyType": "HASH"}],
-            AttributeDefinitions=[{"AttributeName": "SessionId", "AttributeType": "S"}],
-            BillingMode="PAY_PER_REQUEST",
-        )
-        
-        # Wait until the table exists.
-        table.meta.client.get_waiter("table_exists").wait(TableName=table_name)
+    try:
+        status = dynamodb_client.describe_table(TableName=table_name)["Table"]["TableStatus"]
+    except dynamodb_client.exceptions.ResourceNotFoundException:
+        raise RuntimeError(f"DynamoDB table {table_name} does not exist, it is created when the stack is deployed.")
+
+    if status == "CREATING":
+        # Only during the first deployment
+        dynamodb_client.get_waiter("table_exists").wait(TableName=table_name)
+
+    ready_tables.add(table_name)
+    return True
 
 def get_bedrock_llm(
     bedrock_llm_id: str,
@@ -114,26 +100,23 @@ def get_initial_user_query(topic: str) -> str:
     """
     return user_query
 
-def get_response(
-    query: str,
+def get_conversational_rag_chain(
     llm: ChatBedrock,
     history_aware_retriever,
     table_name: str,
-    session_id: str,
     topic_system_prompt: str
-) -> dict:
+) -> RunnableWithMessageHistory:
     """
-    Generates a response to a query using the LLM and a history-aware retriever for context.
+    Build the RAG chain that answers with the topic's system prompt and keeps the chat history in DynamoDB.
 
     Args:
-    query (str): The user's query string for which a response is needed.
     llm (ChatBedrock): The language model instance used to generate the response.
     history_aware_retriever: The history-aware retriever instance that provides relevant context documents for the query.
     table_name (str): The DynamoDB table name used to store and retrieve the chat history.
-    session_id (str): The unique identifier for the chat session to manage history.
+    topic_system_prompt (str): The system prompt of the topic.
 
     Returns:
-    dict: A dictionary containing the generated response and the source documents used in the retrieval.
+    RunnableWithMessageHistory: The chain, invoked or streamed with the session ID in its configurable.
     """
     # Create a system prompt for the question answering
     system_prompt = (
@@ -157,7 +140,7 @@ def get_response(
     question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
     rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
 
-    conversational_rag_chain = RunnableWithMessageHistory(
+    return RunnableWithMessageHistory(
         rag_chain,
         lambda session_id: DynamoDBChatMessageHistory(
             table_name=table_name, 
@@ -167,7 +150,23 @@ def get_response(
         history_messages_key="chat_history",
         output_messages_key="answer",
     )
-    
+
+def get_response(
+    query: str,
+    conversational_rag_chain: RunnableWithMessageHistory,
+    session_id: str
+) -> dict:
+    """
+    Generates a response to a query using the conversational RAG chain of the topic.
+
+    Args:
+    query (str): The user's query string for which a response is needed.
+    conversational_rag_chain (RunnableWithMessageHistory): The chain built by get_conversational_rag_chain.
+    session_id (str): The unique identifier for the chat session to manage history.
+
+    Returns:
+    dict: A dictionary containing the generated response and the source documents used in the retrieval.
+    """
     # Generate the response until it's not empty
     response = ""
     while not response:
@@ -179,6 +178,69 @@ def get_response(
     
     return get_llm_output(response)
 
+def stream_response(
+    query: str,
+    conversational_rag_chain: RunnableWithMessageHistory,
+    session_id: str
+) -> Iterator[str]:
+    """
+    Generates a response to a query like get_response, yielding the answer as the LLM produces it.
+    The chat history is written once the stream has been consumed to the end.
+
+    Args:
+    query (str): The user's query string for which a response is needed.
+    conversational_rag_chain (RunnableWithMessageHistory): The chain built by get_conversational_rag_chain.
+    session_id (str): The unique identifier for the chat session to manage history.
+
+    Yields:
+    str: The next piece of the answer.
+    """
+    # Generate the response until it's not empty, as get_response does
+    streamed = False
+    while not streamed:
+        for chunk in conversational_rag_chain.stream(
+            {
+                "input": query
+            },
+            config={
+                "configurable": {"session_id": session_id}
+            },
+        ):
+            # The retrieval chain streams its input and context first, then the answer piece by piece
+            answer = chunk.get("answer")
+            if answer:
+                streamed = True
+                yield answer
+
+def is_first_turn(table_name: str, session_id: str) -> bool:
+    """
+    Check whether the user has not sent a message in the session yet, so a question can be answered
+    without the chat history.
+
+    Args:
+    table_name (str): The DynamoDB table name where the conversation history is stored.
+    session_id (str): The unique identifier for the chat session.
+
+    Returns:
+    bool: True if the session has no user message.
+    """
+    history = DynamoDBChatMessageHistory(table_name=table_name, session_id=session_id)
+    return not any(message.type == "human" for message in history.messages)
+
+def add_exchange_to_history(table_name: str, session_id: str, query: str, answer: str) -> None:
+    """
+    Write a question and an answer that did not come from the RAG chain, such as a cached answer,
+    to the chat history the way the chain does.
+
+    Args:
+    table_name (str): The DynamoDB table name where the conversation history is stored.
+    session_id (str): The unique identifier for the chat session.
+    query (str): The formatted query of the user.
+    answer (str): The answer.
+    """
+    history = DynamoDBChatMessageHistory(table_name=table_name, session_id=session_id)
+    history.add_messages([HumanMessage(content=query), AIMessage(content=answer)])
+
 def generate_response(conversational_rag_chain: object, query: str, session_id: str) -> str:
     """
     Invokes the RAG chain to generate a response to a given query.
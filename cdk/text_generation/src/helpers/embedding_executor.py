@@ -0,0 +1,143 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from botocore.exceptions import ClientError
+from langchain_core.embeddings import Embeddings
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+THROTTLING_ERROR_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceUnavailableException"}
+
+def is_throttling_error(error: BaseException) -> bool:
+    """
+    Check whether an error, or any error it was raised from, is a Bedrock throttling error.
+    BedrockEmbeddings re-raises client errors as ValueError, so the whole chain is inspected.
+
+    Args:
+    error (BaseException): The raised error.
+
+    Returns:
+    bool: True if the request was throttled.
+    """
+    while error is not None:
+        if isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES:
+            return True
+        if any(code in str(error) for code in THROTTLING_ERROR_CODES):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+class ConcurrentEmbeddings(Embeddings):
+    """
+    Sends the texts of a batch to the underlying embeddings as concurrent single-text requests.
+    The number of requests in flight adapts to throttling: it is halved on every throttling error
+    and grows back by one after a full window of successful requests.
+    """
+
+    def __init__(
+        self,
+        underlying_embeddings: Embeddings,
+        max_concurrency: int = 8,
+        max_retries: int = 8,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0
+    ):
+        """
+        Args:
+        underlying_embeddings (Embeddings): The embeddings instance that sends the requests.
+        max_concurrency (int, optional): The maximum number of requests in flight. Should not exceed the client's max_pool_connections. Defaults to 8.
+        max_retries (int, optional): The number of retries of a throttled request. Defaults to 8.
+        base_delay (float, optional): The initial backoff delay in seconds. Defaults to 0.5.
+        max_delay (float, optional): The maximum backoff delay in seconds. Defaults to 20.
+        """
+        self.underlying_embeddings = underlying_embeddings
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.concurrency = self.max_concurrency
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._successes = 0
+        self.total_texts = 0
+        self.total_seconds = 0.0
+        self.throttles = 0
+
+    def _acquire(self) -> None:
+        with self._condition:
+            while self._in_flight >= self.concurrency:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def _release(self, throttled: bool) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                self.throttles += 1
+                self.concurrency = max(1, self.concurrency // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.concurrency and self.concurrency < self.max_concurrency:
+                    self.concurrency += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+    def _call_with_retries(self, func: Callable[[str], List[float]], text: str) -> List[float]:
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            throttled = False
+            try:
+                return func(text)
+            except Exception as e:
+                # A throttled last attempt still counts against the concurrency
+                throttled = is_throttling_error(e)
+                if attempt == self.max_retries or not throttled:
+                    raise
+            finally:
+                self._release(throttled)
+            # Full jitter keeps retries of concurrent requests from arriving together
+            time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of texts concurrently.
+
+        Args:
+        texts (List[str]): The texts to embed.
+
+        Returns:
+        List[List[float]]: The embedding of each text, in the same order.
+        """
+        if not texts:
+            return []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(texts))) as executor:
+            embeddings = list(executor.map(
+                lambda x: self._call_with_retries(lambda y: self.underlying_embeddings.embed_documents([y])[0], x),
+                texts,
+            ))
+        elapsed = time.perf_counter() - start
+        self.total_texts += len(texts)
+        self.total_seconds += elapsed
+        logger.debug(f"Embedded {len(texts)} texts in {elapsed:.2f}s at concurrency {self.concurrency}.")
+        return embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call_with_retries(self.underlying_embeddings.embed_query, text)
+
+    def report(self) -> None:
+        """
+        Log the embedding throughput since the instance was created.
+        """
+        throughput = self.total_texts / self.total_seconds if self.total_seconds else 0.0
+        logger.info(
+            f"Embedded {self.total_texts} texts in {self.total_seconds:.2f}s ({throughput:.1f} texts/s), "
+            f"{self.throttles} throttled requests, concurrency {self.concurrency}/{self.max_concurrency}."
+        )
@@ -1,14 +1,41 @@
 import logging
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 import psycopg2
 from langchain_aws import BedrockEmbeddings
 from langchain_postgres import PGVector
 
+from helpers.vector_index import get_search_engine
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Vectorstores of each (connection string, collection name), reused across warm invocations
+vectorstores: Dict[Tuple[str, str], PGVector] = {}
+
+def get_connection_string(
+    dbname: str, 
+    user: str, 
+    password: str, 
+    host: str, 
+    port: int
+) -> str:
+    """
+    Build the SQLAlchemy connection string for the database.
+    
+    Args:
+    dbname (str): The name of the database.
+    user (str): The database user.
+    password (str): The database password.
+    host (str): The database host.
+    port (int): The database port.
+    
+    Returns:
+    str: The connection string.
+    """
+    return f"postgresql+psycopg://{user}:{password}@{host}:{port}/{dbname}"
+
 def get_vectorstore(
     collection_name: str, 
     embeddings: BedrockEmbeddings, 
@@ -19,7 +46,8 @@ def get_vectorstore(
     port: int
 ) -> Optional[PGVector]:
     """
-    Initialize and return a PGVector instance.
+    Return the PGVector instance of a collection, initializing it on first use.
+    The instance and its pooled engine are reused by later calls in the same container.
     
     Args:
     collection_name (str): The name of the collection.
@@ -34,17 +62,23 @@ def get_vectorstore(
     Optional[PGVector]: The initialized PGVector instance, or None if an error occurred.
     """
     try:
-        connection_string = (
-            f"postgresql+psycopg://{user}:{password}@{host}:{port}/{dbname}"
-        )
+        connection_string = get_connection_string(dbname, user, password, host, port)
+
+        vectorstore = vectorstores.get((connection_string, collection_name))
+        if vectorstore is not None:
+            vectorstore.embedding_function = embeddings
+            return vectorstore, connection_string
 
         logger.info("Initializing the VectorStore")
         vectorstore = PGVector(
             embeddings=embeddings,
             collection_name=collection_name,
-            connection=connection_string,
-            use_jsonb=True
+            connection=get_search_engine(connection_string),
+            use_jsonb=True,
+            # The extension only needs to be checked once per database
+            create_extension=not any(key[0] == connection_string for key in vectorstores)
         )
+        vectorstores[(connection_string, collection_name)] = vectorstore
 
         logger.info("VectorStore initialized")
         return vectorstore, connection_string
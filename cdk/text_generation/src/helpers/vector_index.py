@@ -0,0 +1,211 @@
+import os
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "hnsw" or "ivfflat"
+ANN_INDEX_TYPE = os.environ.get("ANN_INDEX_TYPE", "hnsw")
+HNSW_EF_SEARCH = int(os.environ.get("HNSW_EF_SEARCH", "100"))
+IVFFLAT_PROBES = int(os.environ.get("IVFFLAT_PROBES", "10"))
+# What the index is built on: "full" float32 vectors, "halfvec" half-precision copies, "binary" quantized
+# bits, or "truncated" leading dimensions for models trained to keep them meaningful (Matryoshka).
+# The table keeps the full vectors, which rescore the candidates found with the compact index.
+# The indexes are built by data ingestion, which must be configured with the same setting.
+VECTOR_STORAGE_MODE = os.environ.get("VECTOR_STORAGE_MODE", "full")
+VECTOR_TRUNCATE_DIMENSIONS = int(os.environ.get("VECTOR_TRUNCATE_DIMENSIONS", "256"))
+# Candidates fetched with the compact index per requested result, kept below hnsw.ef_search
+RESCORE_OVERSAMPLING = int(os.environ.get("RESCORE_OVERSAMPLING", "4"))
+# How long the retriever trusts what it knows about a collection's index
+INDEX_INFO_TTL_SECONDS = int(os.environ.get("INDEX_INFO_TTL_SECONDS", "300"))
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+# Kept below the RDS Proxy idle client timeout, so pooled connections are replaced before the proxy drops them
+DB_POOL_RECYCLE_SECONDS = int(os.environ.get("DB_POOL_RECYCLE_SECONDS", "1500"))
+
+# One pooled engine per connection string, reused across warm invocations
+search_engines: Dict[str, Engine] = {}
+# Collection UUID and index type of each collection, with the time they were looked up
+index_info: Dict[str, Tuple[Optional[str], Optional[str], float]] = {}
+
+def create_search_engine(connection_string: str) -> Engine:
+    """
+    Create a pooled database engine. Search parameters are set per query transaction with SET LOCAL
+    rather than per connection, since session-level settings pin connections in RDS Proxy.
+
+    Args:
+    connection_string (str): The database connection string.
+
+    Returns:
+    Engine: The engine, to be passed to PGVector as its connection.
+    """
+    return create_engine(
+        connection_string,
+        pool_size=DB_POOL_SIZE,
+        pool_recycle=DB_POOL_RECYCLE_SECONDS,
+        # Connections left idle between invocations may have been closed by the proxy or a failover
+        pool_pre_ping=True,
+    )
+
+def get_search_engine(connection_string: str) -> Engine:
+    """
+    Return the shared engine of a connection string, creating it on first use.
+
+    Args:
+    connection_string (str): The database connection string.
+
+    Returns:
+    Engine: The pooled engine, shared by every vectorstore and table of this database.
+    """
+    engine = search_engines.get(connection_string)
+    if engine is None:
+        engine = search_engines[connection_string] = create_search_engine(connection_string)
+    return engine
+
+def get_index_type() -> str:
+    """
+    Describe the index built for the configured index type and storage mode, as recorded in "Vector_Indexes".
+    """
+    if VECTOR_STORAGE_MODE == "full":
+        return ANN_INDEX_TYPE
+    if VECTOR_STORAGE_MODE == "truncated":
+        return f"{ANN_INDEX_TYPE}_truncated{VECTOR_TRUNCATE_DIMENSIONS}"
+    return f"{ANN_INDEX_TYPE}_{VECTOR_STORAGE_MODE}"
+
+def get_compact_expressions(dimensions: int) -> Tuple[str, str, str, str]:
+    """
+    Build the SQL of the configured storage mode: the indexed expression over the embedding column, its
+    operator class, the distance operator and the matching expression over the :query_embedding parameter.
+    Queries must order by the same expressions data ingestion builds the index on.
+
+    Args:
+    dimensions (int): The number of dimensions of the stored embeddings.
+
+    Returns:
+    Tuple[str, str, str, str]: The indexed expression, the operator class, the operator and the query expression.
+    """
+    if VECTOR_STORAGE_MODE == "halfvec":
+        return (
+            f"(embedding::halfvec({dimensions}))",
+            "halfvec_cosine_ops",
+            "<=>",
+            f"CAST(:query_embedding AS halfvec({dimensions}))",
+        )
+    if VECTOR_STORAGE_MODE == "binary":
+        return (
+            f"(binary_quantize(embedding)::bit({dimensions}))",
+            "bit_hamming_ops",
+            "<~>",
+            f"binary_quantize(CAST(:query_embedding AS vector))::bit({dimensions})",
+        )
+    if VECTOR_STORAGE_MODE == "truncated":
+        truncated = min(VECTOR_TRUNCATE_DIMENSIONS, dimensions)
+        return (
+            f"(subvector(embedding, 1, {truncated})::vector({truncated}))",
+            "vector_cosine_ops",
+            "<=>",
+            f"subvector(CAST(:query_embedding AS vector), 1, {truncated})::vector({truncated})",
+        )
+    return (
+        f"(embedding::vector({dimensions}))",
+        "vector_cosine_ops",
+        "<=>",
+        f"CAST(:query_embedding AS vector({dimensions}))",
+    )
+
+def get_index_info(engine: Engine, collection_name: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Look up the UUID of a collection and the type of its index, cached for INDEX_INFO_TTL_SECONDS.
+
+    Args:
+    engine (Engine): The database engine.
+    collection_name (str): The name of the collection, which is the topic ID.
+
+    Returns:
+    Tuple[Optional[str], Optional[str]]: The collection UUID, or None if the collection does not exist,
+    and the index type recorded in "Vector_Indexes", or None if the collection has no index.
+    """
+    cached = index_info.get(collection_name)
+    if cached is not None and time.monotonic() - cached[2] < INDEX_INFO_TTL_SECONDS:
+        return cached[0], cached[1]
+
+    with engine.connect() as conn:
+        row = conn.execute(
+            text("""
+                SELECT c.uuid, v.index_type FROM langchain_pg_collection c
+                LEFT JOIN "Vector_Indexes" v ON v.collection_name = c.name
+                WHERE c.name = :collection_name;
+            """),
+            {"collection_name": collection_name},
+        ).one_or_none()
+    collection_uuid, index_type = (str(row[0]), row[1]) if row else (None, None)
+    index_info[collection_name] = (collection_uuid, index_type, time.monotonic())
+    return collection_uuid, index_type
+
+def index_search(
+    engine: Engine,
+    collection_name: str,
+    query_embedding: List[float],
+    k: int = 4
+) -> List[Tuple[Document, float]]:
+    """
+    Search a collection through its partial index. In the compact storage modes, k * RESCORE_OVERSAMPLING
+    candidates are fetched through the index and ranked by their full-precision cosine distance.
+    Only called when the collection has an index, other collections are searched by PGVector directly.
+
+    Args:
+    engine (Engine): The database engine, from create_search_engine.
+    collection_name (str): The name of the collection, which is the topic ID.
+    query_embedding (List[float]): The embedding of the query.
+    k (int, optional): The number of results. Defaults to 4.
+
+    Returns:
+    List[Tuple[Document, float]]: The documents and their cosine distances, closest first.
+    """
+    collection_uuid, _ = get_index_info(engine, collection_name)
+    if collection_uuid is None:
+        return []
+    dimensions = len(query_embedding)
+    expression, _, operator, query_expression = get_compact_expressions(dimensions)
+    # The index expression is the full-precision distance in the full storage mode, so there is nothing to rescore
+    candidates = k if VECTOR_STORAGE_MODE == "full" else k * RESCORE_OVERSAMPLING
+
+    with engine.begin() as conn:
+        # Transaction-scoped settings are released at commit, so the proxy can keep multiplexing the connection
+        conn.execute(text(f"SET LOCAL hnsw.ef_search = {HNSW_EF_SEARCH}"))
+        conn.execute(text(f"SET LOCAL ivfflat.probes = {IVFFLAT_PROBES}"))
+        # The per-collection partial indexes only match plans made with the collection ID known
+        conn.execute(text("SET LOCAL plan_cache_mode = force_custom_plan"))
+        # The collection UUID is bound rather than looked up in the query and the dimensions are inlined,
+        # so the planner can match the partial index
+        rows = conn.execute(
+            text(f"""
+                SELECT id, document, cmetadata, embedding <=> CAST(:query_embedding AS vector) AS distance
+                FROM (
+                    SELECT id, document, cmetadata, embedding FROM langchain_pg_embedding
+                    WHERE collection_id = CAST(:collection_uuid AS uuid)
+                    AND vector_dims(embedding) = {dimensions}
+                    ORDER BY {expression} {operator} {query_expression}
+                    LIMIT :candidates
+                ) candidates
+                ORDER BY distance
+                LIMIT :k;
+            """),
+            {
+                "query_embedding": str(list(query_embedding)),
+                "collection_uuid": collection_uuid,
+                "candidates": candidates,
+                "k": k,
+            },
+        ).fetchall()
+    return [
+        (Document(id=row.id, page_content=row.document, metadata=row.cmetadata or {}), row.distance)
+        for row in rows
+    ]
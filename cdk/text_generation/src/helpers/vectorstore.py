@@ -1,10 +1,41 @@
-from typing import Dict
+from typing import Any, Dict, List
 
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
 from langchain_core.vectorstores import VectorStoreRetriever
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.chains import create_history_aware_retriever
+from langchain_postgres import PGVector
+from pydantic import ConfigDict
 
 from helpers.helper import get_vectorstore
+from helpers import vector_index
+
+class IndexedRetriever(BaseRetriever):
+    """
+    Retrieves through the collection's partial index, which is built on an expression over the embeddings
+    that the vectorstore's own queries cannot use. Collections without an index of the configured type,
+    which are small enough for exact search, are searched by the vectorstore directly.
+    """
+    vectorstore: PGVector
+    engine: Any
+    collection_name: str
+    k: int = 4
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        _, index_type = vector_index.get_index_info(self.engine, self.collection_name)
+        if index_type != vector_index.get_index_type():
+            return self.vectorstore.similarity_search(query, k=self.k)
+        query_embedding = self.vectorstore.embeddings.embed_query(query)
+        return [
+            document
+            for document, _ in vector_index.index_search(self.engine, self.collection_name, query_embedding, self.k)
+        ]
 
 def get_vectorstore_retriever(
     llm,
@@ -22,7 +53,7 @@ def get_vectorstore_retriever(
     Returns:
     VectorStoreRetriever: A history-aware retriever instance.
     """
-    vectorstore, _ = get_vectorstore(
+    vectorstore, connection_string = get_vectorstore(
         collection_name=vectorstore_config_dict['collection_name'],
         embeddings=embeddings,
         dbname=vectorstore_config_dict['dbname'],
@@ -32,7 +63,11 @@ def get_vectorstore_retriever(
         port=int(vectorstore_config_dict['port'])
     )
 
-    retriever = vectorstore.as_retriever()
+    retriever = IndexedRetriever(
+        vectorstore=vectorstore,
+        engine=vector_index.get_search_engine(connection_string),
+        collection_name=vectorstore_config_dict['collection_name']
+    )
 
     # Contextualize question and create history-aware retriever
     contextualize_q_system_prompt = (
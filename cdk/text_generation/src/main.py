@@ -1,13 +1,20 @@
 import os
 import json
+import time
 import boto3
 import logging
 import psycopg2
 import langchain
+from botocore.config import Config
 from langchain_aws import BedrockEmbeddings
 
 from helpers.vectorstore import get_vectorstore_retriever
-from helpers.chat import get_bedrock_llm, get_initial_user_query, get_user_query, create_dynamodb_history_table, get_response, update_session_name
+from helpers.embedding_executor import ConcurrentEmbeddings
+from helpers.chat import get_bedrock_llm, get_initial_user_query, get_user_query, check_dynamodb_history_table, get_conversational_rag_chain, get_response, stream_response, update_session_name, get_llm_output, is_first_turn, add_exchange_to_history
+from helpers.chain_cache import get_cached_chain
+from helpers.helper import get_connection_string
+from helpers.vector_index import get_search_engine
+from helpers import answer_cache
 
 # Set up basic logging
 logging.basicConfig(level=logging.INFO)
@@ -20,11 +27,22 @@ RDS_PROXY_ENDPOINT = os.environ["RDS_PROXY_ENDPOINT"]
 BEDROCK_LLM_PARAM = os.environ["BEDROCK_LLM_PARAM"]
 EMBEDDING_MODEL_PARAM = os.environ["EMBEDDING_MODEL_PARAM"]
 TABLE_NAME_PARAM = os.environ["TABLE_NAME_PARAM"]
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.environ.get("BEDROCK_MAX_POOL_CONNECTIONS", "16"))
+EMBEDDING_MAX_CONCURRENCY = int(os.environ.get("EMBEDDING_MAX_CONCURRENCY", "8"))
+# Streamed answers are sent in pieces of at least this many characters, or after this long, whichever comes first
+STREAM_FLUSH_CHARS = int(os.environ.get("STREAM_FLUSH_CHARS", "64"))
+STREAM_FLUSH_INTERVAL_MS = int(os.environ.get("STREAM_FLUSH_INTERVAL_MS", "100"))
+# Cached topics are served without a query for this long, then revalidated against their updated_at
+TOPIC_CACHE_TTL_SECONDS = float(os.environ.get("TOPIC_CACHE_TTL_SECONDS", "30"))
 
 # AWS Clients
 secrets_manager_client = boto3.client("secretsmanager")
 ssm_client = boto3.client("ssm", region_name=REGION)
-bedrock_runtime = boto3.client("bedrock-runtime", region_name=REGION)
+bedrock_runtime = boto3.client(
+    "bedrock-runtime",
+    region_name=REGION,
+    config=Config(max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS),
+)
 
 # Cached resources
 connection = None
@@ -36,6 +54,12 @@ TABLE_NAME = None
 # Cached embeddings instance
 embeddings = None
 
+# Cached topics by topic_id, with the time they were last fetched or revalidated
+topic_cache = {}
+
+# Cached API Gateway Management API clients, one per WebSocket API endpoint
+websocket_clients = {}
+
 def get_secret(secret_name, expect_json=True):
     global db_secret
     if db_secret is None:
@@ -70,13 +94,16 @@ def initialize_constants():
     TABLE_NAME = get_parameter(TABLE_NAME_PARAM, TABLE_NAME)
 
     if embeddings is None:
-        embeddings = BedrockEmbeddings(
-            model_id=EMBEDDING_MODEL_ID,
-            client=bedrock_runtime,
-            region_name=REGION,
+        embeddings = ConcurrentEmbeddings(
+            underlying_embeddings=BedrockEmbeddings(
+                model_id=EMBEDDING_MODEL_ID,
+                client=bedrock_runtime,
+                region_name=REGION,
+            ),
+            max_concurrency=EMBEDDING_MAX_CONCURRENCY,
         )
     
-    create_dynamodb_history_table(TABLE_NAME)
+    check_dynamodb_history_table(TABLE_NAME)
 
 def connect_to_db():
     global connection
@@ -101,91 +128,245 @@ def connect_to_db():
             raise
     return connection
 
-def get_topic_name(topic_id):
+def get_topic(topic_id):
+    """
+    Return the name, system prompt and updated_at of a topic, or None if the topic does not exist or the query failed.
+    A cached topic is served without a query for TOPIC_CACHE_TTL_SECONDS, then revalidated in one query that only
+    returns the name and system prompt again if the topic was edited since, so edits take effect within the TTL.
+    """
+    now = time.monotonic()
+    cached = topic_cache.get(topic_id)
+    if cached and now - cached["checked_at"] < TOPIC_CACHE_TTL_SECONDS:
+        return cached
+
     connection = connect_to_db()
-    if connection is None:
-        logger.error("No database connection available.")
-        return {
-            "statusCode": 500,
-            "body": json.dumps("Database connection failed.")
-        }
+    cur = None
     try:
         cur = connection.cursor()
-        logger.info("Connected to RDS instance!")
-
         cur.execute("""
-            SELECT topic_name 
-            FROM "Topics" 
-            WHERE topic_id = %s;
-        """, (topic_id,))
-        
+            SELECT
+                t.updated_at,
+                c.unchanged,
+                CASE WHEN c.unchanged THEN NULL ELSE t.topic_name END,
+                CASE WHEN c.unchanged THEN NULL ELSE t.system_prompt END
+            FROM "Topics" t,
+            LATERAL (SELECT %(cached)s AND t.updated_at IS NOT DISTINCT FROM %(updated_at)s AS unchanged) c
+            WHERE t.topic_id = %(topic_id)s;
+        """, {"cached": cached is not None, "updated_at": cached["updated_at"] if cached else None, "topic_id": topic_id})
         result = cur.fetchone()
-        logger.info(f"Query result: {result}")
-        topic_name = result[0] if result else None
-        
         cur.close()
-        
-        if topic_name:
-            logger.info(f"Topic name for topic_id {topic_id} found: {topic_name}")
-        else:
-            logger.warning(f"No topic name found for topic_id {topic_id}")
-        
-        return topic_name
-
     except Exception as e:
-        logger.error(f"Error fetching topic name: {e}")
+        logger.error(f"Error fetching topic {topic_id}: {e}")
         if cur:
             cur.close()
         connection.rollback()
         return None
 
-def get_system_prompt(topic_id):
-    connection = connect_to_db()
-    if connection is None:
-        logger.error("No database connection available.")
-        return {
-            "statusCode": 500,
-            "body": json.dumps("Database connection failed.")
-        }
-    
+    if result is None:
+        logger.warning(f"No topic found for topic_id {topic_id}")
+        topic_cache.pop(topic_id, None)
+        return None
+
+    updated_at, unchanged, topic_name, system_prompt = result
+    if cached and unchanged:
+        cached["checked_at"] = now
+        return cached
+
+    logger.info(f"Fetched topic {topic_id} updated at {updated_at}.")
+    topic_cache[topic_id] = {
+        "topic_name": topic_name,
+        "system_prompt": system_prompt,
+        "updated_at": updated_at,
+        "checked_at": now,
+    }
+    return topic_cache[topic_id]
+
+def get_topic_chain(topic_id, system_prompt):
+    """
+    Return the conversational RAG chain of a topic, reused across warm invocations until the topic's
+    system prompt or the LLM changes, so a chat turn only has to invoke it.
+    """
+    def build_chain():
+        logger.info(f"Building the RAG chain of topic {topic_id}.")
+        llm = get_bedrock_llm(BEDROCK_LLM_ID)
+        db_secret = get_secret(DB_SECRET_NAME)
+        history_aware_retriever = get_vectorstore_retriever(
+            llm=llm,
+            vectorstore_config_dict={
+                'collection_name': topic_id,
+                'dbname': db_secret["dbname"],
+                'user': db_secret["username"],
+                'password': db_secret["password"],
+                'host': RDS_PROXY_ENDPOINT,
+                'port': db_secret["port"]
+            },
+            embeddings=embeddings
+        )
+        return get_conversational_rag_chain(llm, history_aware_retriever, TABLE_NAME, system_prompt)
+
+    return get_cached_chain(topic_id, system_prompt, BEDROCK_LLM_ID, build_chain)
+
+def get_answer_cache_engine():
+    db_secret = get_secret(DB_SECRET_NAME)
+    return get_search_engine(get_connection_string(
+        dbname=db_secret["dbname"],
+        user=db_secret["username"],
+        password=db_secret["password"],
+        host=RDS_PROXY_ENDPOINT,
+        port=db_secret["port"],
+    ))
+
+def lookup_cached_answer(topic_id, system_prompt, session_id, question):
+    """
+    Look up the answer to the first question of a session in the topic's answer cache, if the cache is enabled.
+    Follow-up questions depend on the chat history and are always generated.
+    Returns the cached answer or None, and the entry to store the generated answer under or None.
+    A failing cache is logged and bypassed.
+    """
+    if not answer_cache.ANSWER_CACHE_ENABLED:
+        return None, None
     try:
-        cur = connection.cursor()
-        logger.info("Connected to RDS instance!")
+        if not is_first_turn(TABLE_NAME, session_id):
+            return None, None
+        cached_answer, entry = answer_cache.get_cached_answer(
+            get_answer_cache_engine(),
+            embeddings,
+            topic_id,
+            answer_cache.get_context_hash(system_prompt, BEDROCK_LLM_ID, EMBEDDING_MODEL_ID),
+            question
+        )
+        logger.info(f"Answer cache {'hit' if cached_answer else 'miss'} for topic {topic_id}, hit rate {answer_cache.get_hit_rate():.2f}.")
+        return cached_answer, entry
+    except Exception as e:
+        logger.error(f"Error looking up the answer cache: {e}")
+        return None, None
 
-        cur.execute("""
-            SELECT system_prompt 
-            FROM "Topics" 
-            WHERE topic_id = %s;
-        """, (topic_id,))
-        
-        result = cur.fetchone()
-        logger.info(f"Query result: {result}")
-        system_prompt = result[0] if result else None
-        
-        cur.close()
-        
-        if system_prompt:
-            logger.info(f"System prompt for topic_id {topic_id} found: {system_prompt}")
+def store_cached_answer(entry, answer):
+    """
+    Store a generated answer under the entry returned by lookup_cached_answer. A failure is logged and ignored.
+    """
+    if entry is None or not answer:
+        return
+    try:
+        answer_cache.store_answer(get_answer_cache_engine(), entry, answer)
+    except Exception as e:
+        logger.error(f"Error storing the answer in the answer cache: {e}")
+
+def get_websocket_client(request_context):
+    """
+    Return the client that sends messages to the connections of the WebSocket API the event came from.
+    """
+    endpoint_url = f"https://{request_context['domainName']}/{request_context['stage']}"
+    if endpoint_url not in websocket_clients:
+        websocket_clients[endpoint_url] = boto3.client("apigatewaymanagementapi", endpoint_url=endpoint_url)
+    return websocket_clients[endpoint_url]
+
+def send_to_connection(client, connection_id, message):
+    """
+    Send a JSON message to a WebSocket connection. Returns False if the client has disconnected.
+    """
+    try:
+        client.post_to_connection(ConnectionId=connection_id, Data=json.dumps(message).encode("utf-8"))
+        return True
+    except client.exceptions.GoneException:
+        logger.warning(f"WebSocket connection {connection_id} is gone.")
+        return False
+
+def handle_websocket_event(event):
+    """
+    Answer a chat message sent over the WebSocket API, streaming the answer to the connection as it is generated.
+    The client sends {"action": "generate", "topic_id", "session_id", "session_name", "message_content"} and
+    receives "token" messages with pieces of the answer, then a "complete" message with the whole answer
+    and the session name, or an "error" message.
+    """
+    request_context = event["requestContext"]
+    if request_context["routeKey"] in ("$connect", "$disconnect"):
+        # Connections are authorized by the $connect route's authorizer, nothing else to set up
+        return {"statusCode": 200}
+
+    client = get_websocket_client(request_context)
+    connection_id = request_context["connectionId"]
+    body = json.loads(event.get("body") or "{}")
+    topic_id = body.get("topic_id", "")
+    session_id = body.get("session_id", "")
+    question = body.get("message_content", "")
+
+    if not topic_id or not session_id or not question:
+        logger.error("Missing topic_id, session_id or message_content in the WebSocket message.")
+        send_to_connection(client, connection_id, {"type": "error", "message": "Missing required parameter: topic_id, session_id or message_content"})
+        return {"statusCode": 400}
+
+    try:
+        initialize_constants()
+        topic_row = get_topic(topic_id)
+        topic = topic_row["topic_name"] if topic_row else None
+        system_prompt = topic_row["system_prompt"] if topic_row else None
+        if topic is None or system_prompt is None:
+            logger.error(f"Invalid topic_id: {topic_id}")
+            send_to_connection(client, connection_id, {"type": "error", "message": "Invalid topic_id"})
+            return {"statusCode": 400}
+
+        user_query = get_user_query(question)
+        cached_answer, cache_entry = lookup_cached_answer(topic_id, system_prompt, session_id, question)
+        if cached_answer:
+            add_exchange_to_history(TABLE_NAME, session_id, user_query, cached_answer)
+            pieces = [cached_answer]
         else:
-            logger.warning(f"No system prompt found for topic_id {topic_id}")
-        
-        return system_prompt
-     
+            logger.info("Streaming response from the LLM.")
+            pieces = stream_response(
+                query=user_query,
+                conversational_rag_chain=get_topic_chain(topic_id, system_prompt),
+                session_id=session_id
+            )
+
+        connected = True
+        answer = []
+        pending = ""
+        last_flush = 0.0
+        for piece in pieces:
+            answer.append(piece)
+            pending += piece
+            # The first piece goes out at once, later ones are batched to keep the number of API calls down
+            if connected and (not last_flush or len(pending) >= STREAM_FLUSH_CHARS or (time.monotonic() - last_flush) * 1000 >= STREAM_FLUSH_INTERVAL_MS):
+                # The stream is consumed to the end even if the client left, so the chat history is still written
+                connected = send_to_connection(client, connection_id, {"type": "token", "content": pending})
+                pending = ""
+                last_flush = time.monotonic()
+        if connected and pending:
+            connected = send_to_connection(client, connection_id, {"type": "token", "content": pending})
+        store_cached_answer(cache_entry, "".join(answer))
     except Exception as e:
-        logger.error(f"Error fetching system prompt: {e}")
-        if cur:
-            cur.close()
-        connection.rollback()
-        return None
+        logger.error(f"Error streaming response: {e}")
+        send_to_connection(client, connection_id, {"type": "error", "message": "Error getting response"})
+        return {"statusCode": 500}
+
+    session_name = body.get("session_name") or f"New Chat - {topic}"
+    try:
+        potential_session_name = update_session_name(TABLE_NAME, session_id, BEDROCK_LLM_ID, topic)
+        if potential_session_name:
+            session_name = potential_session_name
+    except Exception as e:
+        logger.error(f"Error updating session name: {e}")
+
+    if connected:
+        send_to_connection(client, connection_id, {
+            "type": "complete",
+            "session_name": session_name,
+            "llm_output": "".join(answer),
+        })
+    return {"statusCode": 200}
 
 def handler(event, context):
     logger.info("Text Generation Lambda function is called!")
+    if event.get("requestContext", {}).get("connectionId"):
+        return handle_websocket_event(event)
     initialize_constants()
 
     query_params = event.get("queryStringParameters", {})
 
     topic_id = query_params.get("topic_id", "")
-    topic = get_topic_name(topic_id)
+    topic_row = get_topic(topic_id)
+    topic = topic_row["topic_name"] if topic_row else None
     session_id = query_params.get("session_id", "")
     session_name = query_params.get("session_name") or f"New Chat - {topic}"
 
@@ -215,7 +396,7 @@ def handler(event, context):
             'body': json.dumps('Missing required parameter: session_id')
         }
 
-    system_prompt = get_system_prompt(topic_id)
+    system_prompt = topic_row["system_prompt"] if topic_row else None
 
     if system_prompt is None:
         logger.error(f"Error fetching system prompt for topic_id: {topic_id}")
@@ -250,55 +431,13 @@ def handler(event, context):
         logger.info(f"Processing user question: {question}")
         user_query = get_user_query(question)  
 
+    cached_answer, cache_entry = lookup_cached_answer(topic_id, system_prompt, session_id, question)
+
     try:
-        logger.info("Creating Bedrock LLM instance.")
-        llm = get_bedrock_llm(BEDROCK_LLM_ID)
-    except Exception as e:
-        logger.error(f"Error getting LLM from Bedrock: {e}")
-        return {
-            'statusCode': 500,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Headers": "*",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "*",
-            },
-            'body': json.dumps('Error getting LLM from Bedrock')
-        }
-    
-    try:
-        logger.info("Retrieving vectorstore config.")
-        db_secret = get_secret(DB_SECRET_NAME)
-        vectorstore_config_dict = {
-            'collection_name': topic_id,
-            'dbname': db_secret["dbname"],
-            'user': db_secret["username"],
-            'password': db_secret["password"],
-            'host': RDS_PROXY_ENDPOINT,
-            'port': db_secret["port"]
-        }
-    except Exception as e:
-        logger.error(f"Error retrieving vectorstore config: {e}")
-        return {
-            'statusCode': 500,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Headers": "*",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "*",
-            },
-            'body': json.dumps('Error retrieving vectorstore config')
-        }
-    
-    try:
-        logger.info("Creating history-aware retriever.")
-        history_aware_retriever = get_vectorstore_retriever(
-            llm=llm,
-            vectorstore_config_dict=vectorstore_config_dict,
-            embeddings=embeddings
-        )
+        logger.info("Getting the RAG chain of the topic.")
+        conversational_rag_chain = None if cached_answer else get_topic_chain(topic_id, system_prompt)
     except Exception as e:
-        logger.error(f"Error creating history-aware retriever: {e}")
+        logger.error(f"Error creating the RAG chain: {e}")
         return {
             'statusCode': 500,
             "headers": {
@@ -311,15 +450,18 @@ def handler(event, context):
         }
     
     try:
-        logger.info("Generating response from the LLM.")
-        response = get_response(
-            query=user_query,
-            llm=llm,
-            history_aware_retriever=history_aware_retriever,
-            table_name=TABLE_NAME,
-            session_id=session_id,
-            topic_system_prompt=system_prompt
-        )
+        if cached_answer:
+            logger.info("Answering from the answer cache.")
+            add_exchange_to_history(TABLE_NAME, session_id, user_query, cached_answer)
+            response = get_llm_output(cached_answer)
+        else:
+            logger.info("Generating response from the LLM.")
+            response = get_response(
+                query=user_query,
+                conversational_rag_chain=conversational_rag_chain,
+                session_id=session_id
+            )
+            store_cached_answer(cache_entry, response["llm_output"])
     except Exception as e:
         logger.error(f"Error getting response: {e}")
         return {
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# The Lambda image copies src/ to the task root, so its modules import each other as top-level packages
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+# Configuration the modules read at import time, set by the stack in the deployed function
+os.environ.setdefault("SM_DB_CREDENTIALS", "test-credentials")
+os.environ.setdefault("REGION", "us-west-2")
+os.environ.setdefault("RDS_PROXY_ENDPOINT", "localhost")
+os.environ.setdefault("BEDROCK_LLM_PARAM", "test-llm")
+os.environ.setdefault("EMBEDDING_MODEL_PARAM", "test-embedding-model")
+os.environ.setdefault("TABLE_NAME_PARAM", "test-table")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+os.environ.setdefault("EMIT_METRICS", "false")
@@ -0,0 +1,67 @@
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from helpers import chain_cache
+from helpers.chain_cache import get_cached_chain, invalidate_topic_chains
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(chain_cache, "chains", type(chain_cache.chains)())
+    monkeypatch.setattr(chain_cache, "chain_cache_stats", {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0})
+
+class ChainBuilder:
+    def __init__(self):
+        self.built = 0
+
+    def __call__(self):
+        self.built += 1
+        return RunnableLambda(lambda x, n=self.built: n)
+
+def test_chain_is_built_once_and_reused():
+    build = ChainBuilder()
+
+    first = get_cached_chain("topic", "prompt", "llm", build)
+    second = get_cached_chain("topic", "prompt", "llm", build)
+
+    assert first is second
+    assert build.built == 1
+    assert chain_cache.chain_cache_stats["hits"] == 1
+    assert chain_cache.chain_cache_stats["misses"] == 1
+
+def test_prompt_or_model_change_replaces_the_topic_chain():
+    build = ChainBuilder()
+    old = get_cached_chain("topic", "prompt", "llm", build)
+    other_topic = get_cached_chain("other", "prompt", "llm", build)
+
+    new_prompt = get_cached_chain("topic", "edited prompt", "llm", build)
+    new_model = get_cached_chain("topic", "edited prompt", "other llm", build)
+
+    assert len({id(old), id(new_prompt), id(new_model)}) == 3
+    assert list(chain_cache.chains) == [
+        ("other", chain_cache.get_prompt_hash("prompt"), "llm"),
+        ("topic", chain_cache.get_prompt_hash("edited prompt"), "other llm"),
+    ]
+    assert get_cached_chain("other", "prompt", "llm", build) is other_topic
+    assert chain_cache.chain_cache_stats["invalidations"] == 2
+
+def test_least_recently_used_chain_is_evicted(monkeypatch):
+    monkeypatch.setattr(chain_cache, "CHAIN_CACHE_SIZE", 2)
+    build = ChainBuilder()
+    a = get_cached_chain("a", "prompt", "llm", build)
+    get_cached_chain("b", "prompt", "llm", build)
+    assert get_cached_chain("a", "prompt", "llm", build) is a
+
+    get_cached_chain("c", "prompt", "llm", build)
+
+    assert [key[0] for key in chain_cache.chains] == ["a", "c"]
+    assert chain_cache.chain_cache_stats["evictions"] == 1
+
+def test_invalidate_topic_chains():
+    build = ChainBuilder()
+    get_cached_chain("topic", "prompt", "llm", build)
+    get_cached_chain("other", "prompt", "llm", build)
+
+    assert invalidate_topic_chains("topic") == 1
+    assert invalidate_topic_chains("topic") == 0
+    assert [key[0] for key in chain_cache.chains] == ["other"]
@@ -0,0 +1,74 @@
+import pytest
+
+import main
+from helpers import answer_cache
+
+
+class Cache:
+    """Records the calls main makes to the answer cache, failing them when set to."""
+
+    def __init__(self):
+        self.first_turn = True
+        self.error = None
+        self.history_reads = 0
+        self.lookups = []
+        self.stored = []
+
+    def is_first_turn(self, table_name, session_id):
+        self.history_reads += 1
+        return self.first_turn
+
+    def get_cached_answer(self, engine, embeddings, topic_id, context_hash, question):
+        if self.error:
+            raise self.error
+        self.lookups.append((topic_id, context_hash, question))
+        return None, {"question": question}
+
+    def store_answer(self, engine, entry, answer):
+        if self.error:
+            raise self.error
+        self.stored.append((entry, answer))
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = Cache()
+    monkeypatch.setattr(answer_cache, "ANSWER_CACHE_ENABLED", True)
+    monkeypatch.setattr(answer_cache, "get_cached_answer", cache.get_cached_answer)
+    monkeypatch.setattr(answer_cache, "store_answer", cache.store_answer)
+    monkeypatch.setattr(main, "is_first_turn", cache.is_first_turn)
+    monkeypatch.setattr(main, "get_answer_cache_engine", lambda: None)
+    monkeypatch.setattr(main, "BEDROCK_LLM_ID", "llm")
+    monkeypatch.setattr(main, "EMBEDDING_MODEL_ID", "embedding-model")
+    return cache
+
+def test_first_questions_are_looked_up_with_the_context_hash(cache):
+    assert main.lookup_cached_answer("topic", "prompt", "session", "What is a qubit?") == (None, {"question": "What is a qubit?"})
+    assert cache.lookups == [("topic", answer_cache.get_context_hash("prompt", "llm", "embedding-model"), "What is a qubit?")]
+
+def test_follow_up_questions_bypass_the_cache(cache):
+    cache.first_turn = False
+
+    assert main.lookup_cached_answer("topic", "prompt", "session", "And a qutrit?") == (None, None)
+    assert cache.lookups == []
+
+def test_a_disabled_cache_is_bypassed(cache, monkeypatch):
+    monkeypatch.setattr(answer_cache, "ANSWER_CACHE_ENABLED", False)
+
+    assert main.lookup_cached_answer("topic", "prompt", "session", "What is a qubit?") == (None, None)
+    # Not even the chat history is read
+    assert cache.history_reads == 0
+    assert cache.lookups == []
+
+def test_a_failing_cache_is_bypassed(cache):
+    cache.error = RuntimeError("database unavailable")
+
+    assert main.lookup_cached_answer("topic", "prompt", "session", "What is a qubit?") == (None, None)
+    main.store_cached_answer({"question": "What is a qubit?"}, "A quantum bit.")
+
+def test_answers_are_only_stored_for_a_lookup_entry(cache):
+    main.store_cached_answer(None, "A quantum bit.")
+    main.store_cached_answer({"question": "What is a qubit?"}, "")
+    main.store_cached_answer({"question": "What is a qubit?"}, "A quantum bit.")
+
+    assert cache.stored == [({"question": "What is a qubit?"}, "A quantum bit.")]
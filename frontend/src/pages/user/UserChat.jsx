@@ -57,6 +57,7 @@ const UserChat = ({ admin }) => {
   const [isOpen, setIsOpen] = useState(false);
   const [newSessionCreated, setNewSessionCreated] = useState(false);
   const [isSendingFeedback, setIsSendingFeedback] = useState(false);
+  const [streamingAnswer, setStreamingAnswer] = useState(null);
 
   useEffect(() => {
     if (messagesEndRef.current) {
@@ -284,6 +285,56 @@ const UserChat = ({ admin }) => {
       })
   }
 
+  // Streams the answer over the WebSocket API, resolving with the same fields as user/text_generation
+  function streamTextGeneration(authToken, topicId, sessionId, sessionName, message) {
+    return new Promise((resolve, reject) => {
+      const socket = new WebSocket(
+        `${import.meta.env.VITE_WEBSOCKET_URL}?token=${encodeURIComponent(authToken)}`
+      );
+      let answer = "";
+      let settled = false;
+
+      socket.onopen = () => {
+        socket.send(
+          JSON.stringify({
+            action: "generate",
+            topic_id: topicId,
+            session_id: sessionId,
+            session_name: sessionName,
+            message_content: message,
+          })
+        );
+      };
+      socket.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.type === "token") {
+          answer += data.content;
+          setStreamingAnswer(answer);
+        } else if (data.type === "complete") {
+          settled = true;
+          socket.close();
+          resolve(data);
+        } else if (data.type === "error") {
+          settled = true;
+          socket.close();
+          reject(new Error(`Failed to generate text: ${data.message}`));
+        }
+      };
+      socket.onerror = () => {
+        if (!settled) {
+          settled = true;
+          reject(new Error("Failed to generate text: WebSocket error"));
+        }
+      };
+      socket.onclose = () => {
+        if (!settled) {
+          settled = true;
+          reject(new Error("Failed to generate text: connection closed"));
+        }
+      };
+    });
+  }
+
   const handleSubmit = () => {
     if (isSubmitting || isAItyping || creatingSession) return;
     if (topics.length === 1) {
@@ -370,6 +421,16 @@ const UserChat = ({ admin }) => {
 
         const message = messageData[0].message_content;
 
+        if (import.meta.env.VITE_WEBSOCKET_URL) {
+          return streamTextGeneration(
+            authToken,
+            session.topic_id,
+            newSession.session_id,
+            newSession.session_name,
+            message
+          );
+        }
+
         const textGenUrl = `${
           import.meta.env.VITE_API_ENDPOINT
         }user/text_generation?topic_id=${encodeURIComponent(
@@ -387,16 +448,15 @@ const UserChat = ({ admin }) => {
           body: JSON.stringify({
             message_content: message,
           }),
+        }).then((textGenResponse) => {
+          if (!textGenResponse.ok) {
+            throw new Error(
+              `Failed to generate text: ${textGenResponse.statusText}`
+            );
+          }
+          return textGenResponse.json();
         });
       })
-      .then((textGenResponse) => {
-        if (!textGenResponse.ok) {
-          throw new Error(
-            `Failed to generate text: ${textGenResponse.statusText}`
-          );
-        }
-        return textGenResponse.json();
-      })
       .then((textGenData) => {
         setSession((prevSession) => ({
           ...prevSession,
@@ -450,6 +510,7 @@ const UserChat = ({ admin }) => {
       .finally(() => {
         setIsSubmitting(false);
         setIsAItyping(false);
+        setStreamingAnswer(null);
       });
   };
 
@@ -1032,7 +1093,12 @@ const UserChat = ({ admin }) => {
                   {isAItyping &&
                     currentSessionId &&
                     session?.session_id &&
-                    currentSessionId === session.session_id && <TypingIndicator />}
+                    currentSessionId === session.session_id &&
+                    (streamingAnswer ? (
+                      <AIMessage message={streamingAnswer} handleFeedbackSubmit={() => {}} />
+                    ) : (
+                      <TypingIndicator />
+                    ))}
                   <div ref={messagesEndRef} />
                   </div>
 